@@ -10,13 +10,21 @@ const Chat = ({ user, token, onSignOut }) => {
   const [currentSessionId, setCurrentSessionId] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [isLoadingSessions, setIsLoadingSessions] = useState(false);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [isLoadingEarlier, setIsLoadingEarlier] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
   useEffect(() => {
+    // Prepending older history shouldn't jump to the bottom
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -30,7 +38,8 @@ const Chat = ({ user, token, onSignOut }) => {
       const response = await axios.get('/chat/sessions', {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setSessions(response.data.sessions);
+      // Most recently active first, with titles and message counts
+      setSessions(response.data.summaries);
       
       // If no current session and we have sessions, load the first one
       if (!currentSessionId && response.data.sessions.length > 0) {
@@ -43,24 +52,49 @@ const Chat = ({ user, token, onSignOut }) => {
     }
   };
 
-  const loadSessionHistory = async (sessionId) => {
-    try {
-      const response = await axios.get(`/chat/sessions/${sessionId}/history`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      
-      setMessages(response.data.messages.map(msg => ({
+  const fetchHistoryPage = async (sessionId, cursor) => {
+    const response = await axios.get(`/chat/sessions/${sessionId}/history`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params: cursor ? { cursor } : {}
+    });
+    return {
+      messages: response.data.messages.map(msg => ({
         id: `${msg.timestamp}-${msg.role}`,
         role: msg.role,
         content: msg.content,
         timestamp: msg.timestamp
-      })));
+      })),
+      nextCursor: response.data.next_cursor
+    };
+  };
+
+  // Only the newest page is loaded on a session switch; older pages on demand
+  const loadSessionHistory = async (sessionId) => {
+    try {
+      const page = await fetchHistoryPage(sessionId, null);
+      setMessages(page.messages);
+      setHistoryCursor(page.nextCursor);
       setCurrentSessionId(sessionId);
     } catch (error) {
       console.error('Error loading session history:', error);
     }
   };
 
+  const loadEarlierMessages = async () => {
+    if (!currentSessionId || !historyCursor || isLoadingEarlier) return;
+    setIsLoadingEarlier(true);
+    try {
+      const page = await fetchHistoryPage(currentSessionId, historyCursor);
+      skipScrollRef.current = true;
+      setMessages(prev => [...page.messages, ...prev]);
+      setHistoryCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Error loading earlier messages:', error);
+    } finally {
+      setIsLoadingEarlier(false);
+    }
+  };
+
   const sendMessage = async () => {
     if (!inputMessage.trim() || isLoading) return;
 
@@ -120,6 +154,7 @@ const Chat = ({ user, token, onSignOut }) => {
 
   const startNewChat = () => {
     setMessages([]);
+    setHistoryCursor(null);
     setCurrentSessionId(null);
   };
 
@@ -130,9 +165,13 @@ const Chat = ({ user, token, onSignOut }) => {
       await axios.delete(`/chat/sessions/${currentSessionId}`, {
         headers: { Authorization: `Bearer ${token}` }
       });
+      // Deletion finishes in the background; drop it from the list now
+      // rather than reloading a list that may still include it
+      const clearedId = currentSessionId;
+      setSessions(prev => prev.filter(session => session.session_id !== clearedId));
       setMessages([]);
+      setHistoryCursor(null);
       setCurrentSessionId(null);
-      loadSessions();
     } catch (error) {
       console.error('Error clearing session:', error);
     }
@@ -158,14 +197,14 @@ const Chat = ({ user, token, onSignOut }) => {
             {isLoadingSessions ? (
               <div className="loading">Loading sessions...</div>
             ) : (
-              sessions.map((sessionId, index) => (
+              sessions.map((session) => (
                 <div
-                  key={sessionId}
-                  className={`session-item ${sessionId === currentSessionId ? 'active' : ''}`}
-                  onClick={() => loadSessionHistory(sessionId)}
-                  title={sessionId}
+                  key={session.session_id}
+                  className={`session-item ${session.session_id === currentSessionId ? 'active' : ''}`}
+                  onClick={() => loadSessionHistory(session.session_id)}
+                  title={`${session.session_id} (${session.message_count} messages)`}
                 >
-                  {sessionId}
+                  {session.title || session.session_id}
                 </div>
               ))
             )}
@@ -182,6 +221,15 @@ const Chat = ({ user, token, onSignOut }) => {
 
         <div className="chat-panel">
           <div className="messages-container">
+            {historyCursor && (
+              <button
+                className="load-earlier-button"
+                onClick={loadEarlierMessages}
+                disabled={isLoadingEarlier}
+              >
+                {isLoadingEarlier ? 'Loading...' : 'Load earlier messages'}
+              </button>
+            )}
             {messages.length === 0 ? (
               <div className="empty-state">
                 <p>Start a conversation with Jamie!</p>
@@ -0,0 +1,317 @@
+import asyncio
+import contextvars
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+from agent.metrics import SQLITE_LATENCY
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a free-text query: case, punctuation and spacing don't matter"""
+    return " ".join(re.findall(r"[\w$]+", query.lower()))
+
+
+class DiskCache:
+    """
+    SQLite-backed cache tier shared by every worker process on the host.
+    Values are stored as JSON alongside the time they were fetched.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_stored_at ON cache(namespace, stored_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock, SQLITE_LATENCY.time(db="places_cache", operation="get"):
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, namespace: str, key: str, value: Any, stored_at: float):
+        with self._lock, SQLITE_LATENCY.time(db="places_cache", operation="put"):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), stored_at),
+            )
+            self._conn.commit()
+
+    def purge(self, namespace: str, older_than: float) -> int:
+        with self._lock, SQLITE_LATENCY.time(db="places_cache", operation="purge"):
+            deleted = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND stored_at < ?",
+                (namespace, older_than),
+            ).rowcount
+            self._conn.commit()
+        return deleted
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one. The first caller
+    (the leader) runs the function; callers arriving while it is in flight
+    wait for and share its result or exception. Works from threads (`do`)
+    and coroutines (`do_async`), and the two share in-flight calls.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def _join(self, key: Any) -> Tuple[Future, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                return call, False
+            call = Future()
+            self._calls[key] = call
+            self.stats["leaders"] += 1
+            return call, True
+
+    def _finish(self, key: Any, call: Future, value: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            call.set_exception(error)
+        else:
+            call.set_result(value)
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared); shared is True for callers that waited on a leader"""
+        call, leader = self._join(key)
+        if not leader:
+            return call.result(), True
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, value)
+        return value, False
+
+    async def do_async(self, key: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Like `do` for a coroutine function; waiting never blocks the event loop"""
+        call, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(call), True
+        try:
+            value = await fn()
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, value)
+        return value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class TieredCache:
+    """
+    In-process LRU in front of an optional DiskCache, with stale-while-revalidate.
+
+    An entry younger than `ttl` is served as is. Between `ttl` and
+    `ttl + stale_ttl` it is still served, but a background refresh is
+    started (at most one per key). Older entries are refetched inline.
+    Empty results are never cached so transient upstream errors don't stick.
+    Concurrent misses for the same key share one fetch (see SingleFlight).
+    Disk entries past `ttl + stale_ttl` are never served; writes delete them
+    at most once every `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        stale_ttl: float = 0,
+        max_entries: int = 1024,
+        disk: Optional[DiskCache] = None,
+        clock: Callable[[], float] = time.time,
+        purge_interval: float = 3600,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.disk = disk
+        self.clock = clock
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "coalesced": 0,
+            "purged": 0,
+        }
+        self.flight = SingleFlight()
+        self._memory: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        if self.disk is not None:
+            entry = self.disk.get(self.namespace, key)
+            if entry is not None:
+                self._remember(key, entry)
+                self._count("disk_hits")
+                return entry
+        return None
+
+    def _count(self, stat: str, n: int = 1):
+        # Shared by request threads; the stats feed /metrics
+        with self._lock:
+            self.stats[stat] += n
+
+    def _remember(self, key: str, entry: Tuple[Any, float]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def set(self, key: str, value: Any):
+        if not value:
+            return
+        stored_at = self.clock()
+        self._remember(key, (value, stored_at))
+        if self.disk is not None:
+            self.disk.put(self.namespace, key, value, stored_at)
+            self._maybe_purge(stored_at)
+
+    def _maybe_purge(self, now: float):
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        self._count("purged", self.disk.purge(self.namespace, now - self.ttl - self.stale_ttl))
+
+    def _fetch_and_store(self, key: str, fetch: Callable[[], Any]) -> Any:
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], flight_key: Any):
+        try:
+            self.flight.do(flight_key, lambda: self._fetch_and_store(key, fetch))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any], flight_key: Any = None) -> Any:
+        """
+        `flight_key` (default: `key`) decides which concurrent misses share
+        a fetch, for callers whose fetches differ by more than the key
+        """
+        if flight_key is None:
+            flight_key = key
+        entry = self._lookup(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = self.clock() - stored_at
+            if age < self.ttl:
+                self._count("hits")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                with self._lock:
+                    self.stats["stale_hits"] += 1
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                    if start:
+                        self.stats["refreshes"] += 1
+                if start:
+                    # In a copy of this context, so the refresh keeps the
+                    # caller's request ID and priority
+                    threading.Thread(
+                        target=contextvars.copy_context().run,
+                        args=(self._refresh, key, fetch, flight_key),
+                        daemon=True,
+                    ).start()
+                return value
+
+        value, shared = self.flight.do(flight_key, lambda: self._fetch_and_store(key, fetch))
+        self._count("coalesced" if shared else "misses")
+        return value
+
+
+def _minute_of_week(day: int, hour: int, minute: int) -> int:
+    return (day * 24 + hour) * 60 + minute
+
+
+def recompute_open_now(details: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Return details with openNow recomputed from the opening periods for the
+    current time, so cached details never report a stale open/closed state.
+    Needs utcOffsetMinutes to know the place's local time; without it the
+    cached value is left untouched.
+    """
+    offset = details.get("utcOffsetMinutes")
+    if offset is None:
+        return details
+    now = now or datetime.now(timezone.utc)
+    local = now.astimezone(timezone(timedelta(minutes=offset)))
+    # Places days run 0=Sunday..6=Saturday; isoweekday() is 1=Monday..7=Sunday
+    current = _minute_of_week(local.isoweekday() % 7, local.hour, local.minute)
+
+    def is_open(hours: Dict[str, Any]) -> bool:
+        for period in hours.get("periods", []):
+            start = period.get("open")
+            if not start:
+                continue
+            end = period.get("close")
+            if end is None:
+                return True  # Open 24 hours
+            opens = _minute_of_week(start.get("day", 0), start.get("hour", 0), start.get("minute", 0))
+            closes = _minute_of_week(end.get("day", 0), end.get("hour", 0), end.get("minute", 0))
+            if opens <= closes:
+                if opens <= current < closes:
+                    return True
+            elif current >= opens or current < closes:
+                return True  # Period wraps past the end of the week
+        return False
+
+    updated = dict(details)
+    if "regularOpeningHours" in updated and updated["regularOpeningHours"].get("periods"):
+        updated["regularOpeningHours"] = dict(updated["regularOpeningHours"])
+        updated["regularOpeningHours"]["openNow"] = is_open(updated["regularOpeningHours"])
+    if updated.get("regularSecondaryOpeningHours"):
+        secondary = []
+        for hours in updated["regularSecondaryOpeningHours"]:
+            hours = dict(hours)
+            if hours.get("periods"):
+                hours["openNow"] = is_open(hours)
+            secondary.append(hours)
+        updated["regularSecondaryOpeningHours"] = secondary
+    return updated
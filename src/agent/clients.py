@@ -1,12 +1,54 @@
-import google.generativeai as genai
-from typing import Optional
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
 from config import Config
+from agent.log import get_logger
+from agent.metrics import EXTERNAL_LATENCY, REGISTRY
+from agent.cache import DiskCache, TieredCache, normalize_query, recompute_open_now
+from agent.rate_limit import (
+    PriorityRateLimiter,
+    RateLimitExceeded,
+    current_priority,
+    get_rate_limiter,
+)
 import requests
+from requests.adapters import HTTPAdapter
+
+log = get_logger(__name__)
+
+DETAILS_FIELD_MASK = (
+    "displayName,formattedAddress,priceLevel,editorialSummary,name,"
+    "regularOpeningHours,googleMapsLinks,regularSecondaryOpeningHours,"
+    "utcOffsetMinutes"
+)
+
+# Field masks by what a follow-up needs. Each tier includes the fields
+# PlaceDetails requires; "full" is the default mask above.
+_BASE_FIELDS = "name,displayName,formattedAddress"
+FIELD_MASK_TIERS = {
+    "address": _BASE_FIELDS,
+    "hours": f"{_BASE_FIELDS},regularOpeningHours,regularSecondaryOpeningHours,utcOffsetMinutes",
+    "links": f"{_BASE_FIELDS},googleMapsLinks",
+    "full": DETAILS_FIELD_MASK,
+}
+
+
+def tier_covers(cached_tier: str, wanted_tier: str) -> bool:
+    """Whether details fetched with one tier have every field another needs"""
+    cached = set(FIELD_MASK_TIERS[cached_tier].split(","))
+    return set(FIELD_MASK_TIERS[wanted_tier].split(",")) <= cached
 
 
 class GeminiClient:
     def __init__(self):
         Config.validate()
+        # Imported here: the SDK takes most of a second to import, and only
+        # agent turns need it
+        import google.generativeai as genai
+
         genai.configure(api_key=Config.GEMINI_API_KEY)
         self.model = genai.GenerativeModel("gemini-2.5-flash")
 
@@ -17,7 +59,8 @@ class GeminiClient:
         if system_prompt:
             full_prompt = f"{system_prompt}\n\n{prompt}"
 
-        response = self.model.generate_content(full_prompt)
+        with EXTERNAL_LATENCY.time(service="gemini", operation="generate"):
+            response = self.model.generate_content(full_prompt)
         return response.text
 
     def generate_with_tools(
@@ -27,17 +70,178 @@ class GeminiClient:
         if system_prompt:
             full_prompt = f"{system_prompt}\n\n{prompt}"
 
-        response = self.model.generate_content(full_prompt, tools=tools)
+        with EXTERNAL_LATENCY.time(service="gemini", operation="generate_with_tools"):
+            response = self.model.generate_content(full_prompt, tools=tools)
         return response.text
 
 
+class PlacesCache:
+    """Search and details caches shared by every PlacesClient in the process"""
+
+    def __init__(self, disk_path: Optional[str] = None):
+        disk = DiskCache(disk_path) if disk_path else None
+        self.search = TieredCache(
+            "places_search",
+            ttl=Config.PLACES_SEARCH_TTL,
+            stale_ttl=Config.PLACES_STALE_TTL,
+            disk=disk,
+            purge_interval=Config.PLACES_CACHE_PURGE_INTERVAL,
+        )
+        self.details = TieredCache(
+            "places_details",
+            ttl=Config.PLACES_DETAILS_TTL,
+            stale_ttl=Config.PLACES_STALE_TTL,
+            disk=disk,
+            purge_interval=Config.PLACES_CACHE_PURGE_INTERVAL,
+        )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"search": dict(self.search.stats), "details": dict(self.details.stats)}
+
+
+_shared_cache: Optional[PlacesCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_places_cache() -> PlacesCache:
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PlacesCache(Config.PLACES_CACHE_PATH)
+        return _shared_cache
+
+
+def _places_cache_metrics():
+    if _shared_cache is None:
+        return []
+    events, ratios = [], []
+    for cache, stats in _shared_cache.stats().items():
+        events.extend(({"cache": cache, "event": event}, n) for event, n in stats.items())
+        served = stats["hits"] + stats["stale_hits"]
+        lookups = served + stats["misses"] + stats["coalesced"]
+        ratios.append(({"cache": cache}, served / lookups if lookups else 0.0))
+    return [
+        ("places_cache_events_total", "counter", "Places cache lookups by outcome", events),
+        ("places_cache_hit_ratio", "gauge", "Share of Places lookups served from cache", ratios),
+    ]
+
+
+REGISTRY.register_collector("places_cache", _places_cache_metrics)
+
+
 class PlacesClient:
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[PlacesCache] = None,
+        base_url: Optional[str] = None,
+        limiter: Optional[PriorityRateLimiter] = None,
+    ):
         Config.validate()
         self.api_key = Config.PLACES_API_KEY
-        self.base_url = "https://places.googleapis.com/v1"
+        self.base_url = (base_url or Config.PLACES_BASE_URL).rstrip("/")
+        self.cache = cache or get_places_cache()
+        self.limiter = limiter or get_rate_limiter(self.api_key)
 
-    def search_place(self, query: str) -> dict:
+        # Keep-alive connections reused across calls and batch workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=Config.PLACES_POOL_SIZE, max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _batch_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=Config.PLACES_POOL_SIZE, thread_name_prefix="places-batch"
+                )
+            return self._executor
+
+    def search_place(self, query: str) -> list:
+        key = normalize_query(query)
+        return self.cache.search.get_or_fetch(
+            key, lambda: self._search_place(query), flight_key=(key, current_priority())
+        )
+
+    def get_place_details(self, place_id: str, field_mask: Optional[str] = None) -> dict:
+        # Narrower masks are cached separately so they never shadow full details
+        if field_mask:
+            key = f"{place_id}|{field_mask}"
+            fetch = lambda: self._get_place_details(place_id, field_mask)
+        else:
+            key = place_id
+            fetch = lambda: self._get_place_details(place_id)
+        # The fetch waits for quota at the leader's priority, so callers only
+        # share a flight with callers of the same priority: an interactive
+        # request never inherits a prefetch's short deadline or its shedding
+        details = self.cache.details.get_or_fetch(key, fetch, flight_key=(key, current_priority()))
+        # Opening state changes by the minute, unlike the rest of the details
+        return recompute_open_now(details) if details else details
+
+    async def search_place_async(self, query: str) -> list:
+        """search_place for async callers; identical in-flight queries still coalesce"""
+        return await asyncio.to_thread(self.search_place, query)
+
+    async def get_place_details_async(self, place_id: str, field_mask: Optional[str] = None) -> dict:
+        return await asyncio.to_thread(self.get_place_details, place_id, field_mask)
+
+    def get_place_details_many(
+        self,
+        place_ids: List[str],
+        field_mask: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, dict]:
+        """
+        Fetch details for several places concurrently. Duplicate IDs are
+        fetched once. Returns whatever finished within `deadline` seconds,
+        keyed by place ID; places that failed or timed out are left out.
+        """
+        if deadline is None:
+            deadline = Config.PLACES_BATCH_DEADLINE
+        unique_ids = list(dict.fromkeys(place_ids))
+        executor = self._batch_executor()
+        # Each worker runs in a copy of the caller's context (request ID, priority)
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, self.get_place_details, place_id, field_mask
+            ): place_id
+            for place_id in unique_ids
+        }
+
+        results: Dict[str, dict] = {}
+        pending = set(futures)
+        expires = time.monotonic() + deadline
+        while pending:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    details = future.result()
+                except Exception as e:
+                    log.warning("place_details_failed", place_id=futures[future], error=str(e))
+                    continue
+                if details:
+                    results[futures[future]] = details
+        for future in pending:
+            future.cancel()
+        if pending:
+            log.warning("place_details_batch_deadline", deadline=deadline, pending=len(pending))
+
+        # Input order, not completion order
+        return {place_id: results[place_id] for place_id in unique_ids if place_id in results}
+
+    def _throttle(self, response: requests.Response):
+        """Back the shared bucket off when Places reports quota exhaustion"""
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            self.limiter.penalize(float(retry_after) if retry_after.isdigit() else 1.0)
+
+    def _search_place(self, query: str) -> list:
         url = f"{self.base_url}/places:searchText"
         headers = {
             "Content-Type": "application/json",
@@ -49,30 +253,63 @@ class PlacesClient:
             "includedType": "restaurant",
         }
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
-            response.raise_for_status()
+            self.limiter.acquire()
+            with EXTERNAL_LATENCY.time(service="places", operation="search"):
+                response = self.session.post(url, headers=headers, json=payload, timeout=10)
+                self._throttle(response)
+                response.raise_for_status()
             data = response.json()
             return data.get("places", [])
+        except RateLimitExceeded as e:
+            log.warning("places_search_shed", error=str(e))
+            return []
         except Exception as e:
-            print(f"Error searching places: {e}")
-            return {}
+            log.error("places_search_failed", error=str(e))
+            return []
 
-    def get_place_details(self, place_id: str) -> dict:
+    def _get_place_details(self, place_id: str, field_mask: Optional[str] = None) -> dict:
         url = f"{self.base_url}/{place_id}"
-        field_mask = (
-            "displayName,formattedAddress,priceLevel,editorialSummary,name,"
-            "regularOpeningHours,googleMapsLinks,regularSecondaryOpeningHours"
-        )
         headers = {
             "Content-Type": "application/json",
             "X-Goog-Api-Key": self.api_key,
-            "X-Goog-FieldMask": field_mask,
+            "X-Goog-FieldMask": field_mask or DETAILS_FIELD_MASK,
         }
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            self.limiter.acquire()
+            with EXTERNAL_LATENCY.time(service="places", operation="details"):
+                response = self.session.get(url, headers=headers, timeout=10)
+                self._throttle(response)
+                response.raise_for_status()
             data = response.json()
             return data
+        except RateLimitExceeded as e:
+            log.warning("place_details_shed", place_id=place_id, error=str(e))
+            return {}
         except Exception as e:
-            print(f"Error getting place details: {e}")
+            log.error("place_details_failed", place_id=place_id, error=str(e))
             return {}
+
+    def close(self):
+        """Release pooled connections and batch workers"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.session.close()
+
+
+_shared_client: Optional[PlacesClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_places_client() -> PlacesClient:
+    """
+    The process-wide PlacesClient. Agents are created per session, and a
+    client each would leave a connection pool and batch worker threads
+    behind for every session.
+    """
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = PlacesClient()
+        return _shared_client
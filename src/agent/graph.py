@@ -1,12 +1,17 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import json
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from .clients import GeminiClient
+from .log import get_logger, request_context
+from .metrics import AGENT_LATENCY
 from .schemas import SessionState, IntentType, ConversationMessage, MessageRole
+import time
 from datetime import datetime
 from .tools.restaurants import RestaurantTool
+from .tools.resolver import detail_tier
 from .tools.recipes import RecipeTool
+from .tools.order import OrderTool
+
+log = get_logger(__name__)
 
 
 class JamieAgent:
@@ -14,9 +19,13 @@ class JamieAgent:
         self.llm_client = GeminiClient()
         self.restaurant_tool = RestaurantTool()
         self.recipe_tool = RecipeTool()
+        self.order_tool = OrderTool(self.restaurant_tool)
         self.graph = self._build_graph()
 
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self):
+        # Deferred like the Gemini SDK: LangGraph is slow to import
+        from langgraph.graph import StateGraph, END
+
         workflow = StateGraph(SessionState)
 
         workflow.add_node("intent_classifier", self._classify_intent)
@@ -24,6 +33,7 @@ class JamieAgent:
         workflow.add_node("restaurant_details", self._get_restaurant_details)
         workflow.add_node("recipe_search", self._search_recipes)
         workflow.add_node("recipe_details", self._get_recipe_details)
+        workflow.add_node("place_order", self._place_order)
         workflow.add_node("generate_response", self._generate_response)
 
         workflow.set_entry_point("intent_classifier")
@@ -36,6 +46,7 @@ class JamieAgent:
                 "restaurant_details": "restaurant_details",
                 "recipe_search": "recipe_search",
                 "recipe_details": "recipe_details",
+                "place_order": "place_order",
                 "unknown": "generate_response",
             },
         )
@@ -44,6 +55,7 @@ class JamieAgent:
         workflow.add_edge("restaurant_details", "generate_response")
         workflow.add_edge("recipe_search", "generate_response")
         workflow.add_edge("recipe_details", "generate_response")
+        workflow.add_edge("place_order", "generate_response")
         workflow.add_edge("generate_response", END)
 
         return workflow.compile()
@@ -62,11 +74,12 @@ class JamieAgent:
 
     def _classify_intent(self, state: SessionState) -> SessionState:
         system_prompt = """You are Jamie, a food recommendation assistant. 
-        Classify the user's intent as one of: restaurant_search, restaurant_details, recipe, or unknown.
+        Classify the user's intent as one of: restaurant_search, restaurant_details, recipe_search, recipe_details, order, or unknown.
         - Use 'restaurant_search' for new searches (e.g., "find italian food").
         - Use 'restaurant_details' for follow-up questions about specific restaurants that have already been mentioned (e.g., "what are the hours for the second one?", "tell me more about that place"). Do not route to this if there is no prior restaurant search in the conversation.
         - Use 'recipe_search' for recipe-related queries.
         - Use 'recipe_details' for follow-up questions about specific recipes that have already been mentioned (e.g., "what are the ingredients for that recipe?", "tell me more about that recipe"). Do not route to this if there is no prior recipe search in the conversation.
+        - Use 'order' when the user wants to order a meal from one of the restaurants already mentioned (e.g., "order the pad thai from the first one"). Do not route to this if there is no prior restaurant search in the conversation.
         Consider the full conversation context. Return only the intent type."""
 
         conversation_context = self._build_conversation_context(state.messages)
@@ -79,11 +92,12 @@ class JamieAgent:
             "restaurant_details": IntentType.RESTAURANT_DETAILS,
             "recipe_search": IntentType.RECIPE_SEARCH,
             "recipe_details": IntentType.RECIPE_DETAILS,
+            "order": IntentType.ORDER,
         }
 
         intent = intent_map.get(intent_response.strip().lower(), IntentType.UNKNOWN)
         state.current_intent = intent
-        print(f"Classified intent: {state.current_intent}")
+        log.info("intent_classified", intent=state.current_intent.value)
         return state
 
     def _route_intent(self, state: SessionState) -> str:
@@ -92,16 +106,35 @@ class JamieAgent:
         elif state.current_intent == IntentType.RESTAURANT_DETAILS:
             return "restaurant_details"
         elif state.current_intent == IntentType.RECIPE_SEARCH:
-            print("Routing to recipe search")
             return "recipe_search"
         elif state.current_intent == IntentType.RECIPE_DETAILS:
-            print("Routing to recipe details")
             return "recipe_details"
+        elif state.current_intent == IntentType.ORDER:
+            return "place_order"
         else:
-            print("Routing to unknown")
             return "unknown"
 
     def _get_restaurant_details(self, state: SessionState) -> SessionState:
+        # Track tool usage
+        state.context["tools_used"] = state.context.get("tools_used", [])
+        state.context["tools_used"].append("RestaurantTool.get_restaurant_details")
+
+        # Resolve ordinals, names and "that place" locally; only ask the LLM
+        # when the reference is ambiguous
+        latest = state.messages[-1].content if state.messages else ""
+        # Only fetch the fields the question needs (address, hours, links)
+        tier = detail_tier(latest)
+        resolution = self.restaurant_tool.resolve_reference(latest)
+        if resolution.resolved:
+            log.info("restaurant_resolved", method=resolution.method, index=resolution.index)
+            details = self.restaurant_tool.get_restaurant_details_by_index(resolution.index, tier)
+            if details:
+                state.context["restaurant_details"] = details.model_dump()
+                return state
+
+        return self._select_restaurant_with_llm(state, tier)
+
+    def _select_restaurant_with_llm(self, state: SessionState, tier: str = "full") -> SessionState:
         # Use full conversation history for context
         conversation_context = self._build_conversation_context(state.messages)
 
@@ -135,11 +168,7 @@ class JamieAgent:
             system_prompt.format(restaurant_list=restaurant_list_str),
         ).strip()
 
-        print(f"Restaurant selection: {selection}")
-
-        # Track tool usage
-        state.context["tools_used"] = state.context.get("tools_used", [])
-        state.context["tools_used"].append("RestaurantTool.get_restaurant_details")
+        log.info("restaurant_selected", selection=selection)
 
         # Try to get details by name first, then by index
         details = None
@@ -147,16 +176,12 @@ class JamieAgent:
             # Check if selection is a number (index)
             if selection.isdigit():
                 index = int(selection)
-                details = self.restaurant_tool.get_restaurant_details_by_index(index)
-                print(
-                    f"Fetching details for restaurant at index {index}: {self.restaurant_tool.last_search_results[index].name}"
-                )
+                details = self.restaurant_tool.get_restaurant_details_by_index(index, tier)
             else:
                 # Try to get by name
-                details = self.restaurant_tool.get_restaurant_details_by_name(selection)
-                print(f"Fetching details for restaurant by name: {selection}")
+                details = self.restaurant_tool.get_restaurant_details_by_name(selection, tier)
         except (ValueError, IndexError) as e:
-            print(f"Error parsing restaurant selection: {e}")
+            log.warning("restaurant_selection_invalid", selection=selection, error=str(e))
             details = None
 
         if details:
@@ -175,8 +200,16 @@ class JamieAgent:
         state.context["tools_used"] = state.context.get("tools_used", [])
         state.context["tools_used"].append("RestaurantTool.search_restaurants")
         restaurants = self.restaurant_tool.search_restaurants(conversation_context)
-        print(f"Found {len(restaurants)} restaurants")
+        log.info("restaurants_found", count=len(restaurants))
         state.context["restaurants"] = [rest.model_dump() for rest in restaurants]
+
+        # "under $15, vegetarian": filter the local menus of these restaurants
+        latest = state.messages[-1].content if state.messages else ""
+        filters = self.order_tool.menus.parse_filters(latest)
+        if filters:
+            state.context["tools_used"].append("OrderTool.find_meals")
+            meals = self.order_tool.find_meals(**filters)
+            state.context["meals"] = [meal.model_dump() for meal in meals]
         return state
 
     def _search_recipes(self, state: SessionState) -> SessionState:
@@ -212,7 +245,7 @@ class JamieAgent:
         )
 
         try:
-            print("using search criteria:", search_criteria)
+            log.debug("recipe_search_criteria", criteria=search_criteria)
             criteria = json.loads(search_criteria)
             # We call find_recipes here, so record that actual tool usage
             state.context["tools_used"].append("RecipeTool.find_recipes")
@@ -247,7 +280,7 @@ class JamieAgent:
         recipe_id = self.llm_client.generate_response(
             f"Conversation context: {conversation_context}", system_prompt
         ).strip()
-        print(f"Fetching details for recipe ID: {recipe_id}")
+        log.info("recipe_details_requested", recipe_id=recipe_id)
         # Track tool usage
         state.context["tools_used"] = state.context.get("tools_used", [])
         state.context["tools_used"].append("RecipeTool.get_recipe_details")
@@ -259,6 +292,54 @@ class JamieAgent:
 
         return state
 
+    def _place_order(self, state: SessionState) -> SessionState:
+        state.context["tools_used"] = state.context.get("tools_used", [])
+        state.context["tools_used"].append("OrderTool.place_order")
+
+        if not self.restaurant_tool.last_search_results:
+            state.context["order_error"] = "There are no restaurants to order from yet."
+            return state
+
+        latest = state.messages[-1].content if state.messages else ""
+        resolution = self.restaurant_tool.resolve_reference(latest)
+        restaurant_list = "\n".join(
+            f"{i}. {r.name}" for i, r in enumerate(self.restaurant_tool.last_search_results)
+        )
+        system_prompt = """The user wants to order a meal from one of these restaurants:
+        {restaurant_list}
+
+        Return a JSON object: {{"restaurant_index": number or null, "meal": "meal name" or null}}"""
+        conversation_context = self._build_conversation_context(state.messages)
+        extracted = self.llm_client.generate_response(
+            f"Conversation context: {conversation_context}",
+            system_prompt.format(restaurant_list=restaurant_list),
+        )
+        try:
+            request = json.loads(extracted)
+        except json.JSONDecodeError:
+            request = {}
+
+        index = resolution.index if resolution.resolved else request.get("restaurant_index")
+        meal = request.get("meal")
+        if index is None or not meal:
+            state.context["order_error"] = "Which restaurant and which meal would you like to order?"
+            return state
+
+        try:
+            restaurant = self.restaurant_tool.last_search_results[int(index)]
+            order = self.order_tool.place_order(
+                user_id=state.user_id,
+                restaurant_id=restaurant.id,
+                meal_name=meal,
+                # Without a client key every request is a new order
+                idempotency_key=state.idempotency_key,
+            )
+            state.context["order"] = order.model_dump()
+        except (ValueError, IndexError) as e:
+            log.warning("order_failed", error=str(e))
+            state.context["order_error"] = str(e)
+        return state
+
     def _generate_response(self, state: SessionState) -> SessionState:
         # Use full conversation history for context
         conversation_context = self._build_conversation_context(state.messages)
@@ -288,9 +369,16 @@ class JamieAgent:
             3. Provide helpful details about location, price, and cuisine type"""
 
         context_info = ""
-        print("Generating response with context:\n\n", state.context)
+        # Rendered (and capped) only when DEBUG is enabled
+        log.debug("generating_response", context=lambda: state.context)
         if "restaurants" in state.context:
             context_info += f"Restaurants: {state.context['restaurants']}\n"
+        if "meals" in state.context:
+            context_info += f"Matching meals: {state.context['meals']}\n"
+        if "order" in state.context:
+            context_info += f"Order placed: {state.context['order']}\n"
+        if "order_error" in state.context:
+            context_info += f"Order problem: {state.context['order_error']}\n"
         if "recipes" in state.context:
             context_info += f"Recipes: {state.context['recipes']}\n"
             if "search_criteria" in state.context:
@@ -341,42 +429,54 @@ class JamieAgent:
         message: str,
         session_id: str = None,
         conversation_history: List[ConversationMessage] = None,
+        idempotency_key: Optional[str] = None,
     ) -> str:
-        try:
-            conversation_message = ConversationMessage(
-                session_id=session_id or "",
-                user_id=user_id,
-                role=MessageRole.USER,
-                content=message,
-                timestamp=datetime.utcnow().isoformat() + "Z",
-            )
+        with request_context():
+            start = time.perf_counter()
+            try:
+                conversation_message = ConversationMessage(
+                    session_id=session_id or "",
+                    user_id=user_id,
+                    role=MessageRole.USER,
+                    content=message,
+                    timestamp=datetime.utcnow().isoformat() + "Z",
+                )
 
-            # Combine conversation history with current message
-            all_messages = (conversation_history or []) + [conversation_message]
+                # Combine conversation history with current message
+                all_messages = (conversation_history or []) + [conversation_message]
 
-            print(
-                f"[DEBUG] Creating session state for user {user_id} with {len(all_messages)} messages"
-            )
-            state = SessionState(
-                user_id=user_id, session_id=session_id or "", messages=all_messages
-            )
-
-            print(f"[DEBUG] Invoking graph")
-            result = self.graph.invoke(state)
+                log.debug("graph_invoke", user_id=user_id, messages=len(all_messages))
+                state = SessionState(
+                    user_id=user_id,
+                    session_id=session_id or "",
+                    messages=all_messages,
+                    idempotency_key=idempotency_key,
+                )
 
-            print(f"[DEBUG] Graph result context: {result.get('context', {})}")
-            response = result["context"].get(
-                "response", "I'm sorry, I couldn't process your request."
-            )
-            print(f"[DEBUG] Final response: {response}")
-            return response
+                result = self.graph.invoke(state)
+                intent = result.get("current_intent") or IntentType.UNKNOWN
+                AGENT_LATENCY.observe(
+                    time.perf_counter() - start,
+                    intent=getattr(intent, "value", intent),
+                    outcome="ok",
+                )
 
-        except Exception as e:
-            import traceback
+                log.debug("graph_result", context=lambda: result.get("context", {}))
+                response = result["context"].get(
+                    "response", "I'm sorry, I couldn't process your request."
+                )
+                log.info("response_ready", user_id=user_id, response_chars=len(response))
+                return response
 
-            error_trace = traceback.format_exc()
-            print(f"[ERROR] Error in process_message:\n{error_trace}")
-            print(
-                f"[ERROR] State at failure: {vars(state) if 'state' in locals() else 'No state'}"
-            )
-            raise
+            except Exception:
+                AGENT_LATENCY.observe(
+                    time.perf_counter() - start, intent="failed", outcome="error"
+                )
+                failed_state = locals().get("state")
+                log.error(
+                    "process_message_failed",
+                    exc_info=True,
+                    user_id=user_id,
+                    state=lambda: vars(failed_state) if failed_state else None,
+                )
+                raise
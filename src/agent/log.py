@@ -0,0 +1,207 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+from config import Config
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None):
+    """
+    Tag every log line in this block (and in work it hands to other
+    threads with contextvars.copy_context) with one request ID. Nested
+    blocks without an explicit ID keep the outer one.
+    """
+    request_id = request_id or _request_id.get() or uuid.uuid4().hex[:12]
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+def _cap(value: Any, limit: int) -> Any:
+    """Render a field for the log line, truncated to `limit` characters"""
+    if callable(value):
+        value = value()
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if not isinstance(value, str):
+        if hasattr(value, "model_dump"):
+            value = value.model_dump()
+        try:
+            value = json.dumps(value, default=str)
+        except (TypeError, ValueError):
+            value = repr(value)
+    if len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+
+class StructFormatter(logging.Formatter):
+    """One line per event: JSON objects, or `level logger event key=value ...`"""
+
+    def __init__(self, fmt: str = "text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: Dict[str, Any] = getattr(record, "fields", {})
+        request_id = getattr(record, "request_id", None)
+        if self.fmt == "json":
+            line = {
+                "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                "level": record.levelname.lower(),
+                "logger": record.name,
+                "event": record.msg,
+            }
+            if request_id:
+                line["request_id"] = request_id
+            line.update(fields)
+            if record.exc_info:
+                line["exc"] = self.formatException(record.exc_info)
+            return json.dumps(line, default=str)
+
+        parts = [record.levelname, record.name, str(record.msg)]
+        if request_id:
+            parts.append(f"request_id={request_id}")
+        parts.extend(f"{key}={value}" for key, value in fields.items())
+        text = " ".join(parts)
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class StructLogger:
+    """
+    Leveled event logger. Fields are only rendered when the level is
+    enabled; pass a callable (e.g. `context=lambda: state.context`) to defer
+    expensive values too. Each field is capped at LOG_MAX_FIELD_CHARS.
+    `sample=0.01` keeps roughly 1 in 100 of an event; LOG_SAMPLE_RATES
+    ({"event": rate}) overrides it per event name.
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, sample: float, exc_info, fields: Dict[str, Any]):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = _sample_rates().get(event, sample)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        limit = Config.LOG_MAX_FIELD_CHARS
+        extra = {
+            "fields": {key: _cap(value, limit) for key, value in fields.items()},
+            "request_id": _request_id.get(),
+        }
+        self._logger.log(level, event, exc_info=exc_info, extra=extra)
+
+    def debug(self, event: str, sample: float = 1.0, **fields):
+        self._log(logging.DEBUG, event, sample, None, fields)
+
+    def info(self, event: str, sample: float = 1.0, **fields):
+        self._log(logging.INFO, event, sample, None, fields)
+
+    def warning(self, event: str, sample: float = 1.0, **fields):
+        self._log(logging.WARNING, event, sample, None, fields)
+
+    def error(self, event: str, sample: float = 1.0, exc_info=None, **fields):
+        self._log(logging.ERROR, event, sample, exc_info, fields)
+
+    def is_enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+
+_sample_cache: Dict[str, Dict[str, float]] = {}
+
+
+def _sample_rates() -> Dict[str, float]:
+    raw = Config.LOG_SAMPLE_RATES
+    if raw not in _sample_cache:
+        try:
+            _sample_cache[raw] = {k: float(v) for k, v in json.loads(raw).items()} if raw else {}
+        except (ValueError, AttributeError):
+            _sample_cache[raw] = {}
+            # Outside the "jamie" tree, so this can't re-enter the sampler
+            logging.getLogger(__name__).warning("Ignoring invalid LOG_SAMPLE_RATES: %r", raw)
+    return _sample_cache[raw]
+
+
+class _QueueHandler(QueueHandler):
+    # Fields are already rendered, so the record can cross threads as is
+    # and all formatting happens on the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+ROOT = "jamie"
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(stream=None, level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Route the "jamie" loggers to `stream` (stderr by default) through a
+    queue, so formatting and writing happen on a background thread.
+    Safe to call again to reconfigure.
+    """
+    global _configured, _listener
+    with _configure_lock:
+        root = logging.getLogger(ROOT)
+        if _listener:
+            _listener.stop()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(StructFormatter(fmt or Config.LOG_FORMAT))
+        log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, handler)
+        _listener.start()
+
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel((level or Config.LOG_LEVEL).upper())
+        root.propagate = False
+        _configured = True
+
+
+def flush_logging():
+    """Write out everything logged so far (stops and restarts the listener)"""
+    with _configure_lock:
+        if _listener:
+            _listener.stop()
+            _listener.start()
+
+
+def _shutdown():
+    if _listener:
+        _listener.stop()
+
+
+atexit.register(_shutdown)
+
+
+def get_logger(name: str) -> StructLogger:
+    """Logger under the "jamie" hierarchy, e.g. get_logger(__name__)"""
+    if not _configured:
+        configure_logging()
+    return StructLogger(f"{ROOT}.{name}")
@@ -0,0 +1,339 @@
+import bisect
+import os
+import resource
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from a cache hit to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, Dict[str, str], float]  # (name suffix, labels, value)
+
+
+class _Shards:
+    """
+    Per-thread value tables. The hot path only touches the calling thread's
+    own dict, so increments need no lock and can't be lost; a scrape sums
+    every thread's table. The lock is taken once per thread, on first use.
+    Tables of threads that have exited are folded into one at scrape time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._tables: List[Tuple[threading.Thread, Dict[tuple, list]]] = []
+        self._retired: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def mine(self) -> Dict[tuple, list]:
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = {}
+            with self._lock:
+                self._tables.append((threading.current_thread(), table))
+            self._local.table = table
+        return table
+
+    @staticmethod
+    def _add(totals: Dict[tuple, list], table: Dict[tuple, list], size: int):
+        # list() copies the items atomically under the GIL while the owner
+        # thread may be adding keys
+        for key, values in list(table.items()):
+            total = totals.setdefault(key, [0.0] * size)
+            for i, v in enumerate(values):
+                total[i] += v
+
+    def merged(self, size: int) -> Dict[tuple, list]:
+        with self._lock:
+            live = []
+            for thread, table in self._tables:
+                if thread.is_alive():
+                    live.append((thread, table))
+                else:
+                    self._add(self._retired, table, size)
+            self._tables = live
+            totals = {key: list(values) for key, values in self._retired.items()}
+        for _, table in live:
+            self._add(totals, table, size)
+        return totals
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry=None):
+        if not name.endswith("_total"):
+            name += "_total"
+        super().__init__(name, help, labelnames, registry)
+
+    def inc(self, amount: float = 1.0, **labels):
+        table = self._shards.mine()
+        key = self._key(labels)
+        cell = table.get(key)
+        if cell is None:
+            table[key] = [amount]
+        else:
+            cell[0] += amount
+
+    def value(self, **labels) -> float:
+        return self._shards.merged(1).get(self._key(labels), [0.0])[0]
+
+    def samples(self) -> List[Sample]:
+        return [("", self._labels(k), v[0]) for k, v in sorted(self._shards.merged(1).items())]
+
+
+class Gauge(_Metric):
+    """Up/down gauge; inc and dec may happen on different threads"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        table = self._shards.mine()
+        key = self._key(labels)
+        cell = table.get(key)
+        if cell is None:
+            table[key] = [amount]
+        else:
+            cell[0] += amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._shards.merged(1).get(self._key(labels), [0.0])[0]
+
+    def samples(self) -> List[Sample]:
+        return [("", self._labels(k), v[0]) for k, v in sorted(self._shards.merged(1).items())]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "outcome", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.outcome = "ok"
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.outcome = "error"
+        if "outcome" in self.histogram.labelnames:
+            self.labels["outcome"] = self.outcome
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram; its _count doubles as the call counter.
+    `with HISTOGRAM.time(op="x") as t:` times a block. If the histogram has
+    an "outcome" label it is filled in as "ok", "error" (the block raised)
+    or whatever the block set on t.outcome.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        self._size = len(self.buckets) + 3  # buckets, +Inf, sum, count
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        table = self._shards.mine()
+        key = self._key(labels)
+        cell = table.get(key)
+        if cell is None:
+            cell = table[key] = [0.0] * self._size
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def time(self, **labels) -> _Timer:
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[tuple, list]:
+        return self._shards.merged(self._size)
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        for key, cell in sorted(self.snapshot().items()):
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append(("_bucket", {**labels, "le": le}, cumulative))
+            samples.append(("_sum", labels, cell[-2]))
+            samples.append(("_count", labels, cell[-1]))
+        return samples
+
+    def quantile(self, q: float, cell: list) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th observation, capped at
+        the largest bucket (None if empty)
+        """
+        total = cell[-1]
+        if not total:
+            return None
+        rank, cumulative = q * total, 0.0
+        for bound, count in zip(self.buckets, cell):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+# A collector returns (name, kind, help, [(labels, value), ...]) families
+# computed at scrape time, e.g. from a cache's stats dict
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self.metrics[metric.name] = metric
+
+    def register_collector(self, name: str, collector: Collector):
+        """Add (or replace) a scrape-time collector"""
+        with self._lock:
+            self.collectors[name] = collector
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(_line(metric.name + suffix, labels, value))
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f"# collector failed: {type(e).__name__}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(_line(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _line(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        name = f"{name}{{{rendered}}}"
+    if value == int(value) and abs(value) < 1e15:
+        return f"{name} {int(value)}"
+    return f"{name} {value!r}"
+
+
+REGISTRY = Registry()
+START_TIME = time.time()
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route, method and status", ["endpoint", "method", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["endpoint", "method"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+
+# Agent turns
+AGENT_LATENCY = Histogram(
+    "agent_turn_duration_seconds", "Agent turn latency by classified intent", ["intent", "outcome"]
+)
+
+# Calls to other services: Gemini, Places, GCS
+EXTERNAL_LATENCY = Histogram(
+    "external_call_duration_seconds",
+    "Calls to Gemini, Places and GCS by operation and outcome",
+    ["service", "operation", "outcome"],
+)
+
+# Local SQLite databases
+SQLITE_LATENCY = Histogram(
+    "sqlite_query_duration_seconds", "SQLite operations by database and operation", ["db", "operation"]
+)
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _process_metrics():
+    return [
+        ("process_resident_memory_bytes", "gauge", "Resident memory size", [({}, rss_bytes())]),
+        ("process_cpu_seconds_total", "counter", "CPU time used", [({}, time.process_time())]),
+        ("process_start_time_seconds", "gauge", "Process start (unix time)", [({}, START_TIME)]),
+    ]
+
+
+REGISTRY.register_collector("process", _process_metrics)
+
+
+def summarize(histogram: Histogram, by: str) -> Dict[str, Dict[str, float]]:
+    """Per-label-value count, average and p50/p95 bounds, for /stats"""
+    uptime = max(time.time() - START_TIME, 1e-9)
+    index = histogram.labelnames.index(by)
+    grouped: Dict[str, list] = {}
+    for key, cell in histogram.snapshot().items():
+        total = grouped.setdefault(key[index], [0.0] * len(cell))
+        for i, v in enumerate(cell):
+            total[i] += v
+    summary = {}
+    for value, cell in sorted(grouped.items()):
+        count = cell[-1]
+        summary[value] = {
+            "count": int(count),
+            "rate_per_s": round(count / uptime, 3),
+            "avg_s": round(cell[-2] / count, 4) if count else 0.0,
+            "p50_s": histogram.quantile(0.5, cell),
+            "p95_s": histogram.quantile(0.95, cell),
+        }
+    return summary
@@ -0,0 +1,253 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from config import Config
+
+# Lower numbers are served first
+INTERACTIVE = 0
+PREFETCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("places_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Mark Places calls made inside the block, e.g. background prefetches"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class MemoryBucketStore:
+    """Token bucket state for a single process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, fn: Callable[[Optional[Tuple[float, float]]], Tuple[float, float]]):
+        with self._lock:
+            self._buckets[key] = fn(self._buckets.get(key))
+            return self._buckets[key]
+
+
+class SqliteBucketStore:
+    """
+    Token bucket state in a SQLite file, so every worker process on the host
+    draws from the same bucket. Each update runs in a BEGIN IMMEDIATE
+    transaction, which holds the database write lock across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+        self._lock = threading.Lock()
+
+    def update(self, key: str, fn: Callable[[Optional[Tuple[float, float]]], Tuple[float, float]]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                state = fn(tuple(row) if row else None)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, state[0], state[1]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return state
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; a request costs one token"""
+
+    def __init__(self, key: str, rate: float, burst: float, store=None, clock: Callable[[], float] = time.time):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.store = store or MemoryBucketStore()
+        self.clock = clock
+
+    def _refill(self, state: Optional[Tuple[float, float]], now: float) -> float:
+        if state is None:
+            return self.burst
+        tokens, updated_at = state
+        return min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return seconds until one is"""
+        wait = 0.0
+
+        def take(state):
+            nonlocal wait
+            now = self.clock()
+            tokens = self._refill(state, now)
+            if tokens >= 1:
+                return tokens - 1, now
+            wait = (1 - tokens) / self.rate
+            return tokens, now
+
+        self.store.update(self.key, take)
+        return wait
+
+    def penalize(self, seconds: float):
+        """Stop handing out tokens for `seconds`, e.g. after an upstream 429"""
+        def drain(state):
+            now = self.clock()
+            return min(self._refill(state, now), 0.0) - seconds * self.rate, now
+
+        self.store.update(self.key, drain)
+
+
+class RateLimitExceeded(Exception):
+    """A request waited past its deadline for a rate-limit token and was shed"""
+
+
+class PriorityRateLimiter:
+    """
+    Token bucket with a priority queue in front of it. Waiters are served
+    in (priority, arrival) order, so an interactive search never waits
+    behind queued prefetches. A waiter still queued at its deadline is
+    shed: acquire() raises RateLimitExceeded instead of waiting forever.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        for name in PRIORITY_NAMES.values():
+            self._metric(name)
+
+    def _metric(self, name: str) -> Dict[str, float]:
+        return self._metrics.setdefault(
+            name, {"acquired": 0, "shed": 0, "wait_total": 0.0, "wait_max": 0.0}
+        )
+
+    def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None):
+        if priority is None:
+            priority = current_priority()
+        if timeout is None:
+            timeout = (
+                Config.PLACES_PREFETCH_DEADLINE
+                if priority == PREFETCH
+                else Config.PLACES_INTERACTIVE_DEADLINE
+            )
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        expires = start + timeout
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                with self._cond:
+                    while self._queue[0] != entry:
+                        remaining = expires - time.monotonic()
+                        if remaining <= 0:
+                            self._shed(name)
+                        self._cond.wait(remaining)
+                # Outside the lock: with a SqliteBucketStore this is a
+                # transaction that can wait on other processes
+                wait = self.bucket.try_acquire()
+                if wait == 0:
+                    break
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    self._shed(name)
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        with self._cond:
+            metrics = self._metric(name)
+            metrics["acquired"] += 1
+            metrics["wait_total"] += waited
+            metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+    def _shed(self, name: str):
+        with self._cond:
+            self._metric(name)["shed"] += 1
+        raise RateLimitExceeded(f"Places {name} request shed after waiting for quota")
+
+    def penalize(self, seconds: float):
+        self.bucket.penalize(seconds)
+        with self._cond:
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-priority acquired/shed counts and queue waits, plus current depth"""
+        with self._cond:
+            snapshot = {}
+            for name, m in self._metrics.items():
+                snapshot[name] = dict(m)
+                snapshot[name]["wait_avg"] = m["wait_total"] / m["acquired"] if m["acquired"] else 0.0
+            snapshot["queue_depth"] = len(self._queue)
+            return snapshot
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Bucket name for an API key that doesn't store the key itself"""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+def limits_for_key(api_key: str) -> Tuple[float, float]:
+    """(rate, burst) for an API key, from PLACES_RATE_LIMITS or the defaults"""
+    overrides = json.loads(Config.PLACES_RATE_LIMITS or "{}")
+    for key in (api_key, key_fingerprint(api_key)):
+        if key in overrides:
+            limit = overrides[key]
+            return float(limit["rate"]), float(limit.get("burst", limit["rate"]))
+    return Config.PLACES_RATE, Config.PLACES_BURST
+
+
+_limiters: Dict[str, PriorityRateLimiter] = {}
+_stores: Dict[str, object] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> PriorityRateLimiter:
+    """One limiter per API key per process, sharing the bucket file if configured"""
+    fingerprint = key_fingerprint(api_key)
+    with _limiters_lock:
+        if fingerprint not in _limiters:
+            path = Config.PLACES_RATE_LIMIT_PATH
+            if path not in _stores:
+                _stores[path] = SqliteBucketStore(path) if path else MemoryBucketStore()
+            rate, burst = limits_for_key(api_key)
+            _limiters[fingerprint] = PriorityRateLimiter(
+                TokenBucket(fingerprint, rate, burst, _stores[path])
+            )
+        return _limiters[fingerprint]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, PrivateAttr, TypeAdapter, computed_field
+from typing import List, Optional, Dict, Any, Iterable, Literal
 from enum import Enum
 from datetime import datetime
 
@@ -9,6 +9,7 @@ class IntentType(str, Enum):
     RESTAURANT_DETAILS = "restaurant_details"
     RECIPE_SEARCH = "recipe_search"
     RECIPE_DETAILS = "recipe_details"
+    ORDER = "order"
     UNKNOWN = "unknown"
 
 
@@ -25,6 +26,14 @@ class ConversationMessage(BaseModel):
     timestamp: str
 
 
+class SessionSummary(BaseModel):
+    session_id: str
+    title: Optional[str] = None  # Start of the first user message
+    created_at: Optional[str] = None
+    last_activity: Optional[str] = None
+    message_count: int = 0
+
+
 class Restaurant(BaseModel):
     name: str
     id: str
@@ -52,12 +61,36 @@ class Recipe(BaseModel):
     tags: List[str] = []
 
 
+class RecipeSearchPage(BaseModel):
+    recipes: List[Recipe]
+    scores: List[float] = []
+    next_cursor: Optional[str] = None
+
+
+class PantryMatch(BaseModel):
+    recipe: Recipe
+    coverage: float
+    missing_ingredients: List[str] = []
+
+
+class Meal(BaseModel):
+    id: str
+    restaurant_id: str
+    name: str
+    price: float
+    tags: List[str] = []
+    description: Optional[str] = None
+
+
 class Order(BaseModel):
     id: str
     restaurant_id: str
     meal_id: str
     status: str
     total_price: float
+    user_id: Optional[str] = None
+    restaurant_name: Optional[str] = None
+    created_at: Optional[str] = None
 
 
 class AgentResponse(BaseModel):
@@ -73,6 +106,8 @@ class SessionState(BaseModel):
     messages: List[ConversationMessage] = []
     current_intent: Optional[IntentType] = None
     context: Dict[str, Any] = {}
+    # Supplied by the client per chat request and reused on retries
+    idempotency_key: Optional[str] = None
 
 
 class DisplayName(BaseModel):
@@ -148,14 +183,60 @@ class SecondaryOpeningHours(BaseOpeningHours):
 # --- Main Model ---
 
 
+_LAZY_PLACE_FIELDS = {
+    "regularOpeningHours": TypeAdapter(Optional[RegularOpeningHours]),
+    "regularSecondaryOpeningHours": TypeAdapter(Optional[List[SecondaryOpeningHours]]),
+    "googleMapsLinks": TypeAdapter(Optional[GoogleMapsLinks]),
+}
+
+
 class PlaceDetails(BaseModel):
     """
     The main Pydantic model for the entire place details response.
+
+    Opening hours and map links are kept as raw JSON and only validated
+    into their nested models the first time they are read (or dumped), so
+    a follow-up that only needs the address never pays for parsing hours.
+    Whoever builds one from an API response should call validate_fields
+    for the fields it asked for, so bad data fails there rather than at
+    the first read.
     """
 
     name: str
     formattedAddress: str
-    regularOpeningHours: Optional[RegularOpeningHours] = None
     displayName: DisplayName
-    regularSecondaryOpeningHours: Optional[List[SecondaryOpeningHours]] = None
-    googleMapsLinks: Optional[GoogleMapsLinks] = None
+
+    _raw: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _parsed: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data: Any):
+        raw = {field: data.pop(field) for field in _LAZY_PLACE_FIELDS if field in data}
+        super().__init__(**data)
+        self._raw = raw
+
+    def validate_fields(self, fields: Iterable[str]) -> "PlaceDetails":
+        """Validate the given lazily parsed fields now; raises ValidationError"""
+        for field in fields:
+            if field in _LAZY_PLACE_FIELDS:
+                self._lazy(field)
+        return self
+
+    def _lazy(self, field: str) -> Any:
+        if field not in self._parsed:
+            self._parsed[field] = _LAZY_PLACE_FIELDS[field].validate_python(self._raw.get(field))
+        return self._parsed[field]
+
+    @computed_field
+    @property
+    def regularOpeningHours(self) -> Optional[RegularOpeningHours]:
+        return self._lazy("regularOpeningHours")
+
+    @computed_field
+    @property
+    def regularSecondaryOpeningHours(self) -> Optional[List[SecondaryOpeningHours]]:
+        return self._lazy("regularSecondaryOpeningHours")
+
+    @computed_field
+    @property
+    def googleMapsLinks(self) -> Optional[GoogleMapsLinks]:
+        return self._lazy("googleMapsLinks")
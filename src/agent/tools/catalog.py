@@ -0,0 +1,347 @@
+import json
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from agent.clients import get_places_client
+from config import Config
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+PRECISIONS = (4, 5, 6)
+# A radius query uses the finest precision that needs at most this many cells
+MAX_COVER_CELLS = 36
+
+PRICE_WORDS = {
+    "cheap": ["PRICE_LEVEL_INEXPENSIVE"],
+    "inexpensive": ["PRICE_LEVEL_INEXPENSIVE"],
+    "budget": ["PRICE_LEVEL_INEXPENSIVE"],
+    "affordable": ["PRICE_LEVEL_INEXPENSIVE", "PRICE_LEVEL_MODERATE"],
+    "$": ["PRICE_LEVEL_INEXPENSIVE"],
+    "$$": ["PRICE_LEVEL_MODERATE"],
+    "$$$": ["PRICE_LEVEL_EXPENSIVE"],
+    "$$$$": ["PRICE_LEVEL_VERY_EXPENSIVE"],
+    "fancy": ["PRICE_LEVEL_EXPENSIVE", "PRICE_LEVEL_VERY_EXPENSIVE"],
+    "upscale": ["PRICE_LEVEL_EXPENSIVE", "PRICE_LEVEL_VERY_EXPENSIVE"],
+    "expensive": ["PRICE_LEVEL_EXPENSIVE", "PRICE_LEVEL_VERY_EXPENSIVE"],
+}
+
+DEFAULT_RADIUS_KM = 3.0
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 6) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        ch <<= 1
+        if value >= mid:
+            ch |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def _cell_size_deg(precision: int) -> Tuple[float, float]:
+    """(height, width) of a geohash cell in degrees"""
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _steps(low: float, high: float, step: float) -> List[float]:
+    """Points from low to high no further apart than one cell"""
+    points = [low + k * step for k in range(int((high - low) / step) + 1)]
+    points.append(high)
+    return points
+
+
+def covering_cells(lat: float, lng: float, radius_km: float, precision: int) -> Set[str]:
+    """Geohash cells intersecting the bounding box of a circle"""
+    cell_lat, cell_lng = _cell_size_deg(precision)
+    # 110 km per degree slightly overestimates the box, which is the safe side
+    rlat = radius_km / 110.0
+    rlng = min(radius_km / max(110.0 * math.cos(math.radians(lat)), 1e-6), 180.0)
+    return {
+        geohash_encode(a, (b + 180.0) % 360.0 - 180.0, precision)
+        for a in _steps(max(-90.0, lat - rlat), min(90.0, lat + rlat), cell_lat)
+        for b in _steps(lng - rlng, lng + rlng, cell_lng)
+    }
+
+
+def _cover_precision(lat: float, radius_km: float) -> int:
+    rlat = radius_km / 110.0
+    rlng = radius_km / max(110.0 * math.cos(math.radians(lat)), 1e-6)
+    for precision in sorted(PRECISIONS, reverse=True):
+        cell_lat, cell_lng = _cell_size_deg(precision)
+        if (2 * rlat / cell_lat + 2) * (2 * rlng / cell_lng + 2) <= MAX_COVER_CELLS:
+            return precision
+    return min(PRECISIONS)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 12742.0 * math.asin(math.sqrt(a))
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def _tokens(text: str) -> List[str]:
+    return [_stem(t) for t in re.findall(r"[a-z]+", text.lower())]
+
+
+def _union(sets: Iterable[Set[int]]) -> Set[int]:
+    """Union without copying when there is only one set"""
+    sets = [s for s in sets if s]
+    if len(sets) == 1:
+        return sets[0]
+    return set().union(*sets)
+
+
+def _load_records(path: Path) -> Iterable[Dict[str, Any]]:
+    if path.suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading a Parquet catalog requires pyarrow") from e
+        yield from pq.read_table(str(path)).to_pylist()
+        return
+    with open(path, "r") as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+class RestaurantCatalog:
+    """
+    Local restaurant catalog. Records use the Places API place shape
+    (name, displayName, formattedAddress, priceLevel, editorialSummary,
+    location) plus `cuisines` and an optional `area` such as "downtown".
+    Indexed by cuisine token, price level, area and geohash cell.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.places: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, int] = {}
+        self.cuisine_index: Dict[str, Set[int]] = {}
+        self.price_index: Dict[str, Set[int]] = {}
+        self.geo_index: Dict[str, List[int]] = {}
+        self.areas: Dict[str, Tuple[float, float]] = {}
+        area_points: Dict[str, List[Tuple[float, float]]] = {}
+
+        for record in records:
+            i = len(self.places)
+            self.places.append(record)
+            self.by_id[record["name"]] = i
+
+            cuisines = list(record.get("cuisines", []))
+            cuisines += [t[: -len("_restaurant")] for t in record.get("types", []) if t.endswith("_restaurant")]
+            for cuisine in cuisines:
+                for token in _tokens(cuisine.replace("_", " ")):
+                    self.cuisine_index.setdefault(token, set()).add(i)
+
+            if record.get("priceLevel"):
+                self.price_index.setdefault(record["priceLevel"], set()).add(i)
+
+            location = record.get("location")
+            if location:
+                lat, lng = location["latitude"], location["longitude"]
+                cell = geohash_encode(lat, lng, max(PRECISIONS))
+                for precision in PRECISIONS:
+                    self.geo_index.setdefault(cell[:precision], []).append(i)
+                if record.get("area"):
+                    area_points.setdefault(" ".join(_tokens(record["area"])), []).append((lat, lng))
+
+        for area, points in area_points.items():
+            self.areas[area] = (
+                sum(p[0] for p in points) / len(points),
+                sum(p[1] for p in points) / len(points),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "RestaurantCatalog":
+        """Load from a JSON array, JSON lines or (with pyarrow) Parquet dump"""
+        return cls(_load_records(Path(path)))
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def _nearby(self, lat: float, lng: float, radius_km: float) -> Set[int]:
+        candidates: Set[int] = set()
+        for cell in covering_cells(lat, lng, radius_km, _cover_precision(lat, radius_km)):
+            candidates.update(self.geo_index.get(cell, ()))
+        return candidates
+
+    def search(
+        self,
+        cuisines: Optional[List[str]] = None,
+        near: Optional[Tuple[float, float]] = None,
+        radius_km: float = DEFAULT_RADIUS_KM,
+        price_levels: Optional[List[str]] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Restaurants matching any cuisine and price level, nearest first"""
+        filters: List[Set[int]] = []
+        if cuisines:
+            tokens = {token for cuisine in cuisines for token in _tokens(cuisine)}
+            filters.append(_union(self.cuisine_index.get(t, set()) for t in tokens))
+        if price_levels:
+            filters.append(_union(self.price_index.get(p, set()) for p in price_levels))
+        if near is not None:
+            filters.append(self._nearby(near[0], near[1], radius_km))
+
+        if filters:
+            # Probe the larger sets with members of the smallest one
+            filters.sort(key=len)
+            smallest, others = filters[0], filters[1:]
+            candidates = [i for i in smallest if all(i in s for s in others)]
+        else:
+            candidates = range(len(self.places))
+
+        if near is None:
+            ordered = sorted(candidates, key=lambda i: self.places[i]["name"])
+            return [self.places[i] for i in ordered[:limit]]
+
+        scored = []
+        for i in candidates:
+            location = self.places[i].get("location")
+            if not location:
+                continue
+            distance = haversine_km(near[0], near[1], location["latitude"], location["longitude"])
+            if distance <= radius_km:
+                scored.append((distance, self.places[i]["name"], i))
+        scored.sort()
+        return [self.places[i] for _, _, i in scored[:limit]]
+
+    def parse_query(self, query: str) -> Dict[str, Any]:
+        """Pull cuisine, price and area hints out of a free-text request"""
+        tokens = _tokens(query)
+        lowered = " ".join(tokens)
+        cuisines = sorted({t for t in tokens if t in self.cuisine_index})
+        price_levels = sorted(
+            {level for word in re.findall(r"\$+|[a-z]+", query.lower()) for level in PRICE_WORDS.get(word, [])}
+        )
+        area = None
+        for name in sorted(self.areas, key=len, reverse=True):
+            if re.search(rf"\b{re.escape(name)}\b", lowered):
+                area = name
+                break
+        return {"cuisines": cuisines, "price_levels": price_levels, "area": area}
+
+    def search_text(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Answer "cuisine X near Y" style queries; empty if no cuisine is recognised"""
+        parsed = self.parse_query(query)
+        if not parsed["cuisines"]:
+            return []
+        near = self.areas.get(parsed["area"]) if parsed["area"] else None
+        return self.search(
+            cuisines=parsed["cuisines"],
+            near=near,
+            price_levels=parsed["price_levels"] or None,
+            limit=limit,
+        )
+
+    def get_details(self, place_id: str) -> Dict[str, Any]:
+        i = self.by_id.get(place_id)
+        return self.places[i] if i is not None else {}
+
+
+class CatalogPlacesClient:
+    """Serves the PlacesClient interface from a local catalog only"""
+
+    def __init__(self, catalog: RestaurantCatalog):
+        self.catalog = catalog
+
+    def search_place(self, query: str) -> list:
+        return self.catalog.search_text(query)
+
+    def get_place_details(self, place_id: str, field_mask: Optional[str] = None) -> dict:
+        return self.catalog.get_details(place_id)
+
+    def get_place_details_many(
+        self,
+        place_ids: List[str],
+        field_mask: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, dict]:
+        found = {place_id: self.catalog.get_details(place_id) for place_id in place_ids}
+        return {place_id: details for place_id, details in found.items() if details}
+
+
+class TieredPlacesClient:
+    """Local catalog as a fast first tier in front of the live Places API"""
+
+    def __init__(self, catalog: RestaurantCatalog, places_client):
+        self.catalog = catalog
+        self.places_client = places_client
+
+    def search_place(self, query: str) -> list:
+        return self.catalog.search_text(query) or self.places_client.search_place(query)
+
+    def get_place_details(self, place_id: str, field_mask: Optional[str] = None) -> dict:
+        return self.catalog.get_details(place_id) or self.places_client.get_place_details(
+            place_id, field_mask
+        )
+
+    def get_place_details_many(
+        self,
+        place_ids: List[str],
+        field_mask: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, dict]:
+        results = {}
+        for place_id in dict.fromkeys(place_ids):
+            details = self.catalog.get_details(place_id)
+            if details:
+                results[place_id] = details
+        missing = [place_id for place_id in dict.fromkeys(place_ids) if place_id not in results]
+        if missing:
+            results.update(
+                self.places_client.get_place_details_many(missing, field_mask, deadline)
+            )
+        return {place_id: results[place_id] for place_id in dict.fromkeys(place_ids) if place_id in results}
+
+
+_catalogs: Dict[str, RestaurantCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: str) -> RestaurantCatalog:
+    """Load each catalog file once per process"""
+    with _catalogs_lock:
+        if path not in _catalogs:
+            _catalogs[path] = RestaurantCatalog.load(path)
+        return _catalogs[path]
+
+
+def build_places_backend():
+    """
+    Places backend selected by RESTAURANT_BACKEND: "places" (live API),
+    "catalog" (local catalog only) or "hybrid" (catalog first, then API).
+    """
+    backend = Config.RESTAURANT_BACKEND
+    if backend == "places":
+        return get_places_client()
+    if not Config.RESTAURANT_CATALOG_PATH:
+        raise ValueError(f"RESTAURANT_CATALOG_PATH is required for the {backend} backend")
+    catalog = get_catalog(Config.RESTAURANT_CATALOG_PATH)
+    if backend == "catalog":
+        return CatalogPlacesClient(catalog)
+    if backend == "hybrid":
+        return TieredPlacesClient(catalog, get_places_client())
+    raise ValueError(f"Unknown RESTAURANT_BACKEND: {backend}")
@@ -0,0 +1,157 @@
+import bisect
+import csv
+import heapq
+import json
+import re
+import threading
+from difflib import get_close_matches
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from agent.schemas import Meal
+from config import Config
+
+_MAX_PRICE_RE = re.compile(r"(?:under|below|less than|cheaper than|max|<)\s*\$?\s*(\d+(?:\.\d+)?)")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _normalize_tag(tag: str) -> str:
+    return "-".join(re.findall(r"[a-z0-9]+", tag.lower()))
+
+
+def _meal_from_record(record: Dict[str, Any], restaurant_id: Optional[str] = None) -> Meal:
+    tags = record.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t for t in re.split(r"[;|,]", tags) if t.strip()]
+    restaurant_id = restaurant_id or record["restaurant_id"]
+    return Meal(
+        id=str(record.get("id") or f"{restaurant_id}/{_normalize(record['name']).replace(' ', '-')}"),
+        restaurant_id=restaurant_id,
+        name=record["name"],
+        price=float(record["price"]),
+        tags=sorted({_normalize_tag(t) for t in tags}),
+        description=record.get("description") or None,
+    )
+
+
+def _load_meals(path: Path) -> Iterable[Meal]:
+    """Meals from CSV, JSON lines, a JSON list, or JSON {restaurant_id: [meals]}"""
+    if path.suffix == ".csv":
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield _meal_from_record(row)
+        return
+    with open(path, "r") as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield _meal_from_record(json.loads(line))
+            return
+        data = json.load(f)
+    if isinstance(data, dict):
+        for restaurant_id, meals in data.items():
+            for record in meals:
+                yield _meal_from_record(record, restaurant_id)
+    else:
+        for record in data:
+            yield _meal_from_record(record)
+
+
+class MenuCatalog:
+    """
+    Local menus keyed by restaurant ID. Each restaurant's meals are kept
+    sorted by price, so a price cap is a bisect; dietary tags are matched
+    against per-meal tag sets. Filtering the handful of restaurants in the
+    last search results touches only the meals under the cap.
+    """
+
+    def __init__(self, meals: Iterable[Meal] = ()):
+        self.menus: Dict[str, List[Meal]] = {}
+        self._prices: Dict[str, List[float]] = {}
+        self._tags: Dict[str, List[frozenset]] = {}
+        self.tags: set = set()
+        for meal in meals:
+            self.menus.setdefault(meal.restaurant_id, []).append(meal)
+        for restaurant_id, menu in self.menus.items():
+            menu.sort(key=lambda m: (m.price, m.name))
+            self._prices[restaurant_id] = [m.price for m in menu]
+            self._tags[restaurant_id] = [frozenset(m.tags) for m in menu]
+            for meal in menu:
+                self.tags.update(meal.tags)
+
+    @classmethod
+    def load(cls, path: str) -> "MenuCatalog":
+        return cls(_load_meals(Path(path)))
+
+    def __len__(self) -> int:
+        return sum(len(menu) for menu in self.menus.values())
+
+    def has_menu(self, restaurant_id: str) -> bool:
+        return restaurant_id in self.menus
+
+    def menu(self, restaurant_id: str) -> List[Meal]:
+        return self.menus.get(restaurant_id, [])
+
+    def find_meal(self, restaurant_id: str, name: str) -> Optional[Meal]:
+        """Meal on a restaurant's menu by name, tolerating case and small typos"""
+        by_name = {_normalize(m.name): m for m in self.menu(restaurant_id)}
+        wanted = _normalize(name)
+        if wanted in by_name:
+            return by_name[wanted]
+        close = get_close_matches(wanted, list(by_name), n=1, cutoff=0.8)
+        return by_name[close[0]] if close else None
+
+    def search(
+        self,
+        restaurant_ids: List[str],
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        limit: int = 10,
+    ) -> List[Meal]:
+        """Cheapest meals across the given restaurants that have every tag"""
+        wanted = frozenset(_normalize_tag(t) for t in tags or [])
+        per_restaurant = []
+        for restaurant_id in dict.fromkeys(restaurant_ids):
+            menu = self.menus.get(restaurant_id)
+            if not menu:
+                continue
+            end = (
+                bisect.bisect_right(self._prices[restaurant_id], max_price)
+                if max_price is not None
+                else len(menu)
+            )
+            meal_tags = self._tags[restaurant_id]
+            per_restaurant.append(
+                (m for m, t in zip(menu[:end], meal_tags[:end]) if wanted <= t)
+            )
+        merged = heapq.merge(*per_restaurant, key=lambda m: (m.price, m.name))
+        return [meal for _, meal in zip(range(limit), merged)]
+
+    def parse_filters(self, text: str) -> Dict[str, Any]:
+        """"under $15, vegetarian" -> {"max_price": 15.0, "tags": ["vegetarian"]}"""
+        lowered = text.lower()
+        filters: Dict[str, Any] = {}
+        match = _MAX_PRICE_RE.search(lowered)
+        if match:
+            filters["max_price"] = float(match.group(1))
+        normalized = "-".join(re.findall(r"[a-z0-9]+", lowered))
+        tags = sorted(t for t in self.tags if re.search(rf"(?:^|-){re.escape(t)}(?:-|$)", normalized))
+        if tags:
+            filters["tags"] = tags
+        return filters
+
+
+_catalog: Optional[MenuCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_menu_catalog() -> MenuCatalog:
+    """Shared catalog from MENU_CATALOG_PATH; empty when none is configured"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            path = Config.MENU_CATALOG_PATH
+            _catalog = MenuCatalog.load(path) if path else MenuCatalog()
+        return _catalog
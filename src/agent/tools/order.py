@@ -1,38 +1,206 @@
+import sqlite3
+import threading
 import uuid
-from typing import Optional
-from agent.schemas import Order
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from agent.metrics import SQLITE_LATENCY
+from agent.schemas import Meal, Order
+from agent.tools.menu import MenuCatalog, get_menu_catalog
 from agent.tools.restaurants import RestaurantTool
+from config import Config
+
+# Fallback prices by Places price level for restaurants without a menu
+PRICE_BY_LEVEL = {
+    "PRICE_LEVEL_INEXPENSIVE": 8.99,
+    "PRICE_LEVEL_MODERATE": 15.99,
+    "PRICE_LEVEL_EXPENSIVE": 24.99,
+    "PRICE_LEVEL_VERY_EXPENSIVE": 35.99,
+}
+DEFAULT_PRICE = 12.99
+
+_COLUMNS = "id, user_id, restaurant_id, restaurant_name, meal_id, status, total_price, created_at"
+
+
+class OrderStore:
+    """
+    Orders in a SQLite database in WAL mode, so readers never block the
+    writer. Each thread gets its own connection. An (user_id,
+    idempotency_key) pair maps to at most one order, so a retried request
+    returns the order it already created instead of placing another.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            idempotency_key TEXT,
+            restaurant_id TEXT NOT NULL,
+            restaurant_name TEXT,
+            meal_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total_price REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )""")
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency "
+            "ON orders (user_id, idempotency_key)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, created_at)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_order(row: sqlite3.Row) -> Order:
+        return Order(**dict(row))
+
+    def create(
+        self,
+        user_id: str,
+        restaurant_id: str,
+        meal_id: str,
+        total_price: float,
+        restaurant_name: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        status: str = "confirmed",
+    ) -> Tuple[Order, bool]:
+        """Insert an order; returns (order, created). created is False on a replay."""
+        conn = self._conn()
+        order_id = str(uuid.uuid4())
+        created_at = datetime.now(timezone.utc).isoformat()
+        with SQLITE_LATENCY.time(db="orders", operation="create"), conn:
+            cursor = conn.execute(
+                "INSERT INTO orders (id, user_id, idempotency_key, restaurant_id, restaurant_name, "
+                "meal_id, status, total_price, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, idempotency_key) DO NOTHING",
+                (order_id, user_id, idempotency_key, restaurant_id, restaurant_name,
+                 meal_id, status, total_price, created_at),
+            )
+        if cursor.rowcount == 1:
+            return self.get(order_id), True
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM orders WHERE user_id = ? AND idempotency_key = ?",
+            (user_id, idempotency_key),
+        ).fetchone()
+        return self._row_to_order(row), False
+
+    def get(self, order_id: str) -> Optional[Order]:
+        with SQLITE_LATENCY.time(db="orders", operation="get"):
+            row = self._conn().execute(
+                f"SELECT {_COLUMNS} FROM orders WHERE id = ?", (order_id,)
+            ).fetchone()
+        return self._row_to_order(row) if row else None
+
+    def list_for_user(self, user_id: str, limit: int = 20) -> List[Order]:
+        """Most recent orders first"""
+        with SQLITE_LATENCY.time(db="orders", operation="list"):
+            rows = self._conn().execute(
+                f"SELECT {_COLUMNS} FROM orders WHERE user_id = ? ORDER BY created_at DESC, rowid DESC LIMIT ?",
+                (user_id, limit),
+            ).fetchall()
+        return [self._row_to_order(row) for row in rows]
+
+    def update_status(self, order_id: str, status: str) -> Optional[Order]:
+        conn = self._conn()
+        with SQLITE_LATENCY.time(db="orders", operation="update"), conn:
+            conn.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
+        return self.get(order_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_order_store(path: Optional[str] = None) -> OrderStore:
+    """One store per database file per process"""
+    path = path or Config.ORDER_DB_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = OrderStore(path)
+        return _stores[path]
 
 
 class OrderTool:
-    def __init__(self):
-        self.restaurant_tool = RestaurantTool()
-        self.orders = {}
+    def __init__(
+        self,
+        restaurant_tool: Optional[RestaurantTool] = None,
+        store: Optional[OrderStore] = None,
+        menus: Optional[MenuCatalog] = None,
+    ):
+        self.restaurant_tool = restaurant_tool or RestaurantTool()
+        self.store = store or get_order_store()
+        self.menus = menus if menus is not None else get_menu_catalog()
 
-    def place_order(self, restaurant_id: str, meal_name: str) -> Order:
+    def place_order(
+        self,
+        user_id: str,
+        restaurant_id: str,
+        meal_name: str,
+        idempotency_key: Optional[str] = None,
+    ) -> Order:
+        """
+        Place an order at one of the restaurants from the last search. If
+        the restaurant has a menu the meal must be on it and is charged at
+        its menu price. Retrying with the same idempotency key returns the
+        original order.
+        """
         restaurant = self.restaurant_tool.get_restaurant_by_id(restaurant_id)
 
         if not restaurant:
             raise ValueError(f"Restaurant with ID {restaurant_id} not found")
 
-        if meal_name not in restaurant.meals:
-            raise ValueError(f"Meal '{meal_name}' not available at {restaurant.name}")
+        if not meal_name or not meal_name.strip():
+            raise ValueError(f"No meal given for {restaurant.name}")
 
-        order_id = str(uuid.uuid4())
-        order = Order(
-            id=order_id,
+        if self.menus.has_menu(restaurant_id):
+            meal = self.menus.find_meal(restaurant_id, meal_name)
+            if not meal:
+                raise ValueError(f"Meal '{meal_name}' not available at {restaurant.name}")
+            meal_id, price = meal.id, meal.price
+        else:
+            meal_id, price = meal_name.strip(), self._calculate_price(restaurant.priceLevel)
+
+        order, _ = self.store.create(
+            user_id=user_id,
             restaurant_id=restaurant_id,
-            meal_id=meal_name,
-            status="confirmed",
-            total_price=self._calculate_price(restaurant.price_range),
+            restaurant_name=restaurant.name,
+            meal_id=meal_id,
+            total_price=price,
+            idempotency_key=idempotency_key,
         )
-
-        self.orders[order_id] = order
         return order
 
+    def find_meals(
+        self,
+        max_price: Optional[float] = None,
+        tags: Optional[List[str]] = None,
+        limit: int = 10,
+    ) -> List[Meal]:
+        """Cheapest matching meals across the restaurants from the last search"""
+        restaurant_ids = [
+            r.id for r in self.restaurant_tool.last_search_results if hasattr(r, "id")
+        ]
+        return self.menus.search(restaurant_ids, max_price=max_price, tags=tags, limit=limit)
+
     def get_order_status(self, order_id: str) -> Optional[Order]:
-        return self.orders.get(order_id)
+        return self.store.get(order_id)
+
+    def get_user_orders(self, user_id: str, limit: int = 20) -> List[Order]:
+        return self.store.list_for_user(user_id, limit)
 
-    def _calculate_price(self, price_range: str) -> float:
-        price_map = {"$": 8.99, "$$": 15.99, "$$$": 24.99, "$$$$": 35.99}
-        return price_map.get(price_range, 12.99)
+    def _calculate_price(self, price_level: Optional[str]) -> float:
+        return PRICE_BY_LEVEL.get(price_level, DEFAULT_PRICE)
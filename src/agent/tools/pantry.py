@@ -0,0 +1,97 @@
+import heapq
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_ingredient(name: str) -> str:
+    """Canonical vocabulary form of an ingredient name (matches migrate_db)"""
+    return " ".join(str(name).lower().split())
+
+
+def _variants(name: str) -> List[str]:
+    """Cheap singular/plural variants so "eggs" finds "egg" and vice versa"""
+    variants = [name, name + "s", name + "es"]
+    if name.endswith("es"):
+        variants.append(name[:-2])
+    if name.endswith("s"):
+        variants.append(name[:-1])
+    return variants
+
+
+class PantryIndex:
+    """
+    In-memory copy of the ingredient vocabulary and per-recipe ingredient
+    bitsets built by migrate_db. Scoring a pantry is one AND plus two
+    popcounts per recipe using Python ints as bitsets.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        recipe_ids: List[str],
+        bitsets: List[int],
+        counts: List[int],
+    ):
+        self.vocab = vocab
+        self.names = {i: name for name, i in vocab.items()}
+        self.recipe_ids = recipe_ids
+        self.bitsets = bitsets
+        self.counts = counts
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "PantryIndex":
+        vocab = {
+            row[1]: row[0] for row in conn.execute("SELECT id, name FROM ingredient_vocab")
+        }
+        recipe_ids, bitsets, counts = [], [], []
+        for recipe_id, bits, count in conn.execute(
+            "SELECT recipe_id, bits, ingredient_count FROM recipe_ingredient_bits"
+        ):
+            recipe_ids.append(recipe_id)
+            bitsets.append(int.from_bytes(bits, "little"))
+            counts.append(count)
+        return cls(vocab, recipe_ids, bitsets, counts)
+
+    def pantry_mask(self, pantry: List[str]) -> int:
+        mask = 0
+        for item in pantry:
+            for variant in _variants(normalize_ingredient(item)):
+                bit = self.vocab.get(variant)
+                if bit is not None:
+                    mask |= 1 << bit
+        return mask
+
+    def missing(self, index: int, mask: int) -> List[str]:
+        """Names of the recipe's ingredients not covered by the pantry mask"""
+        bits = self.bitsets[index] & ~mask
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.names[low.bit_length() - 1])
+            bits ^= low
+        return sorted(names)
+
+    def top_matches(
+        self, pantry: List[str], limit: int = 5, min_coverage: float = 0.0
+    ) -> List[Tuple[int, float]]:
+        """
+        Return (recipe index, coverage) pairs for the best pantry matches.
+        Coverage is the fraction of the recipe's ingredients in the pantry;
+        ties prefer fewer missing ingredients, then recipe ID.
+        """
+        mask = self.pantry_mask(pantry)
+        if not mask:
+            return []
+
+        # map() keeps the AND/popcount loop in C; Python only sees overlaps
+        haves = map(int.bit_count, map(mask.__and__, self.bitsets))
+        counts, ids = self.counts, self.recipe_ids
+        candidates = []
+        for i, have in enumerate(haves):
+            if have:
+                coverage = have / counts[i]
+                if coverage >= min_coverage:
+                    candidates.append((-coverage, counts[i] - have, ids[i], i))
+
+        best = heapq.nsmallest(limit, candidates)
+        return [(i, -neg_coverage) for neg_coverage, _, _, i in best]
@@ -0,0 +1,116 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from agent.metrics import REGISTRY
+from agent.rate_limit import PREFETCH, request_priority
+from config import Config
+
+
+class PrefetchStats:
+    """Process-wide prefetch counters"""
+
+    def __init__(self):
+        self.issued = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self._lock = threading.Lock()
+
+    def add(self, field: str, n: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "issued": self.issued,
+                "hits": self.hits,
+                "misses": self.misses,
+                "wasted": self.wasted,
+            }
+
+
+PREFETCH_STATS = PrefetchStats()
+REGISTRY.register_collector(
+    "prefetch",
+    lambda: [
+        (
+            "places_prefetch_total",
+            "counter",
+            "Details prefetches by outcome",
+            [({"outcome": k}, v) for k, v in PREFETCH_STATS.snapshot().items()],
+        )
+    ],
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """Bounded pool shared by every session so prefetch can't fan out unboundedly"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.PLACES_PREFETCH_WORKERS,
+                thread_name_prefix="places-prefetch",
+            )
+        return _executor
+
+
+class DetailsPrefetcher:
+    """
+    Fetches details for the top results of a search in the background so a
+    follow-up like "tell me more about the second one" finds them ready.
+    Each new search retires the previous batch; prefetched entries that were
+    never asked for count as wasted.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], object],
+        top_n: int,
+        executor: Optional[ThreadPoolExecutor] = None,
+        stats: PrefetchStats = PREFETCH_STATS,
+    ):
+        self.fetch = fetch
+        self.top_n = top_n
+        self.executor = executor or get_prefetch_executor()
+        self.stats = stats
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, place_ids: List[str]):
+        self.retire()
+        futures = {}
+        for place_id in place_ids[: self.top_n]:
+            if place_id not in futures:
+                # Carry the request ID into the worker thread
+                futures[place_id] = self.executor.submit(
+                    contextvars.copy_context().run, self._fetch_in_background, place_id
+                )
+        with self._lock:
+            self._pending = futures
+        self.stats.add("issued", len(futures))
+
+    def _fetch_in_background(self, place_id: str):
+        # Queued behind interactive Places calls by the rate limiter
+        with request_priority(PREFETCH):
+            return self.fetch(place_id)
+
+    def take(self, place_id: str) -> Optional[Future]:
+        """Claim the prefetch for place_id, if one was issued"""
+        with self._lock:
+            future = self._pending.pop(place_id, None)
+        self.stats.add("hits" if future else "misses")
+        return future
+
+    def retire(self):
+        """Drop outstanding prefetches, counting them as wasted"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.cancel()
+        self.stats.add("wasted", len(pending))
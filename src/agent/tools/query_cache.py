@@ -0,0 +1,203 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from agent.metrics import REGISTRY
+
+
+def _name(value: Any) -> str:
+    return value["name"] if isinstance(value, dict) else str(value)
+
+
+def _canonical_list(values: Optional[List[Any]]) -> Tuple[str, ...]:
+    """Lowercased, stripped, deduplicated and sorted"""
+    return tuple(sorted({_name(v).strip().lower() for v in values or [] if _name(v).strip()}))
+
+
+class SearchCriteria:
+    """
+    Canonical form of search_recipes arguments. Two requests that differ only
+    in ingredient order, case or duplicates produce the same key.
+    """
+
+    FIELDS = (
+        "recipe_title",
+        "ingredients",
+        "excluded_ingredients",
+        "max_total_time",
+        "max_prep_time",
+        "difficulty",
+        "servings",
+        "tags",
+    )
+
+    def __init__(
+        self,
+        recipe_title: Optional[str] = None,
+        ingredients: Optional[List[Any]] = None,
+        excluded_ingredients: Optional[List[Any]] = None,
+        max_total_time: Optional[int] = None,
+        max_prep_time: Optional[int] = None,
+        difficulty: Optional[str] = None,
+        servings: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+    ):
+        self.recipe_title = (recipe_title or "").strip().lower() or None
+        self.ingredients = _canonical_list(ingredients)
+        self.excluded_ingredients = _canonical_list(excluded_ingredients)
+        self.max_total_time = int(max_total_time) if max_total_time else None
+        self.max_prep_time = int(max_prep_time) if max_prep_time else None
+        self.difficulty = difficulty or None
+        self.servings = int(servings) if servings else None
+        # Tags are only used as a filter when there is no title (see search_recipes)
+        self.tags = _canonical_list(tags) if not self.recipe_title else ()
+        self.scoring_tags = _canonical_list(tags)
+
+    @property
+    def key(self) -> Tuple[Hashable, ...]:
+        return tuple(getattr(self, f) for f in self.FIELDS) + (self.scoring_tags,)
+
+    @property
+    def shape(self) -> Tuple[Hashable, ...]:
+        """Which clauses are present and how many terms each has"""
+        return (
+            self.recipe_title is not None,
+            len(self.ingredients),
+            len(self.excluded_ingredients),
+            self.max_total_time is not None,
+            self.max_prep_time is not None,
+            self.difficulty is not None,
+            self.servings is not None,
+            len(self.tags),
+        )
+
+    def params(self) -> Tuple[Any, ...]:
+        """Bind parameters in the order the compiled SQL expects them"""
+        params: List[Any] = []
+        if self.recipe_title:
+            params.append(self.recipe_title)
+        params.extend(self.ingredients)
+        params.extend(self.excluded_ingredients)
+        for value in (self.max_total_time, self.max_prep_time, self.difficulty, self.servings):
+            if value is not None:
+                params.append(value)
+        params.extend(self.tags)
+        return tuple(params)
+
+
+def compile_filter_sql(shape: Tuple[Hashable, ...], columns: str = "*") -> str:
+    """Build the filter query for a clause shape; parameters bind positionally"""
+    has_title, n_ing, n_excl, has_total, has_prep, has_diff, has_serv, n_tags = shape
+    where_clauses = []
+    if has_title:
+        where_clauses.append("title LIKE '%'||?||'%'")
+    if n_ing:
+        # Match any of the ingredients (OR logic)
+        where_clauses.append("(" + " OR ".join(["ingredients_text LIKE '%'||?||'%'"] * n_ing) + ")")
+    # Exclude these ingredients (AND NOT logic)
+    where_clauses.extend(["ingredients_text NOT LIKE '%'||?||'%'"] * n_excl)
+    if has_total:
+        where_clauses.append("(prep_time + cook_time) <= ?")
+    if has_prep:
+        where_clauses.append("prep_time <= ?")
+    if has_diff:
+        where_clauses.append("difficulty = ?")
+    if has_serv:
+        where_clauses.append("servings >= ?")
+    if n_tags:
+        # Match any of the tags (OR logic)
+        where_clauses.append("(" + " OR ".join(["tags LIKE '%'||?||'%'"] * n_tags) + ")")
+
+    sql = f"SELECT {columns} FROM recipes"
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    return sql
+
+
+class QueryPlanCache:
+    """
+    SQL text per clause shape. Reusing identical SQL text on a long-lived
+    connection lets sqlite3's statement cache skip re-preparing it.
+    """
+
+    def __init__(self):
+        self._plans: Dict[Tuple[Hashable, ...], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, shape: Tuple[Hashable, ...], columns: str = "*") -> str:
+        key = shape + (columns,)
+        sql = self._plans.get(key)
+        if sql is None:
+            sql = compile_filter_sql(shape, columns)
+            with self._lock:
+                self._plans[key] = sql
+        return sql
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+
+class ResultCache:
+    """
+    LRU of ranked recipe-ID lists keyed by (database, db_version, criteria).
+    Bumping db_version in a migration makes every older entry unreachable;
+    those entries simply age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[str]]:
+        with self._lock:
+            ids = self._entries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key: Hashable, ids: List[str]):
+        with self._lock:
+            self._entries[key] = ids
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared across RecipeTool instances so identical criteria from different
+# sessions hit the same entries
+PLAN_CACHE = QueryPlanCache()
+RESULT_CACHE = ResultCache()
+
+
+def _result_cache_metrics():
+    hits, misses = RESULT_CACHE.hits, RESULT_CACHE.misses
+    return [
+        (
+            "recipe_result_cache_events_total",
+            "counter",
+            "Recipe result cache lookups by outcome",
+            [({"event": "hits"}, hits), ({"event": "misses"}, misses)],
+        ),
+        (
+            "recipe_result_cache_hit_ratio",
+            "gauge",
+            "Share of recipe searches served from the result cache",
+            [({}, hits / (hits + misses) if hits + misses else 0.0)],
+        ),
+    ]
+
+
+REGISTRY.register_collector("recipe_result_cache", _result_cache_metrics)
@@ -0,0 +1,186 @@
+import heapq
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Relative weight of each scoring signal. Signals are normalized to [0, 1]
+# so the final score is also in [0, 1].
+DEFAULT_WEIGHTS = {
+    "ingredients": 0.45,
+    "title": 0.25,
+    "tags": 0.2,
+    "time": 0.1,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _split_list(text: Optional[str]) -> List[str]:
+    """Split a denormalized comma-separated column into clean values"""
+    if not text:
+        return []
+    return [part.strip() for part in text.split(",") if part.strip()]
+
+
+class RecipeScorer:
+    """Deterministic relevance scoring for recipe rows"""
+
+    def __init__(
+        self,
+        recipe_title: Optional[str] = None,
+        ingredients: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+        max_total_time: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.title = (recipe_title or "").strip().lower()
+        self.title_tokens = set(_tokens(self.title))
+        self.ingredients = sorted({i.strip().lower() for i in ingredients or [] if i.strip()})
+        self.tags = sorted({t.strip().lower() for t in tags or [] if t.strip()})
+        self.max_total_time = max_total_time
+        self.weights = weights or DEFAULT_WEIGHTS
+
+    def ingredient_score(self, row: Mapping[str, Any]) -> float:
+        """Fraction of requested ingredients found in the recipe"""
+        if not self.ingredients:
+            return 0.0
+        names = _split_list(row["ingredients_text"])
+        hits = sum(1 for wanted in self.ingredients if any(wanted in n for n in names))
+        return hits / len(self.ingredients)
+
+    def tag_score(self, row: Mapping[str, Any]) -> float:
+        """Fraction of requested tags present on the recipe"""
+        if not self.tags:
+            return 0.0
+        recipe_tags = set(_split_list(row["tags"]))
+        return sum(1 for t in self.tags if t in recipe_tags) / len(self.tags)
+
+    def title_score(self, row: Mapping[str, Any]) -> float:
+        """Token overlap with the requested title, full phrase matches score highest"""
+        if not self.title:
+            return 0.0
+        title = row["title"].lower()
+        if self.title in title:
+            return 1.0
+        if not self.title_tokens:
+            return 0.0
+        overlap = self.title_tokens & set(_tokens(title))
+        return 0.8 * len(overlap) / len(self.title_tokens)
+
+    def time_score(self, row: Mapping[str, Any]) -> float:
+        """Recipes comfortably inside the time budget score higher"""
+        if not self.max_total_time:
+            return 0.0
+        total = row["prep_time"] + row["cook_time"]
+        if total > self.max_total_time:
+            return 0.0
+        return 1.0 - 0.5 * total / self.max_total_time
+
+    def score(self, row: Mapping[str, Any]) -> float:
+        w = self.weights
+        total = (
+            w["ingredients"] * self.ingredient_score(row)
+            + w["title"] * self.title_score(row)
+            + w["tags"] * self.tag_score(row)
+            + w["time"] * self.time_score(row)
+        )
+        # Rounding keeps the ordering stable across float noise
+        return round(total, 6)
+
+
+class RankedResults:
+    """
+    Lazily ordered (recipe ID, score) pairs. The candidates are scored and
+    heapified once (O(n)) and each page pops only as far as it needs, so
+    results are never fully sorted. Pairs already popped are kept in order,
+    so reading a page again returns the same results. Ties are broken by
+    recipe ID to keep the ordering deterministic.
+    """
+
+    def __init__(self, rows: List[Mapping[str, Any]], scorer: RecipeScorer):
+        self._heap: List[Tuple[float, str]] = [(-scorer.score(row), row["id"]) for row in rows]
+        heapq.heapify(self._heap)
+        self._ordered: List[Tuple[str, float]] = []
+
+    def __len__(self) -> int:
+        return len(self._ordered) + len(self._heap)
+
+    def page(self, offset: int, k: int) -> List[Tuple[str, float]]:
+        while self._heap and len(self._ordered) < offset + k:
+            neg_score, recipe_id = heapq.heappop(self._heap)
+            self._ordered.append((recipe_id, -neg_score))
+        return self._ordered[offset : offset + k]
+
+
+def top_k(
+    rows: List[Mapping[str, Any]], scorer: RecipeScorer, k: int
+) -> List[Tuple[Mapping[str, Any], float]]:
+    """Top-k selection in O(n log k) for callers that do not need pagination"""
+    best = heapq.nsmallest(
+        k, ((-scorer.score(row), row["id"], i) for i, row in enumerate(rows))
+    )
+    return [(rows[i], -neg_score) for neg_score, _, i in best]
+
+
+class CursorStore:
+    """
+    Keeps rankings so "show me more" resumes from where the previous page
+    stopped instead of re-running the query and re-scoring. A cursor names
+    a ranking and an offset into it, so the same cursor always returns the
+    same page and a retried request is harmless.
+
+    Shared by every session (see CURSORS) and bounded by the number of
+    (ID, score) pairs held. Rankings unused for ttl_seconds are purged on
+    put; beyond max_pairs the least recently used go first.
+    """
+
+    def __init__(self, max_pairs: int = 200_000, ttl_seconds: float = 900):
+        self.max_pairs = max_pairs
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, RankedResults]]" = OrderedDict()
+        self._pairs = 0
+        self._lock = threading.Lock()
+
+    def put(self, results: RankedResults, offset: int) -> str:
+        """Keep `results` and return the cursor for the page at `offset`"""
+        token = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            while self._entries:
+                oldest, (used, _) = next(iter(self._entries.items()))
+                if now - used <= self.ttl_seconds and self._pairs + len(results) <= self.max_pairs:
+                    break
+                self._pairs -= len(self._entries.pop(oldest)[1])
+            self._entries[token] = (now, results)
+            self._pairs += len(results)
+        return f"{token}:{offset}"
+
+    def read(self, cursor: str, k: int) -> Optional[Tuple[List[Tuple[str, float]], Optional[str]]]:
+        """The page of up to k pairs at `cursor` and the next cursor; None if unknown or expired"""
+        token, _, offset = cursor.partition(":")
+        if not offset.isdigit():
+            return None
+        offset = int(offset)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                return None
+            results = entry[1]
+            self._entries[token] = (now, results)
+            self._entries.move_to_end(token)
+            page = results.page(offset, k)
+        end = offset + len(page)
+        return page, (f"{token}:{end}" if end < len(results) else None)
+
+
+# Shared across RecipeTool instances, so memory is bounded per process
+# rather than per session
+CURSORS = CursorStore()
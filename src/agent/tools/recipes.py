@@ -1,24 +1,142 @@
 import json
 import sqlite3
 import os
-from typing import List, Optional
+import threading
+from typing import Any, Dict, Iterable, List, Optional
 from pathlib import Path
-from agent.schemas import Recipe, Ingredient
+from agent.metrics import SQLITE_LATENCY
+from agent.schemas import Recipe, Ingredient, RecipeSearchPage, PantryMatch
+from agent.tools.pantry import PantryIndex
+from agent.tools.semantic import VectorIndex
+from agent.tools.ranking import CURSORS, RankedResults, RecipeScorer, top_k
+from agent.tools.query_cache import PLAN_CACHE, RESULT_CACHE, SearchCriteria
+
+
+DEFAULT_DB_PATH = str(Path(__file__).resolve().parents[2] / "data" / "recipes.db")
+
+# All RecipeScorer reads; candidates are fetched with just these and the
+# winners re-read in full
+SCORING_COLUMNS = "id, title, ingredients_text, tags, prep_time, cook_time"
 
 
 def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
     """Get a SQLite connection with Row factory"""
     if db_path is None:
-        db_path = str(Path(__file__).resolve().parents[2] / "data" / "recipes.db")
-    conn = sqlite3.connect(str(db_path))
+        db_path = DEFAULT_DB_PATH
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+class RecipeStore:
+    """
+    Process-wide state for one recipe database: a single connection (so
+    sqlite3 reuses prepared statements) and the in-memory pantry and vector
+    indexes for the current db_version. Every RecipeTool on the same file,
+    i.e. every session, shares it; see get_store.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode: Optional[int] = None
+        self._version: Optional[int] = None
+        self._pantry_index: Optional[PantryIndex] = None
+        self._vector_index: Optional[VectorIndex] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """The shared connection, reopened if a full migration replaced the file"""
+        try:
+            inode: Optional[int] = os.stat(self.db_path).st_ino
+        except OSError:
+            inode = None
+        if self._conn is None or inode != self._inode:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = get_connection(self.db_path)
+            self._inode = inode
+        return self._conn
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            conn = self._connection()
+            with SQLITE_LATENCY.time(db="recipes", operation="query"):
+                return conn.execute(sql, tuple(params)).fetchall()
+
+    def db_version(self) -> int:
+        """Version stamp bumped by every migration; 0 for databases without one"""
+        try:
+            rows = self.query("SELECT value FROM meta WHERE key = 'db_version'")
+        except sqlite3.OperationalError:
+            return 0
+        return rows[0]["value"] if rows else 0
+
+    def _check_version(self):
+        """
+        Drop indexes built from an older migration. A vector index is not
+        closed: another session may be searching it, and its mapping is
+        released once the last reference goes.
+        """
+        version = self.db_version()
+        if version != self._version:
+            self._pantry_index = None
+            self._vector_index = None
+            self._version = version
+
+    def pantry_index(self) -> PantryIndex:
+        with self._lock:
+            self._check_version()
+            if self._pantry_index is None:
+                conn = get_connection(self.db_path)
+                try:
+                    self._pantry_index = PantryIndex.load(conn)
+                finally:
+                    conn.close()
+            return self._pantry_index
+
+    def vector_index(self) -> VectorIndex:
+        with self._lock:
+            self._check_version()
+            if self._vector_index is None:
+                conn = get_connection(self.db_path)
+                try:
+                    self._vector_index = VectorIndex.load(conn, self.db_path)
+                except sqlite3.OperationalError as e:
+                    raise ValueError(
+                        "Semantic search index not built; run migrate_db.py with --vectors"
+                    ) from e
+                finally:
+                    conn.close()
+            return self._vector_index
+
+
+_STORES: Dict[str, RecipeStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(db_path: Optional[str] = None) -> RecipeStore:
+    """The shared RecipeStore for a database file"""
+    path = os.path.abspath(db_path or DEFAULT_DB_PATH)
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = RecipeStore(path)
+        return store
+
+
 class RecipeTool:
     def __init__(self, db_path: Optional[str] = None):
         """Initialize RecipeTool with optional custom db_path"""
         self.db_path = db_path
+        # Connection and indexes are shared with every other tool on this file
+        self.store = get_store(db_path)
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        return self.store.query(sql, params)
+
+    def _db_version(self) -> int:
+        return self.store.db_version()
 
     def find_recipes(
         self,
@@ -51,39 +169,30 @@ class RecipeTool:
             sql += " WHERE " + " AND ".join(where_clauses)
         sql += " LIMIT 5"
 
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(sql, tuple(params))
-            rows = cur.fetchall()
-            return [self._row_to_recipe(row) for row in rows]
-        finally:
-            conn.close()
+        rows = self._query(sql, params)
+        return [self._row_to_recipe(row) for row in rows]
 
     def get_recipe_by_id(self, recipe_id: str) -> Optional[Recipe]:
         """Get a single recipe by ID"""
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
-            row = cur.fetchone()
-            return self._row_to_recipe(row) if row else None
-        finally:
-            conn.close()
+        rows = self._query("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
+        return self._row_to_recipe(rows[0]) if rows else None
+
+    def get_recipes_by_ids(self, recipe_ids: List[str]) -> List[Recipe]:
+        """Get several recipes by ID, preserving the order of recipe_ids"""
+        if not recipe_ids:
+            return []
+        placeholders = ",".join("?" * len(recipe_ids))
+        rows = self._query(f"SELECT * FROM recipes WHERE id IN ({placeholders})", recipe_ids)
+        by_id = {row["id"]: row for row in rows}
+        return [self._row_to_recipe(by_id[i]) for i in recipe_ids if i in by_id]
 
     def search_by_title(self, title: str) -> List[Recipe]:
         """Search recipes by title (case-insensitive partial match)"""
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT * FROM recipes WHERE lower(title) LIKE '%'||?||'%' LIMIT 5",
-                (title.lower(),),
-            )
-            rows = cur.fetchall()
-            return [self._row_to_recipe(row) for row in rows]
-        finally:
-            conn.close()
+        rows = self._query(
+            "SELECT * FROM recipes WHERE lower(title) LIKE '%'||?||'%' LIMIT 5",
+            (title.lower(),),
+        )
+        return [self._row_to_recipe(row) for row in rows]
 
     def search_recipes(
         self,
@@ -98,7 +207,7 @@ class RecipeTool:
         limit: int = 5,
     ) -> List[Recipe]:
         """
-        Main search method supporting all filter combinations
+        Main search method supporting all filter combinations, best matches first
         Args:
             ingredients: List of ingredient names to include
             excluded_ingredients: List of ingredient names to exclude
@@ -108,67 +217,148 @@ class RecipeTool:
             servings: Minimum number of servings
             tags: List of tags to match
             limit: Maximum number of results to return
+        Identical criteria (after canonicalization) are served from a shared
+        result cache until the next migration bumps the database version.
         """
-        where_clauses = []
-        params = []
+        criteria = SearchCriteria(
+            recipe_title=recipe_title,
+            ingredients=ingredients,
+            excluded_ingredients=excluded_ingredients,
+            max_total_time=max_total_time,
+            max_prep_time=max_prep_time,
+            difficulty=difficulty,
+            servings=servings,
+            tags=tags,
+        )
+        cache_key = (self.db_path or DEFAULT_DB_PATH, self._db_version(), criteria.key, limit)
+        recipe_ids = RESULT_CACHE.get(cache_key)
+        if recipe_ids is None:
+            rows = self._fetch_candidates(criteria, SCORING_COLUMNS)
+            recipe_ids = [row["id"] for row, _ in top_k(rows, self._scorer(criteria), limit)]
+            RESULT_CACHE.put(cache_key, recipe_ids)
+        return self.get_recipes_by_ids(recipe_ids)
+
+    def rank_recipes(
+        self,
+        recipe_title: Optional[str] = None,
+        ingredients: Optional[List[str]] = None,
+        excluded_ingredients: Optional[List[str]] = None,
+        max_total_time: Optional[int] = None,
+        max_prep_time: Optional[int] = None,
+        difficulty: Optional[str] = None,
+        servings: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        page_size: int = 5,
+        cursor: Optional[str] = None,
+    ) -> RecipeSearchPage:
+        """
+        Relevance-ranked search with cursor pagination. Candidates matching the
+        filters are scored by ingredient overlap, title match, tag match and
+        time fit. Passing the returned next_cursor resumes the same ranking
+        without re-querying; the filter arguments are ignored in that case.
+        A cursor can be read more than once and returns the same page.
+        """
+        if cursor:
+            result = CURSORS.read(cursor, page_size)
+            if result is None:
+                raise ValueError(f"Unknown or expired cursor: {cursor}")
+            page, next_cursor = result
+        else:
+            criteria = SearchCriteria(
+                recipe_title=recipe_title,
+                ingredients=ingredients,
+                excluded_ingredients=excluded_ingredients,
+                max_total_time=max_total_time,
+                max_prep_time=max_prep_time,
+                difficulty=difficulty,
+                servings=servings,
+                tags=tags,
+            )
+            rows = self._fetch_candidates(criteria, SCORING_COLUMNS)
+            ranked = RankedResults(rows, self._scorer(criteria))
+            page = ranked.page(0, page_size)
+            next_cursor = CURSORS.put(ranked, len(page)) if len(ranked) > len(page) else None
 
-        if recipe_title:
-            where_clauses.append("title LIKE '%'||?||'%'")
-            params.append(recipe_title.lower())  # case-insensitive partial match
-
-        if ingredients:
-            # Match any of the ingredients (OR logic)
-            ing_clauses = []
-            for ing in ingredients:
-                ing_name = ing["name"] if isinstance(ing, dict) else str(ing)
-                ing_clauses.append("ingredients_text LIKE '%'||?||'%'")
-                params.append(ing_name.lower())
-            where_clauses.append(f"({' OR '.join(ing_clauses)})")
-
-        if excluded_ingredients:
-            # Exclude these ingredients (AND NOT logic)
-            for ing in excluded_ingredients:
-                ing_name = ing["name"] if isinstance(ing, dict) else str(ing)
-                where_clauses.append("ingredients_text NOT LIKE '%'||?||'%'")
-                params.append(ing_name.lower())
-
-        if max_total_time:
-            where_clauses.append("(prep_time + cook_time) <= ?")
-            params.append(max_total_time)
+        scores = dict(page)
+        # A recipe removed by a migration since the ranking was built is skipped
+        recipes = self.get_recipes_by_ids([recipe_id for recipe_id, _ in page])
+        return RecipeSearchPage(
+            recipes=recipes,
+            scores=[scores[recipe.id] for recipe in recipes],
+            next_cursor=next_cursor,
+        )
 
-        if max_prep_time:
-            where_clauses.append("prep_time <= ?")
-            params.append(max_prep_time)
+    def _fetch_candidates(
+        self, criteria: SearchCriteria, columns: str = "*"
+    ) -> List[sqlite3.Row]:
+        """Fetch every row passing the hard filters, unordered"""
+        sql = PLAN_CACHE.get(criteria.shape, columns)
+        return self._query(sql, criteria.params())
 
-        if difficulty:
-            where_clauses.append("difficulty = ?")
-            params.append(difficulty)
+    def _scorer(self, criteria: SearchCriteria) -> RecipeScorer:
+        return RecipeScorer(
+            recipe_title=criteria.recipe_title,
+            ingredients=list(criteria.ingredients),
+            tags=list(criteria.scoring_tags),
+            max_total_time=criteria.max_total_time,
+        )
 
-        if servings:
-            where_clauses.append("servings >= ?")
-            params.append(servings)
+    def match_pantry(
+        self, pantry: List[str], limit: int = 5, min_coverage: float = 0.0
+    ) -> List[PantryMatch]:
+        """
+        Find recipes that can be cooked from the given pantry, ranked by the
+        fraction of their ingredients the pantry covers, with what is missing
+        """
+        index = self._get_pantry_index()
+        matches = index.top_matches(pantry, limit=limit, min_coverage=min_coverage)
+        if not matches:
+            return []
 
-        if tags and not recipe_title:
-            # Match any of the tags (OR logic)
-            tag_clauses = []
-            for tag in tags:
-                tag_clauses.append("tags LIKE '%'||?||'%'")
-                params.append(tag.lower())
-            where_clauses.append(f"({' OR '.join(tag_clauses)})")
+        mask = index.pantry_mask(pantry)
+        recipes = {r.id: r for r in self.get_recipes_by_ids([index.recipe_ids[i] for i, _ in matches])}
+        results = []
+        for i, coverage in matches:
+            recipe = recipes.get(index.recipe_ids[i])
+            if recipe:
+                results.append(
+                    PantryMatch(
+                        recipe=recipe,
+                        coverage=coverage,
+                        missing_ingredients=index.missing(i, mask),
+                    )
+                )
+        return results
 
-        sql = "SELECT * FROM recipes"
-        if where_clauses:
-            sql += " WHERE " + " AND ".join(where_clauses)
-        sql += f" LIMIT {limit}"
+    def _get_pantry_index(self) -> PantryIndex:
+        return self.store.pantry_index()
 
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(sql, tuple(params))
-            rows = cur.fetchall()
-            return [self._row_to_recipe(row) for row in rows]
-        finally:
-            conn.close()
+    def semantic_search(
+        self,
+        query: str,
+        limit: int = 5,
+        nprobe: int = 4,
+        **filters,
+    ) -> List[Recipe]:
+        """
+        Retrieve recipes by meaning rather than exact words (e.g. "cozy
+        winter soup"). Any search_recipes filters passed as keyword arguments
+        switch to hybrid mode: vector hits are intersected with the rows the
+        SQL filters allow.
+        """
+        index = self._get_vector_index()
+        allowed = None
+        if any(v for v in filters.values()):
+            criteria = SearchCriteria(**filters)
+            allowed = {row["id"] for row in self._fetch_candidates(criteria, "id")}
+            if not allowed:
+                return []
+
+        hits = index.search(query, k=limit, nprobe=nprobe, allowed=allowed)
+        return self.get_recipes_by_ids([recipe_id for recipe_id, _ in hits])
+
+    def _get_vector_index(self) -> VectorIndex:
+        return self.store.vector_index()
 
     def _row_to_recipe(self, row: sqlite3.Row) -> Recipe:
         """Convert a database row to a Recipe model"""
@@ -202,4 +392,5 @@ class RecipeTool:
             cook_time=row["cook_time"],
             difficulty=row["difficulty"],
             servings=row["servings"],
+            tags=[tag for tag in (row["tags"] or "").split(",") if tag],
         )
@@ -0,0 +1,182 @@
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+ORDINALS = {
+    "first": 0, "1st": 0, "one": 0,
+    "second": 1, "2nd": 1, "two": 1,
+    "third": 2, "3rd": 2, "three": 2,
+    "fourth": 3, "4th": 3, "four": 3,
+    "fifth": 4, "5th": 4, "five": 4,
+}
+
+# "the second one", "option 2", "number two", "#3", "no. 4"
+_ORDINAL_RE = re.compile(
+    r"\b(?:the\s+)?(first|1st|second|2nd|third|3rd|fourth|4th|fifth|5th)\b"
+    r"|(?:#|\bno\.\s*|\bnumber\s+|\boption\s+|\bchoice\s+|\bresult\s+)(\d+|one|two|three|four|five)\b"
+    # Without the dot only a digit counts, or "no one there" would mean the first
+    r"|\bno\s+(\d+)\b"
+)
+_LAST_RE = re.compile(r"\b(?:the\s+)?(last|final|bottom)\s+(?:one|place|restaurant|option)\b")
+_ANAPHORA_RE = re.compile(
+    r"\b(it|its|it's|there|that one|this one|that place|this place|that restaurant|"
+    r"this restaurant|the place|the restaurant|they|them|their)\b"
+)
+
+# What a follow-up asks about, to pick the details field-mask tier
+_TIER_PATTERNS = {
+    "hours": re.compile(r"\b(hours?|open|opens|opening|close|closes|closing|closed|when)\b"),
+    "links": re.compile(r"\b(links?|maps?|directions?|website|reviews?|photos?|pictures?)\b"),
+    "address": re.compile(r"\b(address|where|located|location)\b"),
+}
+
+# Words that say nothing about which restaurant is meant
+STOPWORDS = {
+    "a", "an", "the", "and", "of", "at", "in", "on", "for", "to", "is", "are", "what",
+    "whats", "when", "how", "me", "about", "more", "tell", "details", "hours", "open",
+    "does", "do", "it", "that", "this", "one", "place", "restaurant", "restaurants",
+    "there", "get", "give", "show", "please", "can", "you", "i", "want", "like",
+    "address", "where", "which", "their", "they", "info", "information", "s",
+}
+
+FUZZY_TOKEN_RATIO = 0.85
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower().replace("'", "")) if t not in STOPWORDS]
+
+
+def _token_match(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 4:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= FUZZY_TOKEN_RATIO
+
+
+def token_set_scores(query: str, texts: List[str]) -> List[float]:
+    """
+    Token-set similarity of the query against each candidate text. Each
+    candidate token found (fuzzily) in the query counts 1/df, where df is the
+    number of candidates containing that token, so a word shared by several
+    candidates ("kitchen") says less than a distinctive one ("sakura").
+    """
+    query_tokens = set(_tokens(query))
+    token_sets = [set(_tokens(t or "")) for t in texts]
+    df: Dict[str, int] = {}
+    for tokens in token_sets:
+        for token in tokens:
+            df[token] = df.get(token, 0) + 1
+    return [
+        sum(1 / df[t] for t in tokens if any(_token_match(q, t) for q in query_tokens))
+        for tokens in token_sets
+    ]
+
+
+def detail_tier(text: str) -> str:
+    """
+    Field-mask tier a follow-up needs: "address", "hours", "links" or
+    "full". Hours and links tiers include the address; anything that
+    asks for more than one of them, or none, gets full details.
+    """
+    lowered = text.lower()
+    wanted = {tier for tier, pattern in _TIER_PATTERNS.items() if pattern.search(lowered)}
+    if len(wanted) > 1:
+        wanted.discard("address")
+    return wanted.pop() if len(wanted) == 1 else "full"
+
+
+class Resolution:
+    """Outcome of resolving a restaurant reference"""
+
+    def __init__(self, index: Optional[int], method: str, ambiguous: bool = False):
+        self.index = index
+        self.method = method
+        self.ambiguous = ambiguous
+
+    @property
+    def resolved(self) -> bool:
+        return self.index is not None and not self.ambiguous
+
+    def __repr__(self) -> str:
+        return f"Resolution(index={self.index}, method={self.method!r}, ambiguous={self.ambiguous})"
+
+
+class RestaurantResolver:
+    """
+    Resolves "the second one", "that Thai place" or "Pizza Palace" to an
+    index into the last search results without calling the LLM. Returns an
+    ambiguous Resolution when it cannot decide, so the caller can fall back.
+    """
+
+    def __init__(self, min_name_score: float = 0.5, margin: float = 0.5):
+        self.min_name_score = min_name_score
+        self.margin = margin
+
+    def resolve(
+        self,
+        text: str,
+        names: List[str],
+        descriptions: Optional[List[str]] = None,
+        last_index: Optional[int] = None,
+    ) -> Resolution:
+        if not names:
+            return Resolution(None, "no_candidates", ambiguous=True)
+        lowered = text.lower()
+
+        # 1. Exact name mentions win over everything else
+        exact = [i for i, name in enumerate(names) if name and name.lower() in lowered]
+        if len(exact) == 1:
+            return Resolution(exact[0], "exact_name")
+        if len(exact) > 1:
+            # "Thai Basil" and "Thai Basil Express": prefer the longest mention
+            longest = max(exact, key=lambda i: len(names[i]))
+            if sum(1 for i in exact if len(names[i]) == len(names[longest])) == 1:
+                return Resolution(longest, "exact_name")
+            return Resolution(None, "exact_name", ambiguous=True)
+
+        # 2. Ordinals
+        if _LAST_RE.search(lowered):
+            return Resolution(len(names) - 1, "ordinal")
+        match = _ORDINAL_RE.search(lowered)
+        if match:
+            word = match.group(1) or match.group(2) or match.group(3)
+            index = ORDINALS[word] if word in ORDINALS else int(word) - 1
+            if 0 <= index < len(names):
+                return Resolution(index, "ordinal")
+            return Resolution(None, "ordinal", ambiguous=True)
+
+        # 3. Fuzzy token-set match on names, then on descriptions (cuisine words)
+        for method, texts in (("fuzzy_name", names), ("description", descriptions or [])):
+            if not texts:
+                continue
+            scores = token_set_scores(text, texts)
+            ranked = sorted(range(len(scores)), key=lambda i: -scores[i])
+            best = ranked[0]
+            if scores[best] >= self.min_name_score:
+                runner_up = scores[ranked[1]] if len(ranked) > 1 else 0.0
+                if scores[best] - runner_up >= self.margin:
+                    return Resolution(best, method)
+                return Resolution(None, method, ambiguous=True)
+
+        # 4. Anaphora: "it", "that place" refer to the restaurant last discussed
+        if _ANAPHORA_RE.search(lowered):
+            if last_index is not None and 0 <= last_index < len(names):
+                return Resolution(last_index, "anaphora")
+            if len(names) == 1:
+                return Resolution(0, "anaphora")
+
+        if len(names) == 1:
+            return Resolution(0, "single_result")
+        return Resolution(None, "unresolved", ambiguous=True)
+
+    def match_name(self, name: str, names: List[str]) -> Optional[int]:
+        """Best index for a restaurant name (e.g. one the LLM produced)"""
+        resolution = self.resolve(name, names)
+        if resolution.resolved and resolution.method in ("exact_name", "fuzzy_name"):
+            return resolution.index
+        # The name may be a longer form of a candidate ("Pizza Palace Downtown")
+        for i, candidate in enumerate(names):
+            if candidate and candidate.lower() in name.lower():
+                return i
+        return None
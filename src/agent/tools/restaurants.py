@@ -1,21 +1,58 @@
 import json
 import os
-from typing import List, Optional, Dict, Any
+import time
+from typing import List, Optional, Dict, Any, Tuple
 from agent.schemas import Restaurant, PlaceDetails
-from agent.clients import PlacesClient
+from agent.clients import FIELD_MASK_TIERS, PlacesClient, tier_covers
+from agent.log import get_logger
+from agent.tools.catalog import build_places_backend
+from agent.tools.prefetch import DetailsPrefetcher
+from agent.tools.resolver import Resolution, RestaurantResolver
+from config import Config
+
+log = get_logger(__name__)
+
+# Session cache entries are kept short-lived so opening hours stay current
+SESSION_DETAILS_TTL = 300
+
+
+def _parse_details(details: Dict[str, Any], tier: str) -> PlaceDetails:
+    """
+    PlaceDetails holding only the tier's fields, all validated, so malformed
+    hours or links are rejected here instead of when the reply is built
+    (the details are dumped whole into the turn's context)
+    """
+    fields = FIELD_MASK_TIERS[tier].split(",")
+    return PlaceDetails(**{f: details[f] for f in fields if f in details}).validate_fields(fields)
 
 
 class RestaurantTool:
-    def __init__(self):
-        self.places_client = PlacesClient()
+    def __init__(
+        self,
+        places_client: Optional[PlacesClient] = None,
+        prefetch_top_n: Optional[int] = None,
+    ):
+        self.places_client = places_client or build_places_backend()
         self.last_search_results: List[Restaurant] = []
         self.last_place_data: List[Dict[str, Any]] = []  # Store full place data
+        self.last_detail_index: Optional[int] = None  # Restaurant last discussed
+        self.resolver = RestaurantResolver()
+        # Per-session details by place ID, as (fetched_at, details, field tier)
+        self.details_cache: Dict[str, Tuple[float, PlaceDetails, str]] = {}
+
+        if prefetch_top_n is None:
+            prefetch_top_n = Config.PLACES_PREFETCH_TOP_N
+        self.prefetcher = (
+            DetailsPrefetcher(self._fetch_details, prefetch_top_n)
+            if prefetch_top_n > 0
+            else None
+        )
 
     def search_restaurants(self, query: str) -> List[Restaurant]:
         results = []
-        print(f"Searching restaurants with query: {query}")
         places = self.places_client.search_place(query)
-        print(f"Found {len(places)} places")
+        log.info("places_found", count=len(places), query_chars=len(query))
+        log.debug("places_query", query=query)
 
         # Store full place data for later use
         self.last_place_data = places[:5]
@@ -33,46 +70,164 @@ class RestaurantTool:
                 )
                 results.append(restaurant)
             except Exception as e:
-                print(f"Error processing place {place}: {e}")
+                log.warning("place_parse_failed", place_id=place.get("name"), error=str(e))
                 results.append(place)
         self.last_search_results = results[:5]
+        self.last_detail_index = None
+
+        if self.prefetcher:
+            self.prefetcher.prefetch(
+                [p["name"] for p in self.last_place_data if p.get("name") not in self.details_cache]
+            )
         return self.last_search_results
 
     def get_last_search_results(self) -> List[Restaurant]:
         return self.last_search_results
 
-    def get_restaurant_details_by_index(self, index: int) -> Optional[PlaceDetails]:
+    def get_restaurant_by_id(self, restaurant_id: str) -> Optional[Restaurant]:
+        """A restaurant from the last search results"""
+        for restaurant in self.last_search_results:
+            if isinstance(restaurant, Restaurant) and restaurant.id == restaurant_id:
+                return restaurant
+        return None
+
+    def get_restaurant_details_by_index(
+        self, index: int, tier: str = "full"
+    ) -> Optional[PlaceDetails]:
         """Get restaurant details by index from last search results"""
         if not self.last_place_data or index < 0 or index >= len(self.last_place_data):
-            print(f"Invalid restaurant index: {index}")
+            log.warning("restaurant_index_invalid", index=index)
             return None
 
+        self.last_detail_index = index
         place_id = self.last_place_data[index]["name"]
-        return self.get_restaurant_details(place_id)
+        return self.get_restaurant_details(place_id, tier)
+
+    def _last_names(self) -> List[str]:
+        return [p.get("displayName", {}).get("text", "") for p in self.last_place_data]
 
-    def get_restaurant_details_by_name(self, name: str) -> Optional[PlaceDetails]:
+    def resolve_reference(self, text: str) -> Resolution:
+        """Work out which of the last results a follow-up message refers to"""
+        descriptions = [
+            " ".join(filter(None, [r.description, r.location]))
+            if isinstance(r, Restaurant)
+            else ""
+            for r in self.last_search_results
+        ]
+        return self.resolver.resolve(
+            text, self._last_names(), descriptions, last_index=self.last_detail_index
+        )
+
+    def get_restaurant_details_by_name(
+        self, name: str, tier: str = "full"
+    ) -> Optional[PlaceDetails]:
         """Get restaurant details by name matching from last search results"""
         if not self.last_place_data:
-            print("No previous search results available")
+            log.info("no_previous_results")
             return None
 
-        # Find restaurant by name (case-insensitive partial match)
-        name_lower = name.lower()
-        for i, place in enumerate(self.last_place_data):
-            place_name = place.get("displayName", {}).get("text", "").lower()
-            if name_lower in place_name or place_name in name_lower:
-                print(f"Found restaurant by name match: {place_name} (index {i})")
-                return self.get_restaurant_details_by_index(i)
+        index = self.resolver.match_name(name, self._last_names())
+        if index is not None:
+            log.debug("restaurant_name_matched", name=name, index=index)
+            return self.get_restaurant_details_by_index(index, tier)
+
+        log.info("restaurant_name_unmatched", name=name)
+        return None
 
-        print(f"No restaurant found matching name: {name}")
+    def _cached_details(self, restaurant_id: str, tier: str) -> Optional[PlaceDetails]:
+        cached = self.details_cache.get(restaurant_id)
+        if (
+            cached
+            and time.monotonic() - cached[0] < SESSION_DETAILS_TTL
+            and tier_covers(cached[2], tier)
+        ):
+            return cached[1]
         return None
 
-    def get_restaurant_details(self, restaurant_id: str) -> Optional[PlaceDetails]:
-        details = self.places_client.get_place_details(restaurant_id)
+    def get_restaurant_details(
+        self, restaurant_id: str, tier: str = "full"
+    ) -> Optional[PlaceDetails]:
+        """
+        Details for one restaurant. `tier` picks the field mask (see
+        FIELD_MASK_TIERS) so an address question doesn't fetch opening hours.
+        """
+        cached = self._cached_details(restaurant_id, tier)
+        if cached:
+            return cached
+
+        details = None
+        future = self.prefetcher.take(restaurant_id) if self.prefetcher else None
+        if future is not None and not future.cancelled():
+            try:
+                details = future.result()
+            except Exception as e:
+                log.warning("prefetch_failed", restaurant_id=restaurant_id, error=str(e))
+        if details is not None:
+            tier = "full"  # Prefetches always use the full mask
+        else:
+            # Not prefetched, or the prefetch failed or was shed by the rate limiter
+            details = self._fetch_details(restaurant_id, tier)
+
+        if details:
+            self.details_cache[restaurant_id] = (time.monotonic(), details, tier)
+        return details
+
+    def get_restaurant_details_many(
+        self,
+        restaurant_ids: List[str],
+        deadline: Optional[float] = None,
+        tier: str = "full",
+    ) -> Dict[str, PlaceDetails]:
+        """
+        Details for several restaurants at once, e.g. to compare them. Served
+        from the session cache where possible, the rest fetched in one
+        concurrent batch. Restaurants not fetched within the deadline are
+        missing from the result.
+        """
+        results: Dict[str, PlaceDetails] = {}
+        to_fetch = []
+        for restaurant_id in dict.fromkeys(restaurant_ids):
+            cached = self._cached_details(restaurant_id, tier)
+            if cached:
+                results[restaurant_id] = cached
+            else:
+                to_fetch.append(restaurant_id)
+
+        if to_fetch:
+            field_mask = FIELD_MASK_TIERS[tier] if tier != "full" else None
+            fetched = self.places_client.get_place_details_many(
+                to_fetch, field_mask=field_mask, deadline=deadline
+            )
+            for restaurant_id, details in fetched.items():
+                try:
+                    results[restaurant_id] = _parse_details(details, tier)
+                except Exception as e:
+                    log.warning("details_parse_failed", restaurant_id=restaurant_id, error=str(e))
+                    continue
+                self.details_cache[restaurant_id] = (time.monotonic(), results[restaurant_id], tier)
+
+        return {rid: results[rid] for rid in dict.fromkeys(restaurant_ids) if rid in results}
+
+    def get_restaurant_details_by_indices(
+        self, indices: List[int], tier: str = "full"
+    ) -> List[PlaceDetails]:
+        """Details for several of the last search results, in the order given"""
+        place_ids = [
+            self.last_place_data[i]["name"]
+            for i in indices
+            if 0 <= i < len(self.last_place_data)
+        ]
+        details = self.get_restaurant_details_many(place_ids, tier=tier)
+        return [details[place_id] for place_id in place_ids if place_id in details]
+
+    def _fetch_details(self, restaurant_id: str, tier: str = "full") -> Optional[PlaceDetails]:
+        if tier == "full":
+            details = self.places_client.get_place_details(restaurant_id)
+        else:
+            details = self.places_client.get_place_details(restaurant_id, FIELD_MASK_TIERS[tier])
         if details:
             try:
-                restaurant_detail = PlaceDetails(**details)
-                return restaurant_detail
+                return _parse_details(details, tier)
             except Exception as e:
-                print(f"Error processing details for restaurant {restaurant_id}: {e}")
+                log.warning("details_parse_failed", restaurant_id=restaurant_id, error=str(e))
         return None
@@ -0,0 +1,349 @@
+import heapq
+import math
+import mmap
+import os
+import random
+import re
+import sqlite3
+import time
+import zlib
+from array import array
+from itertools import repeat
+from operator import add, mul
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DIM = 384
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+# Small hand-built concept lexicon. Mood/season/occasion words in user
+# requests rarely appear in recipe text, so they are expanded into the
+# concrete words that do.
+CONCEPTS: Dict[str, List[str]] = {
+    "cozy": ["comfort", "warm", "soup", "stew", "hearty", "baked"],
+    "comforting": ["comfort", "warm", "soup", "stew", "hearty"],
+    "winter": ["warm", "soup", "stew", "hearty", "roast", "comfort"],
+    "cold": ["soup", "stew", "warm"],
+    "autumn": ["pumpkin", "roast", "soup", "warm"],
+    "fall": ["pumpkin", "roast", "soup", "warm"],
+    "summer": ["light", "fresh", "salad", "grill", "grilled", "vegetable"],
+    "light": ["salad", "fresh", "healthy", "vegetable", "quick"],
+    "healthy": ["salad", "vegetable", "vegetarian", "fresh", "light"],
+    "hearty": ["stew", "beef", "potato", "comfort", "main"],
+    "fancy": ["gourmet", "special", "occasion"],
+    "special": ["gourmet", "occasion"],
+    "date": ["gourmet", "special", "occasion"],
+    "dinner": ["main", "course"],
+    "lunch": ["salad", "sandwich", "quick"],
+    "breakfast": ["egg", "eggs", "toast", "breakfast"],
+    "fast": ["quick"],
+    "easy": ["quick", "easy"],
+    "weeknight": ["quick", "easy", "main"],
+    "spicy": ["chili", "curry", "pepper", "spicy"],
+    "veggie": ["vegetarian", "vegetable"],
+    "meatless": ["vegetarian", "vegetable"],
+    "soupy": ["soup", "broth"],
+    "noodles": ["pasta", "noodle", "spaghetti"],
+}
+
+EXPANSION_WEIGHT = 0.5
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("es"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def _hash(token: str) -> Tuple[int, float]:
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % DIM, 1.0 if (h >> 16) & 1 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Deterministic CPU embedder: stemmed tokens plus concept expansions are
+    feature-hashed into DIM signed buckets and L2-normalized. Vectors are
+    sparse, so they are returned as {dimension: weight}.
+    """
+
+    def embed(self, text: str) -> Dict[int, float]:
+        weights: Dict[str, float] = {}
+        for token in _TOKEN_RE.findall(text.lower()):
+            weights[_stem(token)] = weights.get(_stem(token), 0.0) + 1.0
+            for related in CONCEPTS.get(token, []):
+                key = _stem(related)
+                weights[key] = weights.get(key, 0.0) + EXPANSION_WEIGHT
+
+        vector: Dict[int, float] = {}
+        for token, weight in weights.items():
+            dim, sign = _hash(token)
+            vector[dim] = vector.get(dim, 0.0) + sign * weight
+
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if not norm:
+            return {}
+        return {dim: v / norm for dim, v in vector.items() if v}
+
+
+def recipe_text(title: str, ingredients_text: str, tags: str, difficulty: str) -> str:
+    """Text that gets embedded for a recipe; the title is counted twice"""
+    return " ".join(
+        [title, title, (tags or "").replace(",", " "), ingredients_text.replace(",", " "), difficulty]
+    )
+
+
+def _sparse_dot(sparse: Dict[int, float], dense: Sequence[float], offset: int = 0) -> float:
+    return sum(w * dense[offset + d] for d, w in sparse.items())
+
+
+def _nearest(vector: Dict[int, float], columns: List[array], k: int) -> int:
+    """
+    Index of the centroid closest to a sparse vector. `columns` holds the
+    centroids transposed (one array of k values per dimension), so each
+    non-zero weight is applied to every centroid in one C-level pass.
+    """
+    scores: Iterable[float] = repeat(0.0, k)
+    for d, w in vector.items():
+        scores = map(add, scores, map(mul, columns[d], repeat(w, k)))
+    scores = list(scores)
+    return max(range(k), key=scores.__getitem__)
+
+
+def _transpose(centroids: List[List[float]]) -> List[array]:
+    return [array("d", column) for column in zip(*centroids)]
+
+
+def _kmeans(
+    vectors: List[Dict[int, float]], k: int, iterations: int = 8, seed: int = 7
+) -> List[List[float]]:
+    """Spherical k-means on sparse unit vectors, returning dense centroids"""
+    rng = random.Random(seed)
+    centroids = [[0.0] * DIM for _ in range(k)]
+    for c, v in zip(centroids, rng.sample(vectors, k)):
+        for d, w in v.items():
+            c[d] = w
+
+    for _ in range(iterations):
+        columns = _transpose(centroids)
+        sums = [[0.0] * DIM for _ in range(k)]
+        for v in vectors:
+            target = sums[_nearest(v, columns, k)]
+            for d, w in v.items():
+                target[d] += w
+        for c in range(k):
+            norm = math.sqrt(sum(x * x for x in sums[c]))
+            if norm:
+                centroids[c] = [x / norm for x in sums[c]]
+    return centroids
+
+
+def vectors_path(db_path: str) -> str:
+    """
+    Where the float32 matrix lived before builds were versioned. Each build
+    now writes a new `<vectors_path>.<version>` file and records its name in
+    the vector_file table, so the previous file is never rewritten under
+    readers that have it mapped.
+    """
+    return f"{db_path}.vectors"
+
+
+def build_vector_index(conn: sqlite3.Connection, db_path: str, train_per_list: int = 64) -> int:
+    """
+    Embed every recipe, cluster the embeddings into sqrt(N) inverted lists
+    and write a row-major float32 matrix ordered by list, so probing a list
+    reads one contiguous region of the memory map. Centroids are trained on
+    at most `train_per_list` sampled vectors per list.
+
+    The matrix goes to a new file; the tables that point at it change inside
+    the caller's transaction. Call remove_stale_vector_files once that
+    transaction has committed or rolled back.
+    """
+    embedder = HashingEmbedder()
+    ids, vectors = [], []
+    for row in conn.execute(
+        "SELECT id, title, ingredients_text, tags, difficulty FROM recipes ORDER BY id"
+    ):
+        ids.append(row[0])
+        vectors.append(embedder.embed(recipe_text(row[1], row[2], row[3], row[4])))
+
+    # Plain execute() calls keep this inside the caller's transaction
+    conn.execute("DROP TABLE IF EXISTS recipe_vectors")
+    conn.execute("DROP TABLE IF EXISTS ivf_lists")
+    conn.execute("DROP TABLE IF EXISTS vector_file")
+    conn.execute("""
+    CREATE TABLE recipe_vectors (
+        row INTEGER PRIMARY KEY,  -- Row in the float32 matrix
+        recipe_id TEXT NOT NULL
+    )""")
+    conn.execute("CREATE INDEX idx_recipe_vectors_recipe_id ON recipe_vectors(recipe_id)")
+    conn.execute("""
+    CREATE TABLE ivf_lists (
+        list_id INTEGER PRIMARY KEY,
+        centroid BLOB NOT NULL,  -- float32[DIM]
+        start_row INTEGER NOT NULL,
+        end_row INTEGER NOT NULL
+    )""")
+    conn.execute("""
+    CREATE TABLE vector_file (
+        name TEXT NOT NULL  -- Matrix file, in the database's directory
+    )""")
+    path = f"{vectors_path(db_path)}.{time.time_ns():x}"
+    conn.execute("INSERT INTO vector_file (name) VALUES (?)", (os.path.basename(path),))
+
+    lists: List[List[int]] = []
+    centroids: List[List[float]] = []
+    if ids:
+        nlist = max(1, int(math.sqrt(len(ids))))
+        rng = random.Random(11)
+        train_size = nlist * train_per_list
+        sample = vectors if len(vectors) <= train_size else rng.sample(vectors, train_size)
+        centroids = _kmeans([v for v in sample if v] or vectors, min(nlist, len(sample)))
+        nlist = len(centroids)
+
+        columns = _transpose(centroids)
+        lists = [[] for _ in range(nlist)]
+        for i, v in enumerate(vectors):
+            lists[_nearest(v, columns, nlist)].append(i)
+
+    row = 0
+    with open(path, "wb") as f:
+        for list_id, members in enumerate(lists):
+            start = row
+            for i in members:
+                dense = array("f", bytes(4 * DIM))
+                for d, w in vectors[i].items():
+                    dense[d] = w
+                dense.tofile(f)
+            conn.executemany(
+                "INSERT INTO recipe_vectors (row, recipe_id) VALUES (?, ?)",
+                ((start + n, ids[i]) for n, i in enumerate(members)),
+            )
+            row += len(members)
+            conn.execute(
+                "INSERT INTO ivf_lists (list_id, centroid, start_row, end_row) VALUES (?, ?, ?, ?)",
+                (list_id, array("f", centroids[list_id]).tobytes(), start, row),
+            )
+        f.flush()
+        os.fsync(f.fileno())
+    return row
+
+
+def _vector_file(conn: sqlite3.Connection, db_path: str) -> str:
+    """Path of the matrix the database currently points at"""
+    try:
+        row = conn.execute("SELECT name FROM vector_file").fetchone()
+    except sqlite3.OperationalError:
+        row = None  # Built before matrix files were versioned
+    if row is None:
+        return vectors_path(db_path)
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), row[0])
+
+
+def remove_stale_vector_files(conn: sqlite3.Connection, db_path: str) -> List[str]:
+    """
+    Delete matrix files the database no longer points at: the previous
+    build's after a commit, or the abandoned one after a rollback. A process
+    that still has an old file mapped keeps reading it; the data goes away
+    when the mapping is closed. Files that can't be removed yet (Windows
+    refuses while mapped) are left for the next call.
+    """
+    current = os.path.abspath(_vector_file(conn, db_path))
+    directory = os.path.dirname(current)
+    prefix = os.path.basename(vectors_path(db_path))
+    removed = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if (name == prefix or name.startswith(prefix + ".")) and path != current:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+    return removed
+
+
+class VectorIndex:
+    """Memory-mapped IVF index over recipe embeddings"""
+
+    def __init__(
+        self,
+        path: str,
+        recipe_ids: List[str],
+        centroids: List[array],
+        ranges: List[Tuple[int, int]],
+    ):
+        self.recipe_ids = recipe_ids
+        self.rows = {recipe_id: i for i, recipe_id in enumerate(recipe_ids)}
+        self.centroids = centroids
+        self.ranges = ranges
+        self.embedder = HashingEmbedder()
+        self._file = open(path, "rb")
+        if os.path.getsize(path):
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.matrix = memoryview(self._mmap).cast("f")
+        else:
+            self._mmap = None
+            self.matrix = memoryview(array("f"))
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, db_path: str) -> "VectorIndex":
+        recipe_ids = [r[0] for r in conn.execute("SELECT recipe_id FROM recipe_vectors ORDER BY row")]
+        centroids, ranges = [], []
+        for blob, start, end in conn.execute(
+            "SELECT centroid, start_row, end_row FROM ivf_lists ORDER BY list_id"
+        ):
+            centroids.append(array("f", blob))
+            ranges.append((start, end))
+        return cls(_vector_file(conn, db_path), recipe_ids, centroids, ranges)
+
+    def close(self):
+        self.matrix.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def _score_rows(self, query: Dict[int, float], rows: Iterable[int]) -> List[Tuple[float, int]]:
+        matrix = self.matrix
+        items = list(query.items())
+        return [(sum(w * matrix[r * DIM + d] for d, w in items), r) for r in rows]
+
+    def search(
+        self,
+        text: str,
+        k: int = 5,
+        nprobe: int = 4,
+        allowed: Optional[set] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Approximate top-k recipe IDs by cosine similarity. With `allowed`
+        (hybrid mode) only those recipe IDs are eligible; if the probed lists
+        hold fewer than k of them the allowed set is scored exactly.
+        """
+        query = self.embedder.embed(text)
+        if not query or not self.recipe_ids:
+            return []
+
+        probe = heapq.nlargest(
+            nprobe, range(len(self.centroids)), key=lambda c: _sparse_dot(query, self.centroids[c])
+        )
+        rows = (r for c in probe for r in range(*self.ranges[c]))
+        if allowed is not None:
+            rows = (r for r in rows if self.recipe_ids[r] in allowed)
+        scored = self._score_rows(query, rows)
+
+        if allowed is not None and len(scored) < k:
+            exact = [self.rows[i] for i in allowed if i in self.rows]
+            scored = self._score_rows(query, exact)
+
+        best = heapq.nlargest(k, scored, key=lambda s: (s[0], -s[1]))
+        return [(self.recipe_ids[r], score) for score, r in best if score > 0]
+
+    def exact_search(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Brute-force reference used to measure recall"""
+        query = self.embedder.embed(text)
+        scored = self._score_rows(query, range(len(self.recipe_ids)))
+        best = heapq.nlargest(k, scored, key=lambda s: (s[0], -s[1]))
+        return [(self.recipe_ids[r], score) for score, r in best if score > 0]
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +12,108 @@ class Config:
     
     # GCP Storage Configuration
     BASE_BUCKET = os.getenv("BASE_BUCKET")
+
+    # Session files: "compact" (compressed blocks, see web/session_format.py;
+    # legacy JSON lines files convert on their next write) or "jsonl". Block
+    # codec "gzip", "zstd" (needs zstandard) or "none", payload encoding
+    # "json" or "msgpack" (needs msgpack), and messages per block
+    SESSION_FORMAT = os.getenv("SESSION_FORMAT", "compact")
+    SESSION_CODEC = os.getenv("SESSION_CODEC", "gzip")
+    SESSION_ENCODING = os.getenv("SESSION_ENCODING", "json")
+    SESSION_BLOCK_MESSAGES = int(os.getenv("SESSION_BLOCK_MESSAGES", 32))
+
+    # Session history pages: default and largest number of messages per page
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
+
+    # Per-user session index: seconds a cached copy is trusted before it is
+    # re-read (other workers' writes show up after at most this long), and
+    # how many users' indexes to keep in memory
+    SESSION_INDEX_TTL = float(os.getenv("SESSION_INDEX_TTL", 30))
+    SESSION_INDEX_CACHE_SIZE = int(os.getenv("SESSION_INDEX_CACHE_SIZE", 1024))
+
+    # Session deletion: batch requests (of up to 100 deletes) in flight at
+    # once per sweep, and background threads running deletion jobs
+    DELETE_BATCH_CONCURRENCY = int(os.getenv("DELETE_BATCH_CONCURRENCY", 8))
+    DELETE_JOB_WORKERS = int(os.getenv("DELETE_JOB_WORKERS", 2))
+
+    # Places cache: TTLs in seconds; an empty path disables the shared disk
+    # tier, whose expired entries are deleted at most once per purge interval
+    PLACES_SEARCH_TTL = int(os.getenv("PLACES_SEARCH_TTL", 3600))
+    PLACES_DETAILS_TTL = int(os.getenv("PLACES_DETAILS_TTL", 24 * 3600))
+    PLACES_STALE_TTL = int(os.getenv("PLACES_STALE_TTL", 3600))
+    PLACES_CACHE_PATH = os.getenv(
+        "PLACES_CACHE_PATH", os.path.join(tempfile.gettempdir(), "jamie_places_cache.db")
+    )
+    PLACES_CACHE_PURGE_INTERVAL = float(os.getenv("PLACES_CACHE_PURGE_INTERVAL", 3600))
+
+    # Details prefetch after a restaurant search; 0 disables it
+    PLACES_PREFETCH_TOP_N = int(os.getenv("PLACES_PREFETCH_TOP_N", 0))
+    PLACES_PREFETCH_WORKERS = int(os.getenv("PLACES_PREFETCH_WORKERS", 4))
+
+    # Places HTTP client: base URL (overridable for a local stand-in),
+    # connection pool size and time budget for a batch of details calls
+    PLACES_BASE_URL = os.getenv("PLACES_BASE_URL", "https://places.googleapis.com/v1")
+    PLACES_POOL_SIZE = int(os.getenv("PLACES_POOL_SIZE", 8))
+    PLACES_BATCH_DEADLINE = float(os.getenv("PLACES_BATCH_DEADLINE", 5.0))
+
+    # Client-side Places rate limit per API key: token bucket rate (requests
+    # per second) and burst, optional per-key overrides as JSON
+    # {"<key or fingerprint>": {"rate": 5, "burst": 10}}, and a SQLite file
+    # that shares the bucket between worker processes (empty: per process).
+    # Requests still queued after their deadline (seconds) are shed.
+    PLACES_RATE = float(os.getenv("PLACES_RATE", 10))
+    PLACES_BURST = float(os.getenv("PLACES_BURST", 20))
+    PLACES_RATE_LIMITS = os.getenv("PLACES_RATE_LIMITS", "")
+    PLACES_RATE_LIMIT_PATH = os.getenv(
+        "PLACES_RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "jamie_places_quota.db")
+    )
+    PLACES_INTERACTIVE_DEADLINE = float(os.getenv("PLACES_INTERACTIVE_DEADLINE", 5.0))
+    PLACES_PREFETCH_DEADLINE = float(os.getenv("PLACES_PREFETCH_DEADLINE", 1.0))
+
+    # Orders database (SQLite, WAL mode)
+    ORDER_DB_PATH = os.getenv(
+        "ORDER_DB_PATH", os.path.join(os.path.dirname(__file__), "data", "orders.db")
+    )
+
+    # Menus (JSON, JSON lines or CSV) keyed by restaurant ID; optional
+    MENU_CATALOG_PATH = os.getenv("MENU_CATALOG_PATH")
+
+    # Per-user event log (logs/): "text" or "json" lines; users are hashed
+    # onto EVENT_LOG_SHARDS files (0 = one file per session, which grows
+    # without bound). Files over EVENT_LOG_MAX_BYTES are gzipped, keeping
+    # EVENT_LOG_BACKUPS copies.
+    EVENT_LOG_FORMAT = os.getenv("EVENT_LOG_FORMAT", "text")
+    EVENT_LOG_SHARDS = int(os.getenv("EVENT_LOG_SHARDS", 16))
+    EVENT_LOG_MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    EVENT_LOG_BACKUPS = int(os.getenv("EVENT_LOG_BACKUPS", 5))
+    EVENT_LOG_MAX_OPEN_FILES = int(os.getenv("EVENT_LOG_MAX_OPEN_FILES", 64))
+
+    # Application logs (stderr): level, "text" or "json" lines, per-field
+    # size cap in characters, and per-event sample rates as JSON, e.g.
+    # {"place_parse_failed": 0.01}
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+    LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", 512))
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+    # /chat admission control: adaptive concurrency limit (starts at the
+    # initial limit, moves between min and max by AIMD against the target
+    # latency in seconds), bounded wait queue (total and per user) and the
+    # default request deadline in seconds (clients may send a shorter one
+    # in X-Request-Timeout)
+    ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", 8))
+    ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", 1))
+    ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", 32))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+    ADMISSION_MAX_QUEUE_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", 4))
+    ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", 8.0))
+    ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", 30.0))
+
+    # Restaurant backend: "places" (live API), "catalog" (local dump only)
+    # or "hybrid" (local catalog first, live API when it has no answer)
+    RESTAURANT_BACKEND = os.getenv("RESTAURANT_BACKEND", "places")
+    RESTAURANT_CATALOG_PATH = os.getenv("RESTAURANT_CATALOG_PATH")
     
     @classmethod
     def validate(cls):
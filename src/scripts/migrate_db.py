@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
 import json
 import sqlite3
 import sys
+import time
 from pathlib import Path
 
+# Allow running as a script: the embedding code lives in the agent package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from agent.tools.semantic import build_vector_index, remove_stale_vector_files
+
+DEFAULT_BATCH_SIZE = 5000
+
 def create_schema(conn):
-    """Create the SQLite schema for recipes"""
-    conn.executescript("""
+    """Create the SQLite schema for recipes (secondary indexes come later)"""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS recipes (
         id TEXT PRIMARY KEY,
         title TEXT NOT NULL,
@@ -18,16 +27,122 @@ def create_schema(conn):
         difficulty TEXT NOT NULL,
         servings INTEGER NOT NULL,
         tags TEXT,  -- Comma-separated tags
-        search_text TEXT  -- Denormalized text for full-text search
-    );
-    
-    -- Create indexes for common search patterns
-    CREATE INDEX IF NOT EXISTS idx_ingredients_text ON recipes(ingredients_text);
-    CREATE INDEX IF NOT EXISTS idx_difficulty ON recipes(difficulty);
-    CREATE INDEX IF NOT EXISTS idx_prep_time ON recipes(prep_time);
-    CREATE INDEX IF NOT EXISTS idx_tags ON recipes(tags);
-    CREATE INDEX IF NOT EXISTS idx_search_text ON recipes(search_text);
-    """)
+        search_text TEXT,  -- Denormalized text for full-text search
+        content_hash TEXT  -- Hash of the row values for incremental loads
+    )""")
+
+    # Databases created before incremental loads existed lack the hash column
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(recipes)")}
+    if 'content_hash' not in columns:
+        conn.execute("ALTER TABLE recipes ADD COLUMN content_hash TEXT")
+
+    # Ingredient vocabulary; the id is the bit position in recipe bitsets
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingredient_vocab (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )""")
+
+    # Per-recipe ingredient bitsets (little-endian) for pantry matching
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS recipe_ingredient_bits (
+        recipe_id TEXT PRIMARY KEY,
+        bits BLOB NOT NULL,
+        ingredient_count INTEGER NOT NULL
+    )""")
+
+    # Version stamp read by RecipeTool to invalidate its caches
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""")
+
+def bump_db_version(conn):
+    """
+    Move db_version forward. It is seeded from the clock so a database
+    rebuilt from scratch at the same path never reuses an old version.
+    """
+    conn.execute("""
+    INSERT INTO meta (key, value) VALUES ('db_version', ?)
+    ON CONFLICT(key) DO UPDATE SET value = max(value + 1, excluded.value)
+    """, (int(time.time() * 1000),))
+
+# Indexes for common search patterns, built once the rows are in place
+INDEXES = {
+    'idx_ingredients_text': 'recipes(ingredients_text)',
+    'idx_difficulty': 'recipes(difficulty)',
+    'idx_prep_time': 'recipes(prep_time)',
+    'idx_tags': 'recipes(tags)',
+    'idx_search_text': 'recipes(search_text)',
+}
+
+def drop_indexes(conn):
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+def create_indexes(conn):
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+def normalize_ingredient(name):
+    """Canonical vocabulary form of an ingredient name"""
+    return ' '.join(str(name).lower().split())
+
+def _recipe_ingredients(conn, recipe_ids=None, chunk_size=500):
+    """(id, ingredients_text) of every recipe, or only of `recipe_ids`"""
+    if recipe_ids is None:
+        yield from conn.execute("SELECT id, ingredients_text FROM recipes")
+        return
+    for i in range(0, len(recipe_ids), chunk_size):
+        chunk = recipe_ids[i:i + chunk_size]
+        yield from conn.execute(
+            f"SELECT id, ingredients_text FROM recipes WHERE id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+
+def build_ingredient_index(conn, recipe_ids=None):
+    """
+    Build the ingredient vocabulary and per-recipe bitsets from the recipes
+    table, for every recipe or only for `recipe_ids` (an incremental load
+    passes the ones it inserted or updated). Existing vocabulary ids are kept
+    so bit positions stay stable; new ingredients are appended, most
+    frequent first.
+    """
+    vocab = {name: id for id, name in conn.execute("SELECT id, name FROM ingredient_vocab")}
+
+    recipe_names = []
+    counts = {}
+    for recipe_id, ingredients_text in _recipe_ingredients(conn, recipe_ids):
+        names = {normalize_ingredient(n) for n in ingredients_text.split(',') if n.strip()}
+        recipe_names.append((recipe_id, names))
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+
+    new_names = sorted((n for n in counts if n not in vocab), key=lambda n: (-counts[n], n))
+    next_id = max(vocab.values(), default=-1) + 1
+    for name in new_names:
+        vocab[name] = next_id
+        next_id += 1
+    conn.executemany(
+        "INSERT INTO ingredient_vocab (id, name) VALUES (?, ?)",
+        ((vocab[name], name) for name in new_names),
+    )
+
+    def rows():
+        for recipe_id, names in recipe_names:
+            bits = 0
+            for name in names:
+                bits |= 1 << vocab[name]
+            yield recipe_id, bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), len(names)
+
+    if recipe_ids is None:
+        conn.execute("DELETE FROM recipe_ingredient_bits")
+    conn.executemany(
+        "INSERT OR REPLACE INTO recipe_ingredient_bits (recipe_id, bits, ingredient_count) "
+        "VALUES (?, ?, ?)",
+        rows(),
+    )
 
 def ingredients_to_text(ingredients):
     """Convert ingredients list to searchable text"""
@@ -39,112 +154,248 @@ def ingredients_to_text(ingredients):
             names.append(str(ing).lower())
     return ','.join(names)
 
-def create_search_text(recipe):
-    """Create denormalized search text from recipe"""
-    parts = [
+def content_hash(fields):
+    """Stable hash of a recipe's stored column values"""
+    return hashlib.sha1('\x1f'.join(map(str, fields)).encode('utf-8')).hexdigest()
+
+def recipe_to_row(recipe):
+    """Flatten a source recipe into a recipes table row"""
+    ingredients_text = ingredients_to_text(recipe['ingredients'])
+    tags_str = ','.join(str(tag).lower() for tag in recipe.get('tags', []))
+    search_terms = [
         recipe['title'].lower(),
-        ingredients_to_text(recipe['ingredients']),
-        ','.join(str(tag).lower() for tag in recipe.get('tags', [])),
-        recipe['difficulty'].lower()
+        ingredients_text,
+        recipe['difficulty'].lower(),
+        tags_str,
     ]
-    return ' '.join(filter(None, parts))
-
-def migrate_recipes(json_path, db_path):
-    """Migrate recipes from JSON to SQLite"""
-    # Load JSON data
-    with open(json_path, 'r') as f:
-        recipes = json.load(f)
-    
-    # Create database connection
-    conn = sqlite3.connect(db_path)
-    
+    fields = (
+        recipe['id'],
+        recipe['title'],
+        json.dumps(recipe['ingredients']),
+        ingredients_text,
+        json.dumps(recipe['instructions']),
+        recipe['prep_time'],
+        recipe['cook_time'],
+        recipe['difficulty'],
+        recipe['servings'],
+        tags_str,
+        ' '.join(filter(None, search_terms)),
+    )
+    return fields + (content_hash(fields),)
+
+def _iter_json_array(f, chunk_size=1 << 20):
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        if not eof:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("Expected a JSON array of recipes")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break  # Element continues in the next chunk
+            yield obj
+            pos = end
+
+        if eof:
+            raise ValueError("Unterminated JSON array")
+
+def iter_recipes(path):
+    """Stream recipes from a JSON array (.json) or JSON lines (.jsonl) file"""
+    path = Path(path)
+    with open(path, 'r') as f:
+        if path.suffix == '.jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+RECIPE_COLUMNS = (
+    'id', 'title', 'ingredients_json', 'ingredients_text', 'instructions_json',
+    'prep_time', 'cook_time', 'difficulty', 'servings', 'tags', 'search_text',
+    'content_hash',
+)
+
+INSERT_SQL = f"""
+INSERT INTO recipes ({', '.join(RECIPE_COLUMNS)})
+VALUES ({', '.join('?' for _ in RECIPE_COLUMNS)})
+"""
+
+UPSERT_SQL = INSERT_SQL + "ON CONFLICT(id) DO UPDATE SET " + ', '.join(
+    f"{c} = excluded.{c}" for c in RECIPE_COLUMNS if c != 'id'
+)
+
+def _relax_pragmas(conn, durable):
+    """
+    Bigger caches for the load. Unless it must stay `durable`, also trade
+    crash safety for speed: a fresh load into a new file is all-or-nothing
+    anyway, but a crash with the journal in memory can corrupt a live
+    database that an incremental load is updating.
+    """
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    if not durable:
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.execute("PRAGMA synchronous = OFF")
+
+def _restore_pragmas(conn):
+    conn.execute("PRAGMA synchronous = FULL")
+    conn.execute("PRAGMA journal_mode = DELETE")
+
+def migrate_recipes(json_path, db_path, incremental=False, batch_size=DEFAULT_BATCH_SIZE,
+                    build_vectors=False):
+    """
+    Load recipes from JSON/JSONL into SQLite in a single transaction.
+
+    A full load expects an empty database and inserts everything. An
+    incremental load upserts only recipes whose content hash changed and
+    removes recipes missing from the input. Ingredient bitsets are updated
+    for the changed recipes only; the vector index, whose lists are
+    contiguous runs of one matrix, is rebuilt whole when anything changed.
+    The vectors are opt-in: embedding and clustering is pure Python and
+    dominates the load time.
+    """
+    # Durability is only relaxed for a full load into a new, empty file
+    fresh = not incremental and (not Path(db_path).exists() or Path(db_path).stat().st_size == 0)
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    start = time.perf_counter()
+
     try:
-        # Create schema
+        _relax_pragmas(conn, durable=not fresh)
+        conn.execute("BEGIN")
         create_schema(conn)
-        
-        # Prepare insert statement
-        insert_sql = """
-        INSERT INTO recipes (
-            id, title, ingredients_json, ingredients_text,
-            instructions_json, prep_time, cook_time,
-            difficulty, servings, tags, search_text
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        
-        # Process each recipe
-        for recipe in recipes:
-            # Convert ingredients and instructions to JSON strings
-            ingredients = recipe['ingredients']
-            ingredients_json = json.dumps(ingredients)
-            instructions_json = json.dumps(recipe['instructions'])
-            
-            # Create searchable ingredients text
-            ingredient_names = []
-            for ing in ingredients:
-                if isinstance(ing, dict):
-                    ingredient_names.append(ing['name'].lower())
+
+        existing = {}
+        bitsets_complete = False
+        if incremental:
+            existing = dict(conn.execute("SELECT id, content_hash FROM recipes"))
+            # Databases loaded before bitsets existed need them built in full
+            bitsets_complete = conn.execute(
+                "SELECT count(*) FROM recipe_ingredient_bits"
+            ).fetchone()[0] == len(existing)
+        else:
+            # Maintaining indexes row by row is slower than building them once
+            drop_indexes(conn)
+
+        seen = set()
+        changed_ids = []
+        for batch in _batches(iter_recipes(json_path), batch_size):
+            rows = []
+            for recipe in batch:
+                row = recipe_to_row(recipe)
+                seen.add(row[0])
+                old_hash = existing.get(row[0])
+                if row[0] not in existing:
+                    stats['inserted'] += 1
+                elif old_hash != row[-1]:
+                    stats['updated'] += 1
                 else:
-                    ingredient_names.append(str(ing).lower())
-            ingredients_text = ','.join(ingredient_names)
-            
-            # Get tags or empty list
-            tags = recipe.get('tags', [])
-            tags_str = ','.join(str(tag).lower() for tag in tags)
-            
-            # Create search text
-            search_terms = [
-                recipe['title'].lower(),
-                ingredients_text,
-                recipe['difficulty'].lower(),
-                tags_str
-            ]
-            search_text = ' '.join(filter(None, search_terms))
-            
-            # Insert into database
-            conn.execute(insert_sql, (
-                recipe['id'],
-                recipe['title'],
-                ingredients_json,
-                ingredients_text,
-                instructions_json,
-                recipe['prep_time'],
-                recipe['cook_time'],
-                recipe['difficulty'],
-                recipe['servings'],
-                tags_str,
-                search_text
-            ))
-        
-        # Commit changes
-        conn.commit()
-        print(f"Successfully migrated {len(recipes)} recipes to {db_path}")
-        
+                    stats['unchanged'] += 1
+                    continue
+                if incremental:
+                    changed_ids.append(row[0])
+                rows.append(row)
+            conn.executemany(UPSERT_SQL if incremental else INSERT_SQL, rows)
+
+        if incremental:
+            removed = [(recipe_id,) for recipe_id in existing if recipe_id not in seen]
+            conn.executemany("DELETE FROM recipes WHERE id = ?", removed)
+            conn.executemany("DELETE FROM recipe_ingredient_bits WHERE recipe_id = ?", removed)
+            stats['deleted'] = len(removed)
+
+        create_indexes(conn)
+        changed = stats['inserted'] + stats['updated'] + stats['deleted']
+        if changed or not incremental:
+            build_ingredient_index(conn, changed_ids if bitsets_complete else None)
+            if build_vectors:
+                build_vector_index(conn, str(db_path))
+            bump_db_version(conn)
+
+        conn.execute("COMMIT")
+        elapsed = time.perf_counter() - start
+        print(
+            f"Successfully migrated {len(seen)} recipes to {db_path} in {elapsed:.1f}s "
+            f"({stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['deleted']} deleted)"
+        )
+        return stats
+
     except Exception as e:
         print(f"Error during migration: {e}", file=sys.stderr)
-        conn.rollback()
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
         raise
     finally:
+        if fresh:
+            _restore_pragmas(conn)
+        if build_vectors:
+            # The previous matrix after a commit, the new one after a rollback
+            remove_stale_vector_files(conn, str(db_path))
         conn.close()
 
 def main():
     # Set up paths
     src_dir = Path(__file__).resolve().parent.parent
-    json_path = src_dir / 'data' / 'recipes.json'
-    db_path = src_dir / 'data' / 'recipes.db'
-    
+    parser = argparse.ArgumentParser(description="Load recipes into the SQLite database")
+    parser.add_argument('--input', type=Path, default=src_dir / 'data' / 'recipes.json',
+                        help="Recipes as a JSON array (.json) or JSON lines (.jsonl)")
+    parser.add_argument('--db', type=Path, default=src_dir / 'data' / 'recipes.db')
+    parser.add_argument('--incremental', action='store_true',
+                        help="Upsert changed recipes into the existing database")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--vectors', action='store_true',
+                        help="Also build the semantic search index (slow on large inputs)")
+    args = parser.parse_args()
+    json_path, db_path = args.input, args.db
+
     # Ensure source file exists
     if not json_path.exists():
         print(f"Error: {json_path} not found", file=sys.stderr)
         sys.exit(1)
-    
+
     # Remove existing database if it exists
-    if db_path.exists():
+    if not args.incremental and db_path.exists():
         print(f"Removing existing database: {db_path}")
         db_path.unlink()
-    
+
     # Perform migration
     try:
-        migrate_recipes(json_path, db_path)
+        migrate_recipes(json_path, db_path, incremental=args.incremental,
+                        batch_size=args.batch_size, build_vectors=args.vectors)
     except Exception as e:
         print(f"Migration failed: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from config import Config
+
+
+class Overloaded(Exception):
+    """Request shed by admission control; surfaced as 503 with Retry-After"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Overloaded ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent chats at an adaptive limit. Requests over the limit
+    wait in per-user queues served round-robin, so one user's burst can't
+    starve everyone else. A request is shed (Overloaded) when the queue is
+    full, when its expected wait already exceeds its deadline, or when the
+    deadline passes while it waits.
+
+    The limit follows AIMD on observed latency: every completion under
+    target_latency grows it by 1/limit (about +1 per limit's worth of
+    requests); a completion over target cuts it by `backoff`, at most once
+    per target_latency so a burst of slow responses counts once.
+
+    Runs on one event loop; no locking needed.
+    """
+
+    def __init__(
+        self,
+        initial_limit: Optional[float] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_queue_per_user: Optional[int] = None,
+        target_latency: Optional[float] = None,
+        default_timeout: Optional[float] = None,
+        backoff: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = min_limit or Config.ADMISSION_MIN_LIMIT
+        self.max_limit = max_limit or Config.ADMISSION_MAX_LIMIT
+        self.limit = float(initial_limit or Config.ADMISSION_INITIAL_LIMIT)
+        self.max_queue = max_queue if max_queue is not None else Config.ADMISSION_MAX_QUEUE
+        self.max_queue_per_user = max_queue_per_user or Config.ADMISSION_MAX_QUEUE_PER_USER
+        self.target_latency = target_latency or Config.ADMISSION_TARGET_LATENCY
+        self.default_timeout = default_timeout or Config.ADMISSION_TIMEOUT
+        self.backoff = backoff
+        self.clock = clock
+
+        self.in_flight = 0
+        self.queued = 0
+        self._queues: "OrderedDict[str, Deque[Tuple[asyncio.Future, float]]]" = OrderedDict()
+        self._last_decrease = -math.inf
+        self.latency_ewma: Optional[float] = None
+        self.counters = {
+            "admitted": 0,
+            "enqueued": 0,
+            "shed_queue_full": 0,
+            "shed_deadline": 0,
+            "completed": 0,
+        }
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def expected_wait(self, position: int) -> float:
+        """Rough wait for the request at `position` in the queue"""
+        if self.latency_ewma is None:
+            return 0.0
+        return position / max(int(self.limit), 1) * self.latency_ewma
+
+    def retry_after(self) -> int:
+        return max(1, min(60, math.ceil(self.expected_wait(self.queued + 1))))
+
+    def _shed(self, reason: str) -> Overloaded:
+        self.counters[f"shed_{reason}"] += 1
+        return Overloaded(reason, self.retry_after())
+
+    async def acquire(self, user_id: str, timeout: Optional[float] = None):
+        """Wait for a slot; raises Overloaded if the request is shed"""
+        timeout = self.default_timeout if timeout is None else min(timeout, self.default_timeout)
+        start = self.clock()
+        if timeout <= 0:
+            raise self._shed("deadline")
+        if self.in_flight < int(self.limit) and not self.queued:
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return
+
+        user_queue = self._queues.get(user_id)
+        if self.queued >= self.max_queue or (
+            user_queue and len(user_queue) >= self.max_queue_per_user
+        ):
+            raise self._shed("queue_full")
+        # No point queueing a request that would expire before its turn
+        if self.expected_wait(self.queued + 1) > timeout:
+            raise self._shed("deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, start + timeout)
+        self._queues.setdefault(user_id, deque()).append(entry)
+        self.queued += 1
+        self.counters["enqueued"] += 1
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except BaseException:
+            # Client went away while waiting
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self.release()
+            elif not waiter.done():
+                self._withdraw(user_id, entry)
+            raise
+
+        if not waiter.done():
+            self._withdraw(user_id, entry)
+            raise self._shed("deadline")
+        if waiter.exception() is not None:
+            raise waiter.exception()
+        waited = self.clock() - start
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _withdraw(self, user_id: str, entry: Tuple[asyncio.Future, float]):
+        """Take a waiter that gave up out of its queue, so it stops counting against the user"""
+        entry[0].cancel()
+        self.queued -= 1
+        user_queue = self._queues.get(user_id)
+        if user_queue is not None:
+            user_queue.remove(entry)
+            if not user_queue:
+                del self._queues[user_id]
+
+    def release(self, latency: Optional[float] = None):
+        self.in_flight -= 1
+        if latency is not None:
+            self.counters["completed"] += 1
+            self._observe(latency)
+        self._dispatch()
+
+    def _observe(self, latency: float):
+        self.latency_ewma = (
+            latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        )
+        now = self.clock()
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _dispatch(self):
+        """Hand free slots to waiters, one user at a time in rotation"""
+        now = self.clock()
+        while self.in_flight < int(self.limit) and self._queues:
+            user_id, user_queue = next(iter(self._queues.items()))
+            waiter, deadline = user_queue.popleft()
+            if user_queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self.queued -= 1
+            if deadline <= now:
+                waiter.set_exception(self._shed("deadline"))
+                continue
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, timeout: Optional[float] = None):
+        await self.acquire(user_id, timeout)
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.release(self.clock() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.counters["admitted"]
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queued_users": len(self._queues),
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "wait_avg": round(self._wait_total / admitted, 3) if admitted else 0.0,
+            "wait_max": round(self._wait_max, 3),
+            **self.counters,
+        }
@@ -1,16 +1,110 @@
-from fastapi import FastAPI, HTTPException, Query, Depends, Header
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
+import asyncio
 import base64
+import contextvars
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from .admission import AdmissionController, Overloaded
+from .deletion import DeletionQueue
 from .sessions import SessionManager
-from agent.schemas import ConversationMessage
+from .startup import Warmup, load_agent_modules
+from agent.log import request_context
+from agent.metrics import (
+    AGENT_LATENCY,
+    EXTERNAL_LATENCY,
+    HTTP_IN_FLIGHT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    REGISTRY,
+    SQLITE_LATENCY,
+    rss_bytes,
+    summarize,
+)
+from agent.schemas import ConversationMessage, SessionSummary
 from config import Config
 
-app = FastAPI(title="Jamie Food Agent", version="0.1.0")
+# Cheap to construct: the storage client and the agent's SDKs load on
+# first use, or earlier through the warmup below
 session_manager = SessionManager()
+warmup = Warmup(
+    {
+        "agent": load_agent_modules,
+        "storage": lambda: session_manager.storage.client,
+    }
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+
+
+app = FastAPI(title="Jamie Food Agent", version="0.1.0", lifespan=lifespan)
 security = HTTPBearer()
+admission = AdmissionController()
+deletions = DeletionQueue()
+# Agent turns block on Gemini and Places, so they run off the event loop;
+# one thread per slot the admission limit can grow to
+chat_executor = ThreadPoolExecutor(
+    max_workers=Config.ADMISSION_MAX_LIMIT, thread_name_prefix="chat"
+)
+
+
+def _admission_metrics():
+    stats = admission.stats()
+    gauges = ["limit", "in_flight", "queued", "queued_users"]
+    counters = ["admitted", "enqueued", "shed_queue_full", "shed_deadline", "completed"]
+    return [
+        *(
+            (f"chat_admission_{name}", "gauge", f"Admission control {name}", [({}, stats[name])])
+            for name in gauges
+        ),
+        (
+            "chat_admission_events_total",
+            "counter",
+            "Admission control decisions",
+            [({"event": name}, stats[name]) for name in counters],
+        ),
+    ]
+
+
+REGISTRY.register_collector("admission", _admission_metrics)
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Correlate log lines for one request; honours an incoming X-Request-ID"""
+    with request_context(request.headers.get("X-Request-ID")) as request_id:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Route template, not the raw path, so session IDs don't become labels
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start, endpoint=endpoint, method=request.method
+        )
 
 
 def get_current_user(
@@ -29,6 +123,9 @@ def get_current_user(
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    # Reuse the key when retrying a request: an order it placed is returned
+    # instead of placed again. The Idempotency-Key header works too.
+    idempotency_key: Optional[str] = Field(None, max_length=200)
 
 
 class ChatResponse(BaseModel):
@@ -40,59 +137,139 @@ class ChatResponse(BaseModel):
 class SessionListResponse(BaseModel):
     user_id: str
     sessions: List[str]
+    summaries: List[SessionSummary] = []  # Same order as sessions
 
 
 class SessionHistoryResponse(BaseModel):
     user_id: str
     session_id: str
     messages: List[ConversationMessage]
+    # Pass as `cursor` to get the next older page; None at the start
+    next_cursor: Optional[str] = None
 
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving, warmed up or not"""
     return {"status": "healthy", "active_sessions": session_manager.get_session_count()}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the agent's modules and the storage client are loaded"""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
+async def chat(
+    request: ChatRequest,
+    user_id: str = Depends(get_current_user),
+    x_request_timeout: Optional[float] = Header(None),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
     try:
-        response, session_id = session_manager.process_message(
-            user_id, request.message, request.session_id
-        )
+        async with admission.slot(user_id, timeout=x_request_timeout):
+            loop = asyncio.get_running_loop()
+            # Run in a copy of this context so the request ID carries over
+            context = contextvars.copy_context()
+            response, session_id = await loop.run_in_executor(
+                chat_executor,
+                context.run,
+                session_manager.process_message,
+                user_id,
+                request.message,
+                request.session_id,
+                request.idempotency_key or idempotency_key,
+            )
         return ChatResponse(response=response, user_id=user_id, session_id=session_id)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy, please retry ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.get("/chat/sessions", response_model=SessionListResponse)
-async def list_user_sessions(user_id: str = Depends(get_current_user)):
-    sessions = session_manager.get_user_sessions(user_id)
-    return SessionListResponse(user_id=user_id, sessions=sessions)
+async def list_user_sessions(
+    sort: Literal["last_activity", "created_at"] = "last_activity",
+    user_id: str = Depends(get_current_user),
+):
+    """Newest first by last activity (default) or creation time"""
+    summaries = session_manager.get_user_session_summaries(user_id, sort)
+    return SessionListResponse(
+        user_id=user_id, sessions=[s.session_id for s in summaries], summaries=summaries
+    )
 
 
 @app.get("/chat/sessions/{session_id}/history", response_model=SessionHistoryResponse)
 async def get_session_history(
-    session_id: str, user_id: str = Depends(get_current_user)
+    session_id: str,
+    limit: int = Query(Config.HISTORY_PAGE_SIZE, ge=1, le=Config.HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    user_id: str = Depends(get_current_user),
 ):
-    messages = session_manager.get_session_history(user_id, session_id)
+    """Newest page first; messages within a page are oldest first"""
+    before = None
+    if cursor is not None:
+        # Opaque to clients; currently the number of the message the page ends before
+        if not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before = int(cursor)
+    messages, next_before = session_manager.get_session_history_page(
+        user_id, session_id, limit, before
+    )
     return SessionHistoryResponse(
-        user_id=user_id, session_id=session_id, messages=messages
+        user_id=user_id,
+        session_id=session_id,
+        messages=messages,
+        next_cursor=str(next_before) if next_before is not None else None,
     )
 
 
-@app.delete("/chat/sessions/{session_id}")
+def _deletion_response(job, message: str) -> dict:
+    return {
+        "message": message,
+        "job_id": job.job_id,
+        "status_url": f"/chat/deletions/{job.job_id}",
+        **job.to_dict(),
+    }
+
+
+@app.delete("/chat/sessions/{session_id}", status_code=202)
 async def clear_session(session_id: str, user_id: str = Depends(get_current_user)):
-    session_manager.clear_session(user_id, session_id)
-    return {"message": f"Session {session_id} cleared for user {user_id}"}
+    """Deletion runs in the background; poll status_url for completion"""
+    job = deletions.submit(
+        user_id,
+        session_id,
+        lambda progress: 1 if session_manager.clear_session(user_id, session_id) else None,
+    )
+    return _deletion_response(job, f"Clearing session {session_id} for user {user_id}")
 
 
-@app.delete("/chat/sessions")
+@app.delete("/chat/sessions", status_code=202)
 async def clear_all_user_sessions(user_id: str = Depends(get_current_user)):
-    session_manager.clear_all_user_sessions(user_id)
-    return {"message": f"All sessions cleared for user {user_id}"}
+    """Deletion runs in the background; poll status_url for completion"""
+    job = deletions.submit(
+        user_id,
+        None,
+        lambda progress: session_manager.clear_all_user_sessions(user_id, progress),
+    )
+    return _deletion_response(job, f"Clearing all sessions for user {user_id}")
+
+
+@app.get("/chat/deletions/{job_id}")
+async def get_deletion_status(job_id: str, user_id: str = Depends(get_current_user)):
+    job = deletions.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job.to_dict()
 
 
 @app.get("/stats")
@@ -100,9 +277,22 @@ async def get_stats():
     return {
         "active_sessions": session_manager.get_session_count(),
         "status": "operational",
+        "in_flight_requests": int(HTTP_IN_FLIGHT.value()),
+        "rss_bytes": rss_bytes(),
+        "endpoints": summarize(HTTP_LATENCY, "endpoint"),
+        "intents": summarize(AGENT_LATENCY, "intent"),
+        "external_calls": summarize(EXTERNAL_LATENCY, "service"),
+        "sqlite": summarize(SQLITE_LATENCY, "db"),
+        "admission": admission.stats(),
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
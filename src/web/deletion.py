@@ -0,0 +1,116 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from config import Config
+from agent.log import get_logger
+
+log = get_logger(__name__)
+
+# Runs a deletion; gets a progress(done, total) callback and returns a
+# count of deleted sessions, or None if the deletion failed
+DeleteFn = Callable[[Callable[[int, int], None]], Optional[int]]
+
+
+class DeletionJob:
+    def __init__(self, user_id: str, session_id: Optional[str]):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.session_id = session_id  # None: all of the user's sessions
+        self.state = "pending"  # pending -> running -> done | failed
+        self.done = 0
+        self.total: Optional[int] = None
+        self.deleted_sessions: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "state": self.state,
+            "done": self.done,
+            "total": self.total,
+            "deleted_sessions": self.deleted_sessions,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DeletionQueue:
+    """
+    Runs session deletions on background threads so DELETE requests return
+    straight away with a job to poll. Submitting a deletion that is already
+    pending or running for the same user and session returns that job
+    instead of starting another. Finished jobs are kept for lookup, up to
+    MAX_JOBS, oldest dropped first.
+    """
+
+    MAX_JOBS = 1000
+
+    def __init__(self, workers: Optional[int] = None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.DELETE_JOB_WORKERS, thread_name_prefix="deletion"
+        )
+        self._jobs: "OrderedDict[str, DeletionJob]" = OrderedDict()
+        self._active: Dict[tuple, DeletionJob] = {}  # (user_id, session_id) -> job
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: str, session_id: Optional[str], delete: DeleteFn) -> DeletionJob:
+        """Queue `delete` for one session, or all the user's sessions if session_id is None"""
+        with self._lock:
+            job = self._active.get((user_id, session_id))
+            if job is not None:
+                return job
+            job = DeletionJob(user_id, session_id)
+            self._active[(user_id, session_id)] = job
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if not oldest.finished:
+                    break
+                del self._jobs[oldest_id]
+        # Carry the request ID over to the worker's log lines
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, delete)
+        return job
+
+    def _run(self, job: DeletionJob, delete: DeleteFn):
+        job.state = "running"
+
+        def progress(done: int, total: int):
+            job.done, job.total = done, total
+
+        try:
+            job.deleted_sessions = delete(progress)
+            if job.deleted_sessions is None:
+                job.state, job.error = "failed", "Deletion incomplete; safe to retry"
+            else:
+                job.state = "done"
+        except Exception as e:
+            job.state, job.error = "failed", str(e)
+        if job.state == "failed":
+            log.error("session_deletion_failed", job_id=job.job_id, session_id=job.session_id)
+        job.finished_at = time.time()
+        with self._lock:
+            self._active.pop((job.user_id, job.session_id), None)
+        job._finished.set()
+
+    def get(self, job_id: str, user_id: str) -> Optional[DeletionJob]:
+        """The job, if it exists and belongs to `user_id`"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.user_id == user_id else None
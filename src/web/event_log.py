@@ -0,0 +1,206 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, IO, List, Optional, Tuple
+from agent.log import get_logger
+from config import Config
+
+log = get_logger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+
+class EventLogger:
+    """
+    Per-user event log written by a background thread. log() only puts the
+    event on a queue; the writer drains it in batches, groups lines by file
+    and writes each group with one call. At most max_open_files handles are
+    kept open (least recently used are closed first). A file larger than
+    max_bytes is rotated and gzipped, keeping backup_count old copies.
+
+    Users are hashed onto shards files so the file count stays bounded;
+    shards=0 gives every user session its own file instead.
+    fmt="json" writes one JSON object per line instead of plain text.
+    """
+
+    def __init__(
+        self,
+        logs_dir: str,
+        fmt: str = "text",
+        shards: int = 16,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        max_open_files: int = 64,
+        max_event_chars: int = 2000,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        queue_size: int = 100_000,
+    ):
+        self.logs_dir = logs_dir
+        self.fmt = fmt
+        self.shards = shards
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_open_files = max_open_files
+        self.max_event_chars = max_event_chars
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.stats = {"logged": 0, "written": 0, "dropped": 0, "batches": 0, "rotations": 0}
+        os.makedirs(logs_dir, exist_ok=True)
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._handles: "OrderedDict[str, IO[str]]" = OrderedDict()
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, user_id: str, session_id: str, event: str, **fields):
+        """Queue an event; never blocks. Events are dropped if the queue is full."""
+        if self._queue.qsize() >= self.queue_size:
+            self.stats["dropped"] += 1
+            return
+        self._queue.put((time.time(), user_id, session_id, event, fields))
+        self.stats["logged"] += 1
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Block until everything queued so far is written"""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+
+    def path_for(self, user_id: str, session_id: str) -> str:
+        if self.shards:
+            shard = zlib.crc32(user_id.encode()) % self.shards
+            return os.path.join(self.logs_dir, f"events-{shard:03d}.log")
+        return os.path.join(self.logs_dir, f"{user_id}_{session_id}.log")
+
+    def _format(self, ts: float, user_id: str, session_id: str, event: str, fields: Dict) -> str:
+        if len(event) > self.max_event_chars:
+            event = event[: self.max_event_chars] + f"... [{len(event) - self.max_event_chars} more chars]"
+        if self.fmt == "json":
+            record = {
+                "ts": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "user_id": user_id,
+                "session_id": session_id,
+                "event": event,
+                **fields,
+            }
+            return json.dumps(record, default=str) + "\n"
+        if self.shards:
+            return f"{user_id}:{session_id} {event}\n"
+        return f"{event}\n"
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, waiters, stop = [], [], False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, tuple) and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                log.error("event_log_write_failed", error=str(e))
+            for done in waiters:
+                done.set()
+            if stop:
+                self._close_handles()
+                return
+
+    def _write_batch(self, batch: List[Tuple]):
+        if not batch:
+            return
+        by_path: Dict[str, List[str]] = {}
+        for ts, user_id, session_id, event, fields in batch:
+            by_path.setdefault(self.path_for(user_id, session_id), []).append(
+                self._format(ts, user_id, session_id, event, fields)
+            )
+        for path, lines in by_path.items():
+            handle = self._handle(path)
+            handle.write("".join(lines))
+            handle.flush()
+            if handle.tell() >= self.max_bytes:
+                self._rotate(path)
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def _handle(self, path: str) -> IO[str]:
+        handle = self._handles.pop(path, None)
+        if handle is None:
+            handle = open(path, "a")
+            while len(self._handles) >= self.max_open_files:
+                _, oldest = self._handles.popitem(last=False)
+                oldest.close()
+        self._handles[path] = handle
+        return handle
+
+    def _rotate(self, path: str):
+        """path -> path.1.gz, shifting older copies up and dropping the last"""
+        self._handles.pop(path).close()
+        for i in range(self.backup_count - 1, 0, -1):
+            older = f"{path}.{i}.gz"
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{i + 1}.gz")
+        if self.backup_count > 0:
+            with open(path, "rb") as src, gzip.open(f"{path}.1.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.remove(path)
+        self.stats["rotations"] += 1
+
+    def _close_handles(self):
+        while self._handles:
+            _, handle = self._handles.popitem()
+            handle.close()
+
+    def open_files(self) -> int:
+        return len(self._handles)
+
+
+_loggers: Dict[str, EventLogger] = {}
+_loggers_lock = threading.Lock()
+
+
+def get_event_logger(logs_dir: str) -> EventLogger:
+    """One writer per log directory per process, configured from Config"""
+    logs_dir = os.path.abspath(logs_dir)
+    with _loggers_lock:
+        if logs_dir not in _loggers:
+            _loggers[logs_dir] = EventLogger(
+                logs_dir,
+                fmt=Config.EVENT_LOG_FORMAT,
+                shards=Config.EVENT_LOG_SHARDS,
+                max_bytes=Config.EVENT_LOG_MAX_BYTES,
+                backup_count=Config.EVENT_LOG_BACKUPS,
+                max_open_files=Config.EVENT_LOG_MAX_OPEN_FILES,
+            )
+        return _loggers[logs_dir]
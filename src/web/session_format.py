@@ -0,0 +1,243 @@
+"""
+Session file formats.
+
+Legacy sessions are JSON lines, one {"timestamp", "role", "content"}
+object per message. Compact sessions are a run of blocks, each holding up
+to SESSION_BLOCK_MESSAGES messages:
+
+    header  b"JS\\x01" | codec u8 | encoding u8 | messages u16 | payload bytes u32
+    payload [[role, time, content], ...], compressed
+
+Roles are numbers (ROLES). The time of a block's first message is
+microseconds since the epoch; each later one is the delta from the message
+before it. A timestamp that wouldn't survive that round trip unchanged is
+kept as its string. Blocks are independent, so a page of history needs only
+the blocks it covers. Appending rewrites only the last block.
+
+A file starting with the block magic is compact; anything else is read as
+JSON lines. Writing to a legacy file converts it first.
+"""
+import gzip
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+from config import Config
+
+MAGIC = b"JS\x01"
+_HEADER = struct.Struct("<3sBBHI")
+
+CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+ENCODINGS = {"json": 1, "msgpack": 2}
+ROLES = ["user", "assistant"]
+_ROLE_IDS = {role: i for i, role in enumerate(ROLES)}
+
+_EPOCH = datetime(1970, 1, 1)
+
+# History index entries: (block offset, block length, position in block).
+# The trailer has the same size: (message count, INDEX_MAGIC, 0).
+INDEX_ENTRY = struct.Struct("<QII")
+INDEX_MAGIC = 0x4A534932  # "JSI2"
+
+
+def is_compact(content: bytes) -> bool:
+    return content[: len(MAGIC)] == MAGIC
+
+
+# Timestamps
+
+
+def _to_micros(timestamp: str) -> Optional[int]:
+    """Microseconds since the epoch, if that converts back to the same string"""
+    if not timestamp.endswith("Z"):
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp[:-1])
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        return None
+    micros = (parsed - _EPOCH) // timedelta(microseconds=1)
+    return micros if _from_micros(micros) == timestamp else None
+
+
+def _from_micros(micros: int) -> str:
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat() + "Z"
+
+
+# Payload encoding and compression; zstd and msgpack are optional
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODECS["gzip"]:
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == CODECS["zstd"]:
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODECS["gzip"]:
+        return gzip.decompress(data)
+    if codec == CODECS["zstd"]:
+        return _zstd().ZstdDecompressor().decompress(data)
+    if codec == CODECS["none"]:
+        return data
+    raise ValueError(f"Unknown session block codec {codec}")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd session blocks require the zstandard package") from e
+    return zstandard
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("msgpack session blocks require the msgpack package") from e
+    return msgpack
+
+
+def _encode(records: list, encoding: int) -> bytes:
+    if encoding == ENCODINGS["msgpack"]:
+        return _msgpack().packb(records)
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data: bytes, encoding: int) -> list:
+    if encoding == ENCODINGS["msgpack"]:
+        return _msgpack().unpackb(data)
+    if encoding == ENCODINGS["json"]:
+        return json.loads(data)
+    raise ValueError(f"Unknown session block encoding {encoding}")
+
+
+# Blocks
+
+
+class BlockWriter:
+    """Codec, encoding and block size for new blocks, from Config by default"""
+
+    def __init__(
+        self,
+        codec: Optional[str] = None,
+        encoding: Optional[str] = None,
+        block_messages: Optional[int] = None,
+    ):
+        self.codec = CODECS[codec or Config.SESSION_CODEC]
+        self.encoding = ENCODINGS[encoding or Config.SESSION_ENCODING]
+        self.block_messages = min(block_messages or Config.SESSION_BLOCK_MESSAGES, 0xFFFF)
+
+    def block(self, messages: List[dict]) -> bytes:
+        records, previous = [], None
+        for message in messages:
+            micros = _to_micros(message["timestamp"])
+            if micros is None:
+                when = message["timestamp"]
+            else:
+                when = micros if previous is None else micros - previous
+                previous = micros
+            records.append([_ROLE_IDS[message["role"]], when, message["content"]])
+        payload = _compress(_encode(records, self.encoding), self.codec)
+        return _HEADER.pack(MAGIC, self.codec, self.encoding, len(messages), len(payload)) + payload
+
+    def blocks(self, messages: List[dict]) -> bytes:
+        size = self.block_messages
+        return b"".join(self.block(messages[i : i + size]) for i in range(0, len(messages), size))
+
+    def append(self, content: bytes, message: dict) -> bytes:
+        """
+        The session file with `message` added: into the last block if it has
+        room (only that block is re-encoded), else as a new block. A legacy
+        JSON lines file is converted.
+        """
+        if content and not is_compact(content):
+            return self.blocks(parse_messages(content) + [message])
+        last: Optional[Tuple[int, int]] = None
+        for offset, length, count in iter_blocks(content):
+            last = (offset, count)
+        if last is None or last[1] >= self.block_messages:
+            return content + self.block([message])
+        offset = last[0]
+        return content[:offset] + self.block(decode_blocks(content[offset:]) + [message])
+
+
+def iter_blocks(content: bytes, start: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """(offset, length, messages) of each block, reading only the headers"""
+    offset = start
+    while offset < len(content):
+        if len(content) - offset < _HEADER.size:
+            raise ValueError("Truncated session block header")
+        magic, _, _, count, payload = _HEADER.unpack_from(content, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Bad session block at {offset}")
+        length = _HEADER.size + payload
+        if offset + length > len(content):
+            raise ValueError("Truncated session block")
+        yield offset, length, count
+        offset += length
+
+
+def decode_blocks(data: bytes) -> List[dict]:
+    """Messages of a run of whole blocks"""
+    messages = []
+    for offset, length, count in iter_blocks(data):
+        _, codec, encoding, _, _ = _HEADER.unpack_from(data, offset)
+        records = _decode(_decompress(data[offset + _HEADER.size : offset + length], codec), encoding)
+        if len(records) != count:
+            raise ValueError("Session block message count mismatch")
+        previous = None
+        for role, when, text in records:
+            if isinstance(when, str):
+                timestamp = when
+            else:
+                previous = when if previous is None else previous + when
+                timestamp = _from_micros(previous)
+            messages.append({"timestamp": timestamp, "role": ROLES[role], "content": text})
+    return messages
+
+
+def parse_messages(data: bytes) -> List[dict]:
+    """Messages from whole blocks or whole JSON lines, whichever `data` holds"""
+    if is_compact(data):
+        return decode_blocks(data)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+# History index
+
+
+def build_history_index(content: bytes) -> bytes:
+    """
+    Where each message lives: one fixed-width entry per message, then the
+    trailer, so any run of entries (and the trailer) can be fetched with a
+    ranged read. A JSON line is a block of one message.
+    """
+    entries = []
+    if is_compact(content):
+        for offset, length, count in iter_blocks(content):
+            entries.extend(INDEX_ENTRY.pack(offset, length, i) for i in range(count))
+    else:
+        offset = 0
+        for line in content.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # Partial last line
+            if line.strip():
+                entries.append(INDEX_ENTRY.pack(offset, len(line), 0))
+            offset += len(line)
+    entries.append(INDEX_ENTRY.pack(len(entries), INDEX_MAGIC, 0))
+    return b"".join(entries)
+
+
+def unpack_index(data: bytes) -> Tuple[List[Tuple[int, int, int]], Optional[int]]:
+    """Entries and, if `data` ends with the trailer, the message count"""
+    if len(data) % INDEX_ENTRY.size:
+        raise ValueError("Truncated history index")
+    entries = list(INDEX_ENTRY.iter_unpack(data))
+    if entries and entries[-1][1] == INDEX_MAGIC:
+        return entries[:-1], entries[-1][0]
+    return entries, None
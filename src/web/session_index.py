@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from config import Config
+from agent.log import get_logger
+from agent.metrics import EXTERNAL_LATENCY
+
+log = get_logger(__name__)
+
+# session_id -> {"title", "created_at", "last_activity", "message_count"}
+Entries = Dict[str, dict]
+
+
+class SessionIndex:
+    """
+    One small object per user, sessions/<user>/_index.json, holding the
+    metadata of all their sessions. It is updated on every save and delete,
+    and cached in-process, so listing sessions needs no bucket listing and
+    no per-session reads.
+
+    Updates are conditional writes on the generation last seen, retried
+    on conflict. This process's own writes refresh the cache. A cached
+    copy is re-read after `ttl` seconds to pick up other workers' writes.
+    Users without an index (sessions saved before it existed) get one
+    built by `rebuild` on first use.
+    """
+
+    MAX_UPDATE_ATTEMPTS = 5
+    TITLE_CHARS = 60
+
+    def __init__(
+        self,
+        client,
+        bucket_name: str,
+        rebuild: Callable[[str], Entries],
+        ttl: Optional[float] = None,
+        max_users: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.rebuild = rebuild
+        self.ttl = Config.SESSION_INDEX_TTL if ttl is None else ttl
+        self.max_users = max_users or Config.SESSION_INDEX_CACHE_SIZE
+        self.clock = clock
+        # user_id -> (loaded at, generation, entries); generation 0: not stored yet
+        self._cache: "OrderedDict[str, Tuple[float, int, Entries]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "rebuilds": 0, "conflicts": 0}
+
+    def _blob(self, user_id: str):
+        return self.client.bucket(self.bucket_name).blob(f"sessions/{user_id}/_index.json")
+
+    def _cached(self, user_id: str) -> Optional[Tuple[int, Entries]]:
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is None or self.clock() - cached[0] > self.ttl:
+                return None
+            self._cache.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return cached[1], cached[2]
+
+    def _remember(self, user_id: str, generation: int, entries: Entries):
+        with self._lock:
+            self._cache[user_id] = (self.clock(), generation, entries)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+
+    def _load(self, user_id: str, use_cache: bool = True) -> Tuple[int, Entries]:
+        if use_cache:
+            cached = self._cached(user_id)
+            if cached is not None:
+                return cached
+        blob = self._blob(user_id)
+        try:
+            with EXTERNAL_LATENCY.time(service="gcs", operation="index_read"):
+                entries = json.loads(blob.download_as_bytes())
+                generation = blob.generation
+            self.stats["loads"] += 1
+        except NotFound:
+            self.stats["rebuilds"] += 1
+            entries, generation = self.rebuild(user_id), 0
+        self._remember(user_id, generation, entries)
+        return generation, entries
+
+    def _update(self, user_id: str, change: Callable[[Entries], None]) -> bool:
+        """Apply `change` to a copy of the index and write it back"""
+        blob = self._blob(user_id)
+        for attempt in range(self.MAX_UPDATE_ATTEMPTS):
+            generation, entries = self._load(user_id, use_cache=attempt == 0)
+            entries = {session_id: dict(entry) for session_id, entry in entries.items()}
+            change(entries)
+            try:
+                with EXTERNAL_LATENCY.time(service="gcs", operation="index_write"):
+                    blob.upload_from_string(
+                        json.dumps(entries),
+                        content_type="application/json",
+                        if_generation_match=generation,
+                    )
+                self._remember(user_id, blob.generation, entries)
+                return True
+            except PreconditionFailed:
+                # Another worker wrote it since we read it
+                self.stats["conflicts"] += 1
+        log.error("session_index_gave_up", user_id=user_id)
+        self.invalidate(user_id)
+        return False
+
+    def record_message(
+        self, user_id: str, session_id: str, role: str, content: str, timestamp: str, count: int
+    ) -> bool:
+        """
+        Note a message just saved; `count` is the session's message count
+        after it, so replaying an update can't double count
+        """
+        return self.record_messages(user_id, session_id, [(role, content, timestamp)], count)
+
+    def record_messages(
+        self, user_id: str, session_id: str, messages: List[Tuple[str, str, str]], count: int
+    ) -> bool:
+        """Note several (role, content, timestamp) messages, oldest first, in one write"""
+
+        def change(entries: Entries):
+            for role, content, timestamp in messages:
+                entry = entries.setdefault(session_id, {"created_at": timestamp, "title": None})
+                if not entry.get("title") and role == "user":
+                    entry["title"] = content[: self.TITLE_CHARS]
+                entry["last_activity"] = timestamp
+            entries[session_id]["message_count"] = count
+
+        return self._update(user_id, change)
+
+    def remove(self, user_id: str, session_id: str) -> bool:
+        return self._update(user_id, lambda entries: entries.pop(session_id, None))
+
+    def drop(self, user_id: str):
+        """Forget the whole index, e.g. once all the user's sessions are deleted"""
+        self.invalidate(user_id)
+        try:
+            self._blob(user_id).delete()
+        except NotFound:
+            pass
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def list(self, user_id: str, sort: str = "last_activity") -> List[dict]:
+        """Entries with their session_id, newest first by `sort`"""
+        generation, entries = self._load(user_id)
+        if generation == 0 and entries:
+            # Freshly rebuilt: store it so the next worker doesn't rebuild too
+            self._update(user_id, lambda entries: None)
+        sessions = [{"session_id": session_id, **entry} for session_id, entry in entries.items()]
+        sessions.sort(key=lambda s: s.get(sort) or "", reverse=True)
+        return sessions
@@ -1,49 +1,148 @@
-from typing import Dict, List
-from agent.graph import JamieAgent
-from agent.schemas import ConversationMessage, MessageRole
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+from agent.cache import SingleFlight
+from agent.schemas import ConversationMessage, MessageRole, SessionSummary
+from .event_log import get_event_logger
 from .storage import GCPSessionStorage
 import logging
 import os
+import threading
 import uuid
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 
+if TYPE_CHECKING:
+    from agent.graph import JamieAgent
+
+
+def _default_agent() -> "JamieAgent":
+    # The agent module (tools, Gemini, LangGraph) loads with the first session
+    from agent.graph import JamieAgent
+
+    return JamieAgent()
+
+
+class KeyedLock:
+    """
+    One mutex per key, created on first use and dropped once nobody holds
+    or waits for it, so memory stays proportional to active keys.
+    """
 
-class SessionManager:
     def __init__(self):
-        self.sessions: Dict[str, JamieAgent] = {}  # Key: f"{user_id}:{session_id}"
+        self._locks: Dict[str, list] = {}  # key -> [lock, holders and waiters]
+        self._mutex = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._mutex:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._mutex:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def active(self) -> int:
+        with self._mutex:
+            return len(self._locks)
+
+
+class SessionManager:
+    """
+    Messages for one session are handled one at a time, in arrival order:
+    history read, user message append, agent call and response append all
+    happen under the session's lock, so concurrent requests can't lose
+    messages or share the agent's per-session state. Different sessions
+    run fully in parallel. A message sent again with the same idempotency
+    key while the first is still in flight (a client retry) shares that
+    call's response; without a key, identical messages are separate turns.
+    """
+
+    def __init__(
+        self,
+        storage=None,
+        agent_factory: Optional[Callable[[], "JamieAgent"]] = None,
+        coalesce_duplicates: bool = True,
+        logs_dir: Optional[str] = None,
+    ):
+        self.sessions: Dict[str, "JamieAgent"] = {}  # Key: f"{user_id}:{session_id}"
         self.user_sessions: Dict[str, List[str]] = (
             {}
         )  # Key: user_id, Value: List[session_id]
-        self.storage = GCPSessionStorage()
-        self._setup_logging()
+        self.storage = storage if storage is not None else GCPSessionStorage()
+        self.agent_factory = agent_factory or _default_agent
+        self.coalesce_duplicates = coalesce_duplicates
+        self.session_locks = KeyedLock()
+        self.in_flight = SingleFlight()
+        self._sessions_lock = threading.Lock()
+        self._setup_logging(logs_dir)
 
-    def _setup_logging(self):
-        logs_dir = os.path.join(os.path.dirname(__file__), "..", "..", "logs")
+    def _setup_logging(self, logs_dir: Optional[str] = None):
+        logs_dir = logs_dir or os.path.join(os.path.dirname(__file__), "..", "..", "logs")
         os.makedirs(logs_dir, exist_ok=True)
         self.logs_dir = logs_dir
+        self.event_log = get_event_logger(logs_dir)
 
     def get_or_create_session(
         self, user_id: str, session_id: str = None
-    ) -> tuple[JamieAgent, str]:
+    ) -> tuple["JamieAgent", str]:
         if session_id is None:
             session_id = str(uuid.uuid4())
 
         session_key = f"{user_id}:{session_id}"
 
-        if session_key not in self.sessions:
-            self.sessions[session_key] = JamieAgent()
-            if user_id not in self.user_sessions:
-                self.user_sessions[user_id] = []
-            if session_id not in self.user_sessions[user_id]:
-                self.user_sessions[user_id].append(session_id)
+        with self._sessions_lock:
+            agent = self.sessions.get(session_key)
+            if agent is None:
+                agent = self.sessions[session_key] = self.agent_factory()
+                if user_id not in self.user_sessions:
+                    self.user_sessions[user_id] = []
+                if session_id not in self.user_sessions[user_id]:
+                    self.user_sessions[user_id].append(session_id)
+                created = True
+            else:
+                created = False
+        if created:
             self._log_user_event(
                 user_id, session_id, f"New session created: {session_id}"
             )
 
-        return self.sessions[session_key], session_id
+        return agent, session_id
 
     def process_message(
-        self, user_id: str, message: str, session_id: str = None
+        self,
+        user_id: str,
+        message: str,
+        session_id: str = None,
+        idempotency_key: Optional[str] = None,
+    ) -> tuple[str, str]:
+        if session_id is None:
+            session_id = str(uuid.uuid4())
+        session_key = f"{user_id}:{session_id}"
+
+        # "yes" twice is two turns unless the client says it's a retry
+        if not self.coalesce_duplicates or idempotency_key is None:
+            return self._process_serialized(user_id, message, session_id, idempotency_key)
+        result, shared = self.in_flight.do(
+            (session_key, message, idempotency_key),
+            lambda: self._process_serialized(user_id, message, session_id, idempotency_key),
+        )
+        if shared:
+            self._log_user_event(user_id, session_id, "Duplicate message coalesced")
+        return result
+
+    def _process_serialized(
+        self, user_id: str, message: str, session_id: str, idempotency_key: Optional[str] = None
+    ) -> tuple[str, str]:
+        with self.session_locks.hold(f"{user_id}:{session_id}"):
+            return self._process_message(user_id, message, session_id, idempotency_key)
+
+    def _process_message(
+        self, user_id: str, message: str, session_id: str, idempotency_key: Optional[str] = None
     ) -> tuple[str, str]:
         agent, session_id = self.get_or_create_session(user_id, session_id)
         self._log_user_event(user_id, session_id, f"Processing message: {message}")
@@ -56,7 +155,8 @@ class SessionManager:
             f"Retrieved {len(conversation_history)} messages from history",
         )
 
-        # Save user message to GCS
+        # Save user message to GCS; the indexes are updated once per turn,
+        # with the assistant response
         user_message = ConversationMessage(
             session_id=session_id,
             user_id=user_id,
@@ -64,12 +164,12 @@ class SessionManager:
             content=message,
             timestamp=datetime.utcnow().isoformat() + "Z",
         )
-        self.storage.save_message(user_message)
+        self.storage.save_message(user_message, update_indexes=False)
 
         try:
             # Pass conversation history to agent
             response = agent.process_message(
-                user_id, message, session_id, conversation_history
+                user_id, message, session_id, conversation_history, idempotency_key=idempotency_key
             )
 
             # Save assistant response to GCS
@@ -80,11 +180,14 @@ class SessionManager:
                 content=response,
                 timestamp=datetime.utcnow().isoformat() + "Z",
             )
-            self.storage.save_message(assistant_message)
+            self.storage.save_message(assistant_message, earlier=[user_message])
 
-            self._log_user_event(user_id, session_id, f"Response: {response}")
+            self._log_user_event(
+                user_id, session_id, f"Response: {response}", response_chars=len(response)
+            )
             return response, session_id
         except Exception as e:
+            self.storage.index_messages([user_message])
             error_msg = f"Error processing message: {str(e)}"
             self._log_user_event(user_id, session_id, error_msg)
             return (
@@ -92,22 +195,26 @@ class SessionManager:
                 session_id,
             )
 
-    def _log_user_event(self, user_id: str, session_id: str, event: str):
-        log_file = os.path.join(self.logs_dir, f"{user_id}_{session_id}.log")
-        with open(log_file, "a") as f:
-            f.write(f"{event}\n")
+    def _log_user_event(self, user_id: str, session_id: str, event: str, **fields):
+        # Queued for the background writer; nothing touches disk on the request path
+        self.event_log.log(user_id, session_id, event, **fields)
 
     def get_session_count(self) -> int:
         return len(self.sessions)
 
     def get_user_sessions(self, user_id: str) -> List[str]:
-        # First try to get from GCS storage
-        gcs_sessions = self.storage.list_user_sessions(user_id)
-        if gcs_sessions:
-            return gcs_sessions
+        return [summary.session_id for summary in self.get_user_session_summaries(user_id)]
+
+    def get_user_session_summaries(
+        self, user_id: str, sort: str = "last_activity"
+    ) -> List[SessionSummary]:
+        # First try the session index in GCS storage
+        summaries = self.storage.list_session_summaries(user_id, sort)
+        if summaries:
+            return summaries
 
         # Fallback to in-memory sessions
-        return self.user_sessions.get(user_id, [])
+        return [SessionSummary(session_id=s) for s in self.user_sessions.get(user_id, [])]
 
     def get_session_history(
         self, user_id: str, session_id: str
@@ -115,30 +222,51 @@ class SessionManager:
         """Get conversation history for a specific session"""
         return self.storage.get_session_messages(user_id, session_id)
 
-    def clear_session(self, user_id: str, session_id: str):
+    def get_session_history_page(
+        self, user_id: str, session_id: str, limit: int, before: Optional[int] = None
+    ) -> tuple[List[ConversationMessage], Optional[int]]:
+        """
+        One page of history, walking back from the newest message: the
+        messages (oldest first) and the `before` for the next older page
+        """
+        return self.storage.get_session_page(user_id, session_id, limit, before)
+
+    def clear_session(self, user_id: str, session_id: str) -> bool:
         session_key = f"{user_id}:{session_id}"
 
-        # Remove from in-memory storage
-        if session_key in self.sessions:
-            del self.sessions[session_key]
-            if user_id in self.user_sessions:
-                self.user_sessions[user_id].remove(session_id)
-                if not self.user_sessions[user_id]:
-                    del self.user_sessions[user_id]
+        # Waits for a message in flight on this session to finish
+        with self.session_locks.hold(session_key):
+            # Remove from in-memory storage
+            with self._sessions_lock:
+                if session_key in self.sessions:
+                    del self.sessions[session_key]
+                    if user_id in self.user_sessions:
+                        self.user_sessions[user_id].remove(session_id)
+                        if not self.user_sessions[user_id]:
+                            del self.user_sessions[user_id]
 
-        # Remove from GCS storage
-        self.storage.delete_session(user_id, session_id)
+            # Remove from GCS storage
+            deleted = self.storage.delete_session(user_id, session_id)
         self._log_user_event(user_id, session_id, f"Session cleared: {session_id}")
+        return deleted
 
-    def clear_all_user_sessions(self, user_id: str):
-        # Clear from in-memory storage
-        if user_id in self.user_sessions:
-            session_ids = self.user_sessions[user_id].copy()
+    def clear_all_user_sessions(
+        self, user_id: str, progress: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[int]:
+        """Returns how many stored sessions were deleted, None on failure"""
+        with self._sessions_lock:
+            session_ids = list(self.user_sessions.get(user_id, []))
+
+        with ExitStack() as stack:
+            # Waits for messages in flight on the user's known sessions, and
+            # keeps new ones out of them until storage is cleared too
             for session_id in session_ids:
-                session_key = f"{user_id}:{session_id}"
-                if session_key in self.sessions:
-                    del self.sessions[session_key]
-            del self.user_sessions[user_id]
+                stack.enter_context(self.session_locks.hold(f"{user_id}:{session_id}"))
+
+            # Clear from in-memory storage
+            with self._sessions_lock:
+                for session_id in self.user_sessions.pop(user_id, []):
+                    self.sessions.pop(f"{user_id}:{session_id}", None)
 
-        # Clear from GCS storage
-        self.storage.delete_all_user_sessions(user_id)
+            # Clear from GCS storage
+            return self.storage.delete_all_user_sessions(user_id, progress)
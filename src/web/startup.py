@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from agent.log import get_logger
+
+log = get_logger(__name__)
+
+
+class Warmup:
+    """
+    Runs slow one-off setup (SDK imports, client construction) on a
+    background thread once the server is up. The process can then answer
+    /health right away, while /ready reports whether the first chat would
+    still have to wait for any of it. A failed step keeps the process
+    unready rather than failing the first request.
+    """
+
+    def __init__(self, steps: Dict[str, Callable[[], Any]]):
+        self.steps = steps
+        self._status: Dict[str, Dict[str, Any]] = {name: {"state": "pending"} for name in steps}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        for name, step in self.steps.items():
+            self._status[name] = {"state": "running"}
+            start = time.perf_counter()
+            try:
+                step()
+                self._status[name] = {"state": "done"}
+            except Exception as e:
+                log.error("warmup_step_failed", step=name, error=str(e))
+                self._status[name] = {"state": "failed", "error": str(e)}
+            self._status[name]["seconds"] = round(time.perf_counter() - start, 3)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Whether every step finished (successfully or not) within `timeout`"""
+        if self._thread is None:
+            return False
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def ready(self) -> bool:
+        return all(status["state"] == "done" for status in self._status.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "steps": {name: dict(s) for name, s in self._status.items()}}
+
+
+def load_agent_modules():
+    """Everything the first agent turn imports: tools, Gemini SDK, LangGraph"""
+    import agent.graph  # noqa: F401
+    import google.generativeai  # noqa: F401
+    import langgraph.graph  # noqa: F401
@@ -1,135 +1,435 @@
 import json
 import os
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
-from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed, RequestRangeNotSatisfiable
 from config import Config
-from agent.schemas import ConversationMessage, MessageRole
+from agent.log import get_logger
+from agent.metrics import EXTERNAL_LATENCY
+from agent.schemas import ConversationMessage, MessageRole, SessionSummary
+from .session_format import (
+    INDEX_ENTRY,
+    BlockWriter,
+    build_history_index,
+    is_compact,
+    iter_blocks,
+    parse_messages,
+    unpack_index,
+)
+from .session_index import SessionIndex
+
+log = get_logger(__name__)
+
+@lru_cache(maxsize=None)
+def _delete_batch_class():
+    from google.cloud.storage.batch import Batch
+
+    class DeleteBatch(Batch):
+        """
+        A Batch that keeps what finish() returns, one response per deferred
+        request: leaving the `with` block (the only public way to defer
+        requests) calls finish() and drops its return value
+        """
+
+        responses: list = []
+
+        def finish(self, raise_exception=True):
+            self.responses = super().finish(raise_exception=raise_exception)
+            return self.responses
+
+    return DeleteBatch
+
+
+def _message_count(content: bytes) -> int:
+    if is_compact(content):
+        return sum(count for _, _, count in iter_blocks(content))
+    return sum(1 for line in content.splitlines() if line.strip())
 
 
 class GCPSessionStorage:
+    MAX_APPEND_ATTEMPTS = 5
+    DELETE_BATCH_SIZE = 100  # Most calls GCS accepts in one batch request
+
     def __init__(self):
-        self.client = storage.Client()
         self.bucket_name = Config.BASE_BUCKET
 
+    @cached_property
+    def client(self):
+        """
+        Created on first use: importing the SDK and resolving credentials
+        would otherwise slow down every process start, health checks included
+        """
+        from google.cloud import storage
+
+        return storage.Client()
+
+    @cached_property
+    def session_index(self) -> SessionIndex:
+        return SessionIndex(self.client, self.bucket_name, self._scan_user_sessions)
+
     def _get_session_file_path(self, user_id: str, session_id: str) -> str:
-        """Get the GCS path for a session file"""
+        """
+        Get the GCS path for a session file. The name predates the compact
+        format; the content says which format a file is in.
+        """
         return f"sessions/{user_id}/{session_id}.jsonl"
 
-    def save_message(self, message: ConversationMessage) -> bool:
-        """Save a single message to the session file"""
+    def _get_index_file_path(self, user_id: str, session_id: str) -> str:
+        """GCS path for a session's history index (see build_history_index)"""
+        return f"sessions/{user_id}/{session_id}.idx"
+
+    @staticmethod
+    def _to_message(user_id: str, session_id: str, message_data: dict) -> ConversationMessage:
+        # Convert simplified format back to ConversationMessage
+        return ConversationMessage(
+            session_id=session_id,
+            user_id=user_id,
+            role=MessageRole(message_data["role"]),
+            content=message_data["content"],
+            timestamp=message_data["timestamp"],
+        )
+
+    def _to_messages(self, user_id: str, session_id: str, data: List[dict]) -> List[ConversationMessage]:
+        return [self._to_message(user_id, session_id, m) for m in data]
+
+    def save_message(
+        self,
+        message: ConversationMessage,
+        update_indexes: bool = True,
+        earlier: Sequence[ConversationMessage] = (),
+    ) -> bool:
+        """
+        Save a single message to the session file. With update_indexes=False
+        only the file is written; the history index and the session index
+        catch up on the next indexed save, which passes the messages saved
+        without them as `earlier` (see SessionManager: one index update
+        per turn instead of one per message).
+        """
         try:
-            bucket = self.client.bucket(self.bucket_name)
-            file_path = self._get_session_file_path(message.user_id, message.session_id)
-            blob = bucket.blob(file_path)
-
-            # Create simplified message format
-            message_data = {
-                "timestamp": message.timestamp,
-                "role": message.role.value,
-                "content": message.content,
-            }
-            message_line = f"{json.dumps(message_data)}\n"
-
-            # Check if file exists
-            if blob.exists():
-                # Append to existing file
-                existing_content = blob.download_as_text()
-                blob.upload_from_string(existing_content + message_line)
-            else:
-                # Create new file
-                blob.upload_from_string(message_line)
+            with EXTERNAL_LATENCY.time(service="gcs", operation="save"):
+                bucket = self.client.bucket(self.bucket_name)
+                file_path = self._get_session_file_path(message.user_id, message.session_id)
+                blob = bucket.blob(file_path)
 
-            return True
+                # Create simplified message format
+                message_data = {
+                    "timestamp": message.timestamp,
+                    "role": message.role.value,
+                    "content": message.content,
+                }
+                compact = Config.SESSION_FORMAT == "compact"
+                writer = BlockWriter()
+
+                # Append as a conditional write on the generation we read, so a
+                # concurrent writer (another worker process) makes us re-read
+                # instead of silently overwriting its message
+                for _ in range(self.MAX_APPEND_ATTEMPTS):
+                    try:
+                        existing_content = blob.download_as_bytes()
+                        generation = blob.generation
+                    except NotFound:
+                        existing_content, generation = b"", 0
+                    if compact or is_compact(existing_content):
+                        # Converts a legacy JSON lines file on its first write
+                        content = writer.append(existing_content, message_data)
+                        content_type = "application/octet-stream"
+                    else:
+                        content = existing_content + f"{json.dumps(message_data)}\n".encode("utf-8")
+                        content_type = "text/plain"
+                    try:
+                        blob.upload_from_string(
+                            content, content_type=content_type, if_generation_match=generation
+                        )
+                        break
+                    except PreconditionFailed:
+                        log.info("gcs_append_conflict", session_id=message.session_id)
+                else:
+                    log.error("gcs_append_gave_up", session_id=message.session_id)
+                    return False
+
+                if update_indexes:
+                    self._update_indexes(bucket, [*earlier, message], content)
+                return True
         except Exception as e:
-            print(f"Error saving message to GCS: {e}")
+            log.error("gcs_save_failed", error=str(e))
             return False
 
+    def index_messages(self, messages: Sequence[ConversationMessage]):
+        """
+        Bring the indexes up to date with messages saved with
+        update_indexes=False when no indexed save follows them (e.g. the
+        turn failed). Reads the session file once.
+        """
+        if not messages:
+            return
+        try:
+            with EXTERNAL_LATENCY.time(service="gcs", operation="index_update"):
+                bucket = self.client.bucket(self.bucket_name)
+                blob = bucket.blob(
+                    self._get_session_file_path(messages[0].user_id, messages[0].session_id)
+                )
+                self._update_indexes(bucket, messages, blob.download_as_bytes())
+        except Exception as e:
+            log.warning("session_index_update_failed", error=str(e))
+
+    def _update_indexes(self, bucket, messages: Sequence[ConversationMessage], content: bytes):
+        # The messages are saved either way; readers notice an index that
+        # lags the file and read past its end
+        user_id, session_id = messages[-1].user_id, messages[-1].session_id
+        self._write_index(bucket, user_id, session_id, content)
+        try:
+            self.session_index.record_messages(
+                user_id,
+                session_id,
+                [(m.role.value, m.content, m.timestamp) for m in messages],
+                count=_message_count(content),
+            )
+        except Exception as e:
+            log.warning("session_index_update_failed", error=str(e))
+
     def get_session_messages(
         self, user_id: str, session_id: str
     ) -> List[ConversationMessage]:
         """Retrieve all messages for a session"""
         try:
-            bucket = self.client.bucket(self.bucket_name)
-            file_path = self._get_session_file_path(user_id, session_id)
-            blob = bucket.blob(file_path)
-
-            if not blob.exists():
-                return []
-
-            content = blob.download_as_text()
-            messages = []
-
-            for line in content.strip().split("\n"):
-                if line.strip():
-                    message_data = json.loads(line)
-                    # Convert simplified format back to ConversationMessage
-                    messages.append(
-                        ConversationMessage(
-                            session_id=session_id,
-                            user_id=user_id,
-                            role=MessageRole(message_data["role"]),
-                            content=message_data["content"],
-                            timestamp=message_data["timestamp"],
-                        )
-                    )
+            with EXTERNAL_LATENCY.time(service="gcs", operation="read"):
+                bucket = self.client.bucket(self.bucket_name)
+                file_path = self._get_session_file_path(user_id, session_id)
+                blob = bucket.blob(file_path)
+
+                if not blob.exists():
+                    return []
 
-            return messages
+                return self._to_messages(user_id, session_id, parse_messages(blob.download_as_bytes()))
         except Exception as e:
-            print(f"Error retrieving session messages from GCS: {e}")
+            log.error("gcs_read_failed", error=str(e))
             return []
 
-    def list_user_sessions(self, user_id: str) -> List[str]:
-        """List all session IDs for the user"""
+    def _write_index(self, bucket, user_id: str, session_id: str, content: bytes):
         try:
-            bucket = self.client.bucket(self.bucket_name)
-            prefix = f"sessions/{user_id}/"
+            bucket.blob(self._get_index_file_path(user_id, session_id)).upload_from_string(
+                build_history_index(content), content_type="application/octet-stream"
+            )
+        except Exception as e:
+            log.warning("gcs_index_write_failed", session_id=session_id, error=str(e))
 
-            blobs = bucket.list_blobs(prefix=prefix)
-            session_ids = []
+    def get_session_page(
+        self, user_id: str, session_id: str, limit: int, before: Optional[int] = None
+    ) -> Tuple[List[ConversationMessage], Optional[int]]:
+        """
+        Up to `limit` messages ending just before message number `before`
+        (the newest ones when None), oldest first, and the `before` for the
+        next older page (None once the start of the session is reached).
 
-            for blob in blobs:
-                if blob.name.endswith(".jsonl"):
-                    # Extract session ID from filename
-                    filename = os.path.basename(blob.name)
-                    session_id = filename.replace(".jsonl", "")
-                    session_ids.append(session_id)
+        Two small ranged reads - the index entries for the page, then just
+        the lines or blocks holding those messages - so the cost doesn't
+        grow with the session. Sessions without a usable index are read
+        whole once and indexed.
+        """
+        try:
+            with EXTERNAL_LATENCY.time(service="gcs", operation="read_page"):
+                bucket = self.client.bucket(self.bucket_name)
+                blob = bucket.blob(self._get_session_file_path(user_id, session_id))
+                try:
+                    return self._read_page(bucket, blob, user_id, session_id, limit, before)
+                except NotFound:
+                    if not blob.exists():
+                        return [], None
+                except (ValueError, RequestRangeNotSatisfiable) as e:
+                    log.info("gcs_index_unusable", session_id=session_id, error=str(e))
 
-            return session_ids
+                content = blob.download_as_bytes()
+                self._write_index(bucket, user_id, session_id, content)
+                messages = parse_messages(content)
+                end = len(messages) if before is None else min(before, len(messages))
+                first = max(0, end - limit)
+                return self._to_messages(user_id, session_id, messages[first:end]), first or None
+        except NotFound:
+            return [], None
         except Exception as e:
-            print(f"Error listing user sessions from GCS: {e}")
-            return []
+            log.error("gcs_read_page_failed", error=str(e))
+            return [], None
 
-    def delete_session(self, user_id: str, session_id: str) -> bool:
-        """Delete a session file"""
-        try:
-            bucket = self.client.bucket(self.bucket_name)
-            file_path = self._get_session_file_path(user_id, session_id)
-            blob = bucket.blob(file_path)
+    def _read_page(
+        self, bucket, blob, user_id: str, session_id: str, limit: int, before: Optional[int]
+    ) -> Tuple[List[ConversationMessage], Optional[int]]:
+        """Page read through the index; ValueError if it doesn't fit the file"""
+        index = bucket.blob(self._get_index_file_path(user_id, session_id))
+        if before is None:
+            # The last `limit` entries and the trailer
+            entries, count = unpack_index(
+                index.download_as_bytes(start=-(limit + 1) * INDEX_ENTRY.size)
+            )
+            if count is None:
+                raise ValueError("History index has no trailer")
+            if not entries:
+                return [], None
+            first = count - len(entries)
+            # Read to the end of the file, not the last indexed message, in
+            # case messages landed after the index was written
+            data = blob.download_as_bytes(start=entries[0][0])
+            messages = parse_messages(data)[entries[0][2] :]
+            if len(messages) < len(entries):
+                raise ValueError("History index doesn't match the session file")
+            if len(messages) > limit:  # Index lagged the file
+                first += len(messages) - limit
+                messages = messages[-limit:]
+        else:
+            first = max(0, before - limit)
+            if first >= before:
+                return [], None
+            entries, count = unpack_index(
+                index.download_as_bytes(
+                    start=first * INDEX_ENTRY.size, end=before * INDEX_ENTRY.size - 1
+                )
+            )
+            if count is not None or len(entries) != before - first:
+                raise ValueError("Cursor past the end of the history index")
+            (start, _, position), (last, length, _) = entries[0], entries[-1]
+            data = blob.download_as_bytes(start=start, end=last + length - 1)
+            messages = parse_messages(data)[position : position + before - first]
+            if len(messages) != before - first:
+                raise ValueError("History index doesn't match the session file")
+        # A line or block that doesn't parse (JSONDecodeError is a
+        # ValueError) also means the offsets are off
+        return self._to_messages(user_id, session_id, messages), first or None
 
-            if blob.exists():
-                blob.delete()
-                return True
-            return False
-        except Exception as e:
-            print(f"Error deleting session from GCS: {e}")
-            return False
+    def list_user_sessions(self, user_id: str) -> List[str]:
+        """List all session IDs for the user, most recently active first"""
+        return [summary.session_id for summary in self.list_session_summaries(user_id)]
 
-    def delete_all_user_sessions(self, user_id: str) -> bool:
-        """Delete all session files for the user"""
+    def list_session_summaries(
+        self, user_id: str, sort: str = "last_activity"
+    ) -> List[SessionSummary]:
+        """Metadata of the user's sessions from their session index, newest first by `sort`"""
         try:
+            return [SessionSummary(**entry) for entry in self.session_index.list(user_id, sort)]
+        except Exception as e:
+            log.error("gcs_list_failed", error=str(e))
+            return []
+
+    def _scan_user_sessions(self, user_id: str) -> Dict[str, dict]:
+        """
+        Build a session index the slow way, reading every session file;
+        only for users whose sessions predate the index
+        """
+        with EXTERNAL_LATENCY.time(service="gcs", operation="list"):
             bucket = self.client.bucket(self.bucket_name)
-            prefix = f"sessions/{user_id}/"
+            entries = {}
+            for blob in bucket.list_blobs(prefix=f"sessions/{user_id}/"):
+                if not blob.name.endswith(".jsonl"):
+                    continue
+                session_id = os.path.basename(blob.name)[: -len(".jsonl")]
+                lines = parse_messages(blob.download_as_bytes())
+                title = next((l["content"] for l in lines if l["role"] == "user"), None)
+                entries[session_id] = {
+                    "title": title[: SessionIndex.TITLE_CHARS] if title else None,
+                    "created_at": lines[0]["timestamp"] if lines else None,
+                    "last_activity": lines[-1]["timestamp"] if lines else None,
+                    "message_count": len(lines),
+                }
+            return entries
 
-            blobs = bucket.list_blobs(prefix=prefix)
-            deleted_count = 0
+    def _delete_batch(self):
+        """A batch request that doesn't raise on errors and keeps its sub-responses"""
+        return _delete_batch_class()(self.client, raise_exception=False)
+
+    def _delete_blobs(
+        self, names: List[str], progress: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[int]:
+        """
+        Delete objects in batch requests, several batches at a time. Objects
+        already gone are skipped silently, so re-running a deletion is safe.
+        `progress(done, total)` is called as batches complete. Returns how
+        many objects were handled, or None if any delete failed.
+        """
+        bucket = self.client.bucket(self.bucket_name)
+        chunks = [
+            names[i : i + self.DELETE_BATCH_SIZE]
+            for i in range(0, len(names), self.DELETE_BATCH_SIZE)
+        ]
+        done = 0
+        done_lock = threading.Lock()
+
+        def delete_chunk(chunk: List[str]) -> bool:
+            nonlocal done
+            # One HTTP request for the whole chunk. Sub-request errors don't
+            # raise, so a 404 for a missing object doesn't fail the batch;
+            # any other status does.
+            batch = self._delete_batch()
+            with batch:
+                for name in chunk:
+                    bucket.blob(name).delete()
+            errors = [
+                response.status_code
+                for response in batch.responses
+                if not 200 <= response.status_code < 300 and response.status_code != 404
+            ]
+            if errors:
+                log.error("gcs_batch_delete_failed", failed=len(errors), status=errors[0])
+                return False
+            with done_lock:
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, len(names))
+            return True
 
-            for blob in blobs:
-                if blob.name.endswith(".jsonl"):
-                    blob.delete()
-                    deleted_count += 1
+        if len(chunks) <= 1:
+            results = [delete_chunk(chunk) for chunk in chunks]
+        else:
+            workers = min(Config.DELETE_BATCH_CONCURRENCY, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcs-delete") as pool:
+                results = list(pool.map(delete_chunk, chunks))
+        return done if all(results) else None
 
-            return deleted_count > 0
+    def delete_session(self, user_id: str, session_id: str) -> bool:
+        """
+        Delete a session file and its history index. Deleting a session
+        that doesn't exist succeeds; False means the deletion failed.
+        """
+        try:
+            with EXTERNAL_LATENCY.time(service="gcs", operation="delete"):
+                deleted = self._delete_blobs(
+                    [
+                        self._get_session_file_path(user_id, session_id),
+                        self._get_index_file_path(user_id, session_id),
+                    ]
+                )
+                if deleted is None:
+                    return False
+                self.session_index.remove(user_id, session_id)
+                return True
         except Exception as e:
-            print(f"Error deleting all user sessions from GCS: {e}")
+            log.error("gcs_delete_failed", error=str(e))
             return False
+
+    def delete_all_user_sessions(
+        self, user_id: str, progress: Optional[Callable[[int, int], None]] = None
+    ) -> Optional[int]:
+        """
+        Delete all of the user's session objects: files, history indexes
+        and the session index. Returns how many sessions were deleted, or
+        None if the deletion failed partway (it is safe to run again).
+        """
+        try:
+            with EXTERNAL_LATENCY.time(service="gcs", operation="delete_all"):
+                bucket = self.client.bucket(self.bucket_name)
+                prefix = f"sessions/{user_id}/"
+                names = [blob.name for blob in bucket.list_blobs(prefix=prefix)]
+                self.session_index.invalidate(user_id)
+                if self._delete_blobs(names, progress) is None:
+                    return None
+                # Sweep up anything written while the first pass ran (e.g. a
+                # session created after the listing)
+                stragglers = [blob.name for blob in bucket.list_blobs(prefix=prefix)]
+                if stragglers:
+                    if self._delete_blobs(stragglers) is None:
+                        return None
+                    names = list(set(names) | set(stragglers))
+                return sum(1 for name in names if name.endswith(".jsonl"))
+        except Exception as e:
+            log.error("gcs_delete_all_failed", error=str(e))
+            return None
@@ -1,10 +1,296 @@
+import json
 import pytest
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+# Make `agent`, `web`, `config` importable while test modules are collected
+src_path = Path(__file__).parent.parent / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
 @pytest.fixture(autouse=True)
 def setup_pythonpath():
     """Add src directory to PYTHONPATH for all tests"""
-    src_path = Path(__file__).parent.parent / "src"
     if str(src_path) not in sys.path:
-        sys.path.insert(0, str(src_path))
\ No newline at end of file
+        sys.path.insert(0, str(src_path))
+
+
+def mock_place(place_id):
+    i = place_id.split("/")[-1]
+    return {
+        "name": place_id,
+        "displayName": {"text": f"Place {i}", "languageCode": "en"},
+        "formattedAddress": f"{i} Main St",
+        "priceLevel": "PRICE_LEVEL_MODERATE",
+        "editorialSummary": {"text": f"Neighbourhood spot number {i}"},
+        "googleMapsLinks": {
+            kind: f"https://maps.example/{i}/{kind}"
+            for kind in ("directionsUri", "placeUri", "writeAReviewUri", "reviewsUri", "photosUri")
+        },
+        "utcOffsetMinutes": 0,
+        "regularOpeningHours": {
+            "openNow": True,
+            "weekdayDescriptions": [f"Day {d}: 9:00 AM - 10:00 PM" for d in range(7)],
+            "nextCloseTime": "2026-10-20T22:00:00Z",
+            "periods": [
+                {"open": {"day": d, "hour": 9, "minute": 0}, "close": {"day": d, "hour": 22, "minute": 0}}
+                for d in range(7)
+            ],
+        },
+    }
+
+
+class MockPlacesServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Places API. Serves details for any places/<id>
+    and a fixed five-result text search, honouring X-Goog-FieldMask.
+    `latency` and `delays` (per place ID) inject response time, `fail`
+    makes IDs return 500, `throttled` makes them return 429 with
+    Retry-After, and the counters record what the client did.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _MockPlacesHandler)
+        self.latency = 0.0
+        self.delays = {}
+        self.fail = set()
+        self.throttled = set()
+        self.connections = 0
+        self.detail_requests = []
+        self.search_requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _MockPlacesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _mask(self, place, prefix=""):
+        mask = self.headers.get("X-Goog-FieldMask", "*")
+        if mask == "*":
+            return place
+        fields = {f.strip()[len(prefix):] for f in mask.split(",") if f.strip().startswith(prefix)}
+        return {k: v for k, v in place.items() if k in fields}
+
+    def do_GET(self):
+        place_id = self.path.split("/v1/", 1)[-1]
+        with self.server.lock:
+            self.server.detail_requests.append(place_id)
+        time.sleep(self.server.delays.get(place_id, self.server.latency))
+        if place_id in self.server.throttled:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif place_id in self.server.fail:
+            self._send(500, {"error": {"code": 500}})
+        else:
+            self._send(200, self._mask(mock_place(place_id)))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("textQuery", "")
+        with self.server.lock:
+            self.server.search_requests.append(query)
+        time.sleep(self.server.latency)
+        places = [self._mask(mock_place(f"places/{i}"), "places.") for i in range(5)]
+        self._send(200, {"places": places})
+
+
+class FakeBlob:
+    """Just enough of google.cloud.storage.Blob, ranged reads included"""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def generation(self):
+        return self.bucket.objects[self.name][1]
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def download_as_bytes(self, start=None, end=None):
+        from google.api_core.exceptions import NotFound
+
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        self.bucket.round_trip()
+        data = self.bucket.objects[self.name][0]
+        if start is None:
+            chunk = data
+        elif start < 0:
+            chunk = data[start:]
+        else:
+            chunk = data[start : None if end is None else end + 1]
+        self.bucket.downloaded += len(chunk)
+        return chunk
+
+    def download_as_text(self):
+        return self.download_as_bytes().decode("utf-8")
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        from google.api_core.exceptions import PreconditionFailed
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket.round_trip()
+        with self.bucket.lock:
+            generation = self.bucket.objects.get(self.name, (b"", 0))[1]
+            if if_generation_match is not None and if_generation_match != generation:
+                raise PreconditionFailed(self.name)
+            self.bucket.objects[self.name] = (data, generation + 1)
+        self.bucket.uploads += 1
+
+    def delete(self):
+        from google.api_core.exceptions import NotFound, ServiceUnavailable
+
+        self.bucket.round_trip()
+        if self.name in self.bucket.failing:
+            status = 503
+        else:
+            self.bucket.deletes += 1
+            status = 204 if self.bucket.objects.pop(self.name, None) is not None else 404
+        if self.bucket.batching():
+            # Like a batch with raise_exception=False: errors go in the sub-responses
+            self.bucket._batch.responses.append(FakeResponse(status))
+        elif status == 503:
+            raise ServiceUnavailable(self.name)
+        elif status == 404:
+            raise NotFound(self.name)
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeBucket:
+    """
+    In-memory bucket: name -> (data, generation), with traffic counters.
+    Each request sleeps `latency`; calls inside client.batch() share one.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.downloaded = 0
+        self.uploads = 0
+        self.deletes = 0
+        self.listings = 0
+        self.requests = 0
+        self.latency = 0.0
+        self.failing = set()  # Names whose deletes fail with a 503
+        self.lock = threading.Lock()
+        self._batch = threading.local()
+
+    def batching(self):
+        return getattr(self._batch, "active", False)
+
+    def round_trip(self):
+        if not self.batching():
+            with self.lock:
+                self.requests += 1
+            time.sleep(self.latency)
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix):
+        self.listings += 1
+        self.round_trip()
+        return [FakeBlob(self, name) for name in list(self.objects) if name.startswith(prefix)]
+
+
+class FakeGCSClient:
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        return self.fake_bucket
+
+    def batch(self, raise_exception=True):
+        return FakeBatch(self.fake_bucket)
+
+
+class FakeBatch:
+    """One round trip for the calls made inside it; .responses as finish() returns them"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.responses = []
+
+    def __enter__(self):
+        self.bucket._batch.active, self.bucket._batch.responses = True, []
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.bucket._batch.active = False
+        if exc_type is None:
+            self.bucket.round_trip()
+            self.responses = self.bucket._batch.responses
+
+
+@pytest.fixture
+def gcs_storage():
+    """GCPSessionStorage on an in-memory bucket"""
+    from web.session_index import SessionIndex
+    from web.storage import GCPSessionStorage
+
+    store = GCPSessionStorage.__new__(GCPSessionStorage)
+    store.client = FakeGCSClient()
+    store._delete_batch = lambda: store.client.batch(raise_exception=False)
+    store.bucket_name = "test"
+    store.session_index = SessionIndex(store.client, "test", store._scan_user_sessions)
+    return store
+
+
+@pytest.fixture
+def mock_places_server():
+    server = MockPlacesServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def places_client(mock_places_server, monkeypatch):
+    """PlacesClient pointed at the mock server with a memory-only cache"""
+    from agent.clients import PlacesCache, PlacesClient
+    from agent.rate_limit import PriorityRateLimiter, TokenBucket
+    from config import Config
+
+    monkeypatch.setattr(Config, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(Config, "PLACES_API_KEY", "test")
+    monkeypatch.setattr(Config, "BASE_BUCKET", "test")
+    return PlacesClient(
+        cache=PlacesCache(),
+        base_url=mock_places_server.url,
+        limiter=PriorityRateLimiter(TokenBucket("test", rate=1000, burst=1000)),
+    )
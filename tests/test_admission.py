@@ -0,0 +1,215 @@
+import asyncio
+import statistics
+import time
+import pytest
+from web.admission import AdmissionController, Overloaded
+
+
+def controller(**kwargs):
+    defaults = dict(
+        initial_limit=2,
+        min_limit=1,
+        max_limit=8,
+        max_queue=10,
+        max_queue_per_user=3,
+        target_latency=1.0,
+        default_timeout=1.0,
+    )
+    defaults.update(kwargs)
+    return AdmissionController(**defaults)
+
+
+class TestAdmissionController:
+    def test_admits_up_to_limit_then_queues(self):
+        async def scenario():
+            ac = controller()
+            await ac.acquire("a")
+            await ac.acquire("b")
+            waiter = asyncio.ensure_future(ac.acquire("c"))
+            await asyncio.sleep(0.01)
+            assert (ac.in_flight, ac.queued) == (2, 1)
+            ac.release(0.1)
+            await waiter
+            assert (ac.in_flight, ac.queued) == (2, 0)
+
+        asyncio.run(scenario())
+
+    def test_users_are_served_round_robin(self):
+        async def scenario():
+            ac = controller(initial_limit=1, max_limit=1)
+            await ac.acquire("busy")
+            order = []
+
+            async def request(user, label):
+                await ac.acquire(user)
+                order.append(label)
+
+            tasks = [asyncio.ensure_future(request("heavy", f"heavy{i}")) for i in range(3)]
+            await asyncio.sleep(0.01)
+            tasks.append(asyncio.ensure_future(request("light", "light")))
+            await asyncio.sleep(0.01)
+            for _ in range(4):
+                ac.release(0.1)
+                await asyncio.sleep(0.01)
+            await asyncio.gather(*tasks)
+            # The light user's one request jumps ahead of the heavy user's backlog
+            assert order == ["heavy0", "light", "heavy1", "heavy2"]
+
+        asyncio.run(scenario())
+
+    def test_full_queue_sheds_immediately(self):
+        async def scenario():
+            ac = controller(initial_limit=1, max_limit=1, max_queue_per_user=2)
+            await ac.acquire("a")
+            waiters = [asyncio.ensure_future(ac.acquire("b")) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            with pytest.raises(Overloaded) as shed:
+                await ac.acquire("b")
+            assert shed.value.reason == "queue_full" and shed.value.retry_after >= 1
+            for w in waiters:
+                w.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            assert ac.queued == 0
+
+        asyncio.run(scenario())
+
+    def test_deadline_expires_in_queue(self):
+        async def scenario():
+            ac = controller(initial_limit=1, max_limit=1)
+            await ac.acquire("a")
+            start = time.monotonic()
+            with pytest.raises(Overloaded) as shed:
+                await ac.acquire("b", timeout=0.05)
+            assert shed.value.reason == "deadline"
+            assert time.monotonic() - start < 0.5
+            assert ac.queued == 0 and ac.stats()["shed_deadline"] == 1
+            # The dead waiter doesn't take the slot when it frees up
+            ac.release(0.1)
+            assert ac.in_flight == 0
+
+        asyncio.run(scenario())
+
+    def test_timed_out_waiters_dont_count_toward_max_queue_per_user(self):
+        async def scenario():
+            ac = controller(initial_limit=1, max_limit=1, max_queue_per_user=2)
+            await ac.acquire("a")  # Held throughout
+            for _ in range(2):
+                with pytest.raises(Overloaded):
+                    await ac.acquire("b", timeout=0.02)
+            cancelled = asyncio.ensure_future(ac.acquire("b"))
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            assert ac.queued == 0 and ac.stats()["queued_users"] == 0
+
+            # Nothing of b's is queued, so b can queue again
+            waiter = asyncio.ensure_future(ac.acquire("b"))
+            await asyncio.sleep(0.01)
+            assert ac.queued == 1
+            ac.release(0.1)
+            await waiter
+            assert ac.in_flight == 1
+
+        asyncio.run(scenario())
+
+    def test_expected_wait_beyond_deadline_sheds_early(self):
+        async def scenario():
+            ac = controller(initial_limit=1, max_limit=1)
+            ac.latency_ewma = 5.0
+            await ac.acquire("a")
+            with pytest.raises(Overloaded) as shed:
+                await ac.acquire("b", timeout=1.0)
+            assert shed.value.reason == "deadline" and ac.queued == 0
+
+        asyncio.run(scenario())
+
+    def test_aimd(self):
+        ac = controller(initial_limit=4, max_limit=8, target_latency=1.0)
+        ac.in_flight = 8
+        for _ in range(4):
+            ac.release(0.2)
+        assert ac.limit == pytest.approx(5, abs=0.1)  # About +1 per window
+        ac.release(3.0)
+        assert ac.limit == pytest.approx(5 * 0.9, abs=0.1)
+        ac.release(3.0)  # Within the cooldown: not cut twice for one slow burst
+        assert ac.limit == pytest.approx(5 * 0.9, abs=0.1)
+
+
+class ContendedBackend:
+    """Service time grows once more than `capacity` requests run at once"""
+
+    def __init__(self, capacity=8, base=0.02):
+        self.capacity = capacity
+        self.base = base
+        self.running = 0
+
+    async def handle(self):
+        self.running += 1
+        try:
+            await asyncio.sleep(self.base * max(1.0, self.running / self.capacity))
+        finally:
+            self.running -= 1
+
+
+async def offered_load(handle, requests=600, rate=1200):
+    """Open-loop arrivals at `rate`/s, about 3x what the backend can serve"""
+    latencies, shed = [], 0
+
+    async def one():
+        nonlocal shed
+        start = time.monotonic()
+        try:
+            await handle()
+        except Overloaded:
+            shed += 1
+            return
+        latencies.append(time.monotonic() - start)
+
+    tasks = []
+    for _ in range(requests):
+        tasks.append(asyncio.ensure_future(one()))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return latencies, shed
+
+
+def p99(values):
+    return statistics.quantiles(values, n=100)[98]
+
+
+@pytest.mark.slow
+def test_latency_stays_stable_past_saturation():
+    async def unbounded():
+        backend = ContendedBackend()
+        return await offered_load(backend.handle)
+
+    async def admitted():
+        backend = ContendedBackend()
+        ac = AdmissionController(
+            initial_limit=4,
+            min_limit=1,
+            max_limit=32,
+            max_queue=32,
+            max_queue_per_user=32,
+            target_latency=0.04,
+            default_timeout=0.25,
+        )
+
+        async def handle():
+            async with ac.slot("user"):
+                await backend.handle()
+
+        latencies, shed = await offered_load(handle)
+        return latencies, shed, ac.stats()
+
+    raw, _ = asyncio.run(unbounded())
+    latencies, shed, stats = asyncio.run(admitted())
+    print(
+        f"\nno admission: p50 {statistics.median(raw) * 1000:.0f} ms, p99 {p99(raw) * 1000:.0f} ms\n"
+        f"admission:    p50 {statistics.median(latencies) * 1000:.0f} ms, "
+        f"p99 {p99(latencies) * 1000:.0f} ms, served {len(latencies)}, shed {shed}, "
+        f"final limit {stats['limit']}"
+    )
+    assert shed > 0
+    assert p99(latencies) < p99(raw) / 2
+    assert p99(latencies) < 0.3  # Queue wait never exceeds the deadline
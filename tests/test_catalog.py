@@ -0,0 +1,190 @@
+import json
+import random
+import time
+import pytest
+from agent.tools import catalog as catalog_module
+from agent.tools.catalog import (
+    CatalogPlacesClient,
+    RestaurantCatalog,
+    TieredPlacesClient,
+    build_places_backend,
+    geohash_encode,
+    haversine_km,
+)
+from agent.tools.restaurants import RestaurantTool
+from config import Config
+
+AREAS = {
+    "mission district": (37.7599, -122.4148),
+    "downtown": (37.7880, -122.4075),
+    "sunset": (37.7530, -122.4940),
+}
+CUISINES = ["thai", "sushi", "pizza", "mexican", "indian", "burger"]
+PRICES = ["PRICE_LEVEL_INEXPENSIVE", "PRICE_LEVEL_MODERATE", "PRICE_LEVEL_EXPENSIVE"]
+
+
+def make_records(n, seed=0, spread=0.01):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        area = rng.choice(list(AREAS))
+        lat, lng = AREAS[area]
+        cuisine = CUISINES[i % len(CUISINES)]
+        records.append({
+            "name": f"places/{i}",
+            "displayName": {"text": f"{cuisine.title()} House {i}", "languageCode": "en"},
+            "formattedAddress": f"{i} Main St, San Francisco",
+            "priceLevel": PRICES[(i // len(CUISINES)) % len(PRICES)],
+            "editorialSummary": {"text": f"Neighbourhood {cuisine} spot"},
+            "location": {
+                "latitude": lat + rng.uniform(-spread, spread),
+                "longitude": lng + rng.uniform(-spread, spread),
+            },
+            "cuisines": [cuisine],
+            "area": area,
+        })
+    return records
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return RestaurantCatalog(make_records(600))
+
+
+class TestGeo:
+    def test_geohash_known_value(self):
+        # Reference value for the Jutland example in the geohash spec
+        assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+    def test_haversine(self):
+        # San Francisco to Oakland is roughly 13 km
+        assert 12 < haversine_km(37.7749, -122.4194, 37.8044, -122.2712) < 14
+
+
+class TestRestaurantCatalog:
+    @pytest.mark.parametrize("radius_km", [0.3, 1.0, 5.0])
+    def test_search_near_matches_brute_force(self, catalog, radius_km):
+        near = AREAS["mission district"]
+        results = catalog.search(cuisines=["thai"], near=near, radius_km=radius_km, limit=1000)
+
+        expected = sorted(
+            haversine_km(*near, p["location"]["latitude"], p["location"]["longitude"])
+            for p in catalog.places
+            if "thai" in p["cuisines"]
+            and haversine_km(*near, p["location"]["latitude"], p["location"]["longitude"]) <= radius_km
+        )
+        distances = [
+            haversine_km(*near, p["location"]["latitude"], p["location"]["longitude"]) for p in results
+        ]
+        assert expected and distances == expected
+
+    def test_price_filter(self, catalog):
+        results = catalog.search(cuisines=["pizza"], price_levels=["PRICE_LEVEL_INEXPENSIVE"], limit=50)
+        assert results
+        assert all(p["priceLevel"] == "PRICE_LEVEL_INEXPENSIVE" for p in results)
+        assert all("pizza" in p["cuisines"] for p in results)
+
+    def test_parse_query(self, catalog):
+        parsed = catalog.parse_query("Cheap Thai restaurants in the Mission District")
+        assert parsed == {
+            "cuisines": ["thai"],
+            "price_levels": ["PRICE_LEVEL_INEXPENSIVE"],
+            "area": "mission district",
+        }
+
+    def test_search_text_ranks_by_distance_to_area(self, catalog):
+        results = catalog.search_text("sushi near downtown")
+        assert len(results) == 5
+        assert all(p["area"] == "downtown" for p in results)
+
+    def test_unrecognised_cuisine_returns_nothing(self, catalog):
+        assert catalog.search_text("ethiopian food downtown") == []
+
+    def test_load_json_and_jsonl(self, tmp_path):
+        records = make_records(20)
+        json_path = tmp_path / "catalog.json"
+        json_path.write_text(json.dumps(records))
+        jsonl_path = tmp_path / "catalog.jsonl"
+        jsonl_path.write_text("\n".join(json.dumps(r) for r in records))
+
+        assert len(RestaurantCatalog.load(str(json_path))) == 20
+        assert RestaurantCatalog.load(str(jsonl_path)).get_details("places/3") == records[3]
+
+
+class FakePlacesClient:
+    def __init__(self):
+        self.queries = []
+
+    def search_place(self, query):
+        self.queries.append(query)
+        return [{"name": "places/live", "displayName": {"text": "Live"}, "formattedAddress": "1 Live St"}]
+
+    def get_place_details(self, place_id, field_mask=None):
+        return {"name": place_id, "displayName": {"text": "Live"}}
+
+
+class TestBackends:
+    def test_catalog_backend_drives_restaurant_tool(self, catalog):
+        tool = RestaurantTool(places_client=CatalogPlacesClient(catalog), prefetch_top_n=0)
+        results = tool.search_restaurants("thai in the sunset")
+        assert len(results) == 5
+        details = tool.get_restaurant_details_by_index(0)
+        assert details.name == results[0].id
+
+    def test_tiered_falls_back_to_live_api(self, catalog):
+        live = FakePlacesClient()
+        client = TieredPlacesClient(catalog, live)
+        assert client.search_place("pizza downtown")[0]["name"] != "places/live"
+        assert live.queries == []
+        assert client.search_place("ethiopian food")[0]["name"] == "places/live"
+        assert client.get_place_details("places/unknown")["name"] == "places/unknown"
+
+    def test_build_catalog_backend_needs_no_api_key(self, tmp_path, monkeypatch):
+        path = tmp_path / "catalog.jsonl"
+        path.write_text("\n".join(json.dumps(r) for r in make_records(10)))
+        monkeypatch.setattr(Config, "RESTAURANT_BACKEND", "catalog")
+        monkeypatch.setattr(Config, "RESTAURANT_CATALOG_PATH", str(path))
+        monkeypatch.setattr(Config, "PLACES_API_KEY", None)
+        monkeypatch.setattr(catalog_module, "_catalogs", {})
+
+        backend = build_places_backend()
+        assert isinstance(backend, CatalogPlacesClient)
+        assert len(backend.catalog) == 10
+
+    def test_live_backends_share_one_client(self, tmp_path, monkeypatch):
+        from agent import clients
+
+        path = tmp_path / "catalog.jsonl"
+        path.write_text("\n".join(json.dumps(r) for r in make_records(10)))
+        for key in ("GEMINI_API_KEY", "PLACES_API_KEY", "BASE_BUCKET"):
+            monkeypatch.setattr(Config, key, "test")
+        monkeypatch.setattr(Config, "RESTAURANT_CATALOG_PATH", str(path))
+        monkeypatch.setattr(clients, "_shared_client", None)
+
+        monkeypatch.setattr(Config, "RESTAURANT_BACKEND", "places")
+        first, second = build_places_backend(), build_places_backend()
+        assert first is second
+        monkeypatch.setattr(Config, "RESTAURANT_BACKEND", "hybrid")
+        assert build_places_backend().places_client is first
+        first.close()
+
+
+@pytest.mark.slow
+def test_catalog_query_latency():
+    # 100k places spread over a ~50 km metro area
+    catalog = RestaurantCatalog(make_records(100_000, spread=0.25))
+    queries = ["thai near downtown", "cheap pizza in the mission district", "sushi sunset"]
+    catalog.search_text(queries[0])
+
+    start = time.perf_counter()
+    rounds = 200
+    for _ in range(rounds):
+        for query in queries:
+            catalog.search(
+                cuisines=catalog.parse_query(query)["cuisines"],
+                near=AREAS["downtown"],
+                radius_km=1.0,
+            )
+    per_query_ms = (time.perf_counter() - start) / (rounds * len(queries)) * 1000
+    print(f"catalog search over 100k places: {per_query_ms:.3f} ms/query")
+    assert per_query_ms < 5
@@ -0,0 +1,169 @@
+import threading
+import time
+import pytest
+from web.deletion import DeletionQueue
+
+
+def seed(storage, sessions, user_id="u1"):
+    bucket = storage.client.fake_bucket
+    for i in range(sessions):
+        bucket.objects[f"sessions/{user_id}/s{i}.jsonl"] = (b'{"role": "user"}\n', 1)
+        bucket.objects[f"sessions/{user_id}/s{i}.idx"] = (b"\0" * 24, 1)
+    bucket.objects[f"sessions/{user_id}/_index.json"] = (b"{}", 1)
+
+
+class TestSessionDeletion:
+    def test_delete_session_is_idempotent(self, gcs_storage):
+        seed(gcs_storage, 2)
+        bucket = gcs_storage.client.fake_bucket
+        bucket.requests = 0
+        assert gcs_storage.delete_session("u1", "s0")
+        # One batch for the file and its index, plus the session index update
+        assert bucket.requests == 3
+        assert gcs_storage.delete_session("u1", "s0")
+        assert gcs_storage.delete_session("u1", "never-existed")
+        assert "sessions/u1/s1.jsonl" in bucket.objects
+
+    def test_delete_all_uses_batches(self, gcs_storage):
+        seed(gcs_storage, 250)
+        seed(gcs_storage, 1, user_id="u2")
+        bucket = gcs_storage.client.fake_bucket
+        bucket.requests = 0
+        progress = []
+        assert gcs_storage.delete_all_user_sessions("u1", lambda done, total: progress.append((done, total))) == 250
+        # Six batches of up to 100 deletes for 501 objects, between a
+        # listing and the re-listing that checks nothing was left behind
+        assert bucket.requests == 8
+        assert sorted(progress)[-1] == (501, 501)
+        assert list(bucket.objects) == ["sessions/u2/s0.jsonl", "sessions/u2/s0.idx", "sessions/u2/_index.json"]
+        assert gcs_storage.list_user_sessions("u1") == []
+        # Running it again is harmless
+        assert gcs_storage.delete_all_user_sessions("u1") == 0
+
+    def test_delete_all_sweeps_sessions_written_meanwhile(self, gcs_storage, monkeypatch):
+        seed(gcs_storage, 3)
+        bucket = gcs_storage.client.fake_bucket
+        delete_blobs = gcs_storage._delete_blobs
+
+        def racing_delete(names, progress=None):
+            # A new session lands after the listing, during the first pass
+            bucket.objects.setdefault("sessions/u1/late.jsonl", (b'{"role": "user"}\n', 1))
+            return delete_blobs(names, progress)
+
+        monkeypatch.setattr(gcs_storage, "_delete_blobs", racing_delete)
+        assert gcs_storage.delete_all_user_sessions("u1") == 4
+        assert bucket.objects == {}
+
+    def test_failed_deletes_are_reported(self, gcs_storage):
+        seed(gcs_storage, 150)
+        bucket = gcs_storage.client.fake_bucket
+        bucket.failing = {"sessions/u1/s3.jsonl", "sessions/u1/s140.idx"}
+        assert not gcs_storage.delete_session("u1", "s3")
+        assert gcs_storage.delete_all_user_sessions("u1") is None
+        assert set(bucket.objects) == bucket.failing
+
+        job = DeletionQueue(workers=1).submit(
+            "u1", None, lambda progress: gcs_storage.delete_all_user_sessions("u1", progress)
+        )
+        assert job.wait(5)
+        assert job.to_dict()["state"] == "failed"
+
+        # Once the errors clear, running it again finishes the job
+        bucket.failing = set()
+        assert gcs_storage.delete_all_user_sessions("u1") == 1
+        assert bucket.objects == {}
+
+    def test_sub_responses_of_a_real_batch_are_kept(self):
+        from unittest import mock
+        import requests
+        from google.cloud import storage
+        from web.storage import _delete_batch_class
+
+        parts = [("204 No Content", ""), ("404 Not Found", "{}"), ("503 Service Unavailable", "{}")]
+        body = "".join(
+            f"--B\r\nContent-Type: application/http\r\nContent-ID: <response-{i}>\r\n\r\n"
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            for i, (status, payload) in enumerate(parts, 1)
+        ) + "--B--"
+        response = requests.Response()
+        response.status_code, response._content = 200, body.encode()
+        response.headers["content-type"] = 'multipart/mixed; boundary="B"'
+
+        client = storage.Client.create_anonymous_client()
+        batch = _delete_batch_class()(client, raise_exception=False)
+        with mock.patch.object(client._base_connection, "_make_request", return_value=response):
+            with batch:
+                for name in "abc":
+                    client.bucket("test").blob(name).delete()
+        assert [r.status_code for r in batch.responses] == [204, 404, 503]
+
+
+class TestDeletionQueue:
+    def test_job_reports_progress_and_result(self):
+        queue = DeletionQueue(workers=1)
+
+        def delete(progress):
+            progress(5, 10)
+            progress(10, 10)
+            return 4
+
+        job = queue.submit("u1", None, delete)
+        assert job.wait(5)
+        assert job.to_dict()["state"] == "done"
+        assert (job.done, job.total, job.deleted_sessions) == (10, 10, 4)
+        assert queue.get(job.job_id, "u1") is job
+        assert queue.get(job.job_id, "someone-else") is None
+
+    def test_repeated_request_joins_the_running_job(self):
+        queue = DeletionQueue(workers=2)
+        release = threading.Event()
+        calls = []
+
+        def delete(progress):
+            calls.append(1)
+            release.wait(5)
+            return 1
+
+        first = queue.submit("u1", "s1", delete)
+        second = queue.submit("u1", "s1", delete)
+        other = queue.submit("u1", "s2", delete)
+        assert second is first and other is not first
+        release.set()
+        assert first.wait(5) and other.wait(5)
+        assert len(calls) == 2
+        # Once finished, a new request starts a new job
+        assert queue.submit("u1", "s1", lambda progress: 1) is not first
+
+    def test_failures_are_reported(self):
+        queue = DeletionQueue(workers=1)
+        failed = queue.submit("u1", None, lambda progress: None)
+        raised = queue.submit("u1", "s1", lambda progress: 1 / 0)
+        assert failed.wait(5) and raised.wait(5)
+        assert failed.state == "failed" and failed.error
+        assert raised.state == "failed" and "division" in raised.error
+
+
+@pytest.mark.slow
+def test_bulk_deletion_speed(gcs_storage):
+    sessions = 1000
+    bucket = gcs_storage.client.fake_bucket
+    bucket.latency = 0.002  # Per GCS request
+
+    # The previous sweep: one delete request per object
+    seed(gcs_storage, sessions)
+    start = time.perf_counter()
+    for blob in bucket.list_blobs(prefix="sessions/u1/"):
+        blob.delete()
+    one_by_one = time.perf_counter() - start
+
+    seed(gcs_storage, sessions)
+    bucket.requests = 0
+    start = time.perf_counter()
+    assert gcs_storage.delete_all_user_sessions("u1") == sessions
+    batched = time.perf_counter() - start
+
+    print(
+        f"\n{sessions} sessions at {bucket.latency * 1000:.0f} ms/request: "
+        f"one by one {one_by_one:.2f} s, batched {batched:.3f} s ({bucket.requests} requests)"
+    )
+    assert batched < one_by_one / 20
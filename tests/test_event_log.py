@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import time
+import pytest
+from web.event_log import EventLogger
+
+
+@pytest.fixture
+def make_logger(tmp_path):
+    loggers = []
+
+    def make(**kwargs):
+        logger = EventLogger(str(tmp_path), **kwargs)
+        loggers.append(logger)
+        return logger
+
+    yield make
+    for logger in loggers:
+        logger.close()
+
+
+class TestEventLogger:
+    def test_per_session_text_files(self, make_logger, tmp_path):
+        logger = make_logger(shards=0)
+        logger.log("u1", "s1", "New session created: s1")
+        logger.log("u1", "s1", "Processing message: hi")
+        logger.log("u2", "s9", "Processing message: hello")
+        assert logger.flush()
+
+        assert (tmp_path / "u1_s1.log").read_text() == (
+            "New session created: s1\nProcessing message: hi\n"
+        )
+        assert (tmp_path / "u2_s9.log").read_text() == "Processing message: hello\n"
+
+    def test_sharded_json_lines(self, make_logger, tmp_path):
+        logger = make_logger(fmt="json", shards=4)
+        for i in range(50):
+            logger.log(f"user{i}", "s", "Response: ok", response_chars=2)
+        assert logger.flush()
+
+        files = sorted(os.listdir(tmp_path))
+        assert 1 <= len(files) <= 4
+        records = [
+            json.loads(line) for name in files for line in (tmp_path / name).read_text().splitlines()
+        ]
+        assert len(records) == 50
+        assert {r["user_id"] for r in records} == {f"user{i}" for i in range(50)}
+        assert records[0]["response_chars"] == 2 and "ts" in records[0]
+
+    def test_default_file_count_is_bounded(self, make_logger, tmp_path):
+        logger = make_logger()
+        for i in range(200):
+            logger.log(f"user{i}", f"s{i}", "Processing message: hi")
+        assert logger.flush()
+        assert len(os.listdir(tmp_path)) <= 16
+        assert logger.stats["written"] == 200
+
+    def test_open_handles_are_bounded(self, make_logger):
+        logger = make_logger(shards=0, max_open_files=3)
+        for i in range(20):
+            logger.log("u", f"s{i}", "event")
+        assert logger.flush()
+        assert logger.open_files() == 3
+
+    def test_rotation_gzips_and_keeps_backups(self, make_logger, tmp_path):
+        logger = make_logger(shards=0, max_bytes=1000, backup_count=2, batch_size=1)
+        for i in range(105):
+            logger.log("u", "s", f"event {i:04d} " + "x" * 90)
+        assert logger.flush()
+
+        assert sorted(os.listdir(tmp_path)) == ["u_s.log", "u_s.log.1.gz", "u_s.log.2.gz"]
+        with gzip.open(tmp_path / "u_s.log.1.gz", "rt") as f:
+            assert f.read().startswith("event")
+        assert logger.stats["rotations"] == 10
+
+    def test_long_events_are_truncated(self, make_logger, tmp_path):
+        logger = make_logger(shards=0, max_event_chars=10)
+        logger.log("u", "s", "Response: " + "y" * 500)
+        assert logger.flush()
+        assert (tmp_path / "u_s.log").read_text() == "Response: ... [500 more chars]\n"
+
+    def test_full_queue_drops_instead_of_blocking(self, make_logger):
+        logger = make_logger(queue_size=1)
+        logger.close()  # Writer stopped, so the queue can't drain
+        logger.log("u", "s", "one")
+        logger.log("u", "s", "two")
+        assert logger.stats["dropped"] == 1
+
+
+@pytest.mark.slow
+def test_request_path_cost(make_logger, tmp_path):
+    events, sessions = 20_000, 200
+    sync_dir = tmp_path / "sync"
+    sync_dir.mkdir()
+
+    start = time.perf_counter()
+    for i in range(events):
+        with open(sync_dir / f"u_{i % sessions}.log", "a") as f:
+            f.write(f"Processing message: {i}\n")
+    sync_us = (time.perf_counter() - start) / events * 1e6
+
+    logger = make_logger(shards=0)
+    start = time.perf_counter()
+    for i in range(events):
+        logger.log("u", str(i % sessions), f"Processing message: {i}")
+    queued_us = (time.perf_counter() - start) / events * 1e6
+    logger.flush(timeout=30)
+
+    print(
+        f"open-append-close: {sync_us:.1f} us/event, queued: {queued_us:.2f} us/event, "
+        f"{logger.stats['batches']} batches"
+    )
+    assert logger.stats["written"] == events
+    assert queued_us < sync_us
@@ -0,0 +1,122 @@
+import json
+import time
+import pytest
+import requests
+from agent.clients import FIELD_MASK_TIERS, tier_covers
+from agent.schemas import PlaceDetails
+from agent.tools.resolver import detail_tier
+from agent.tools.restaurants import RestaurantTool
+from tests.conftest import mock_place
+
+
+class TestDetailTier:
+    @pytest.mark.parametrize(
+        "text,tier",
+        [
+            ("What's the address of the second one?", "address"),
+            ("where is it", "address"),
+            ("When does Pizza Palace close?", "hours"),
+            ("is it open now and where is it", "hours"),
+            ("send me directions", "links"),
+            ("hours and a map link please", "full"),
+            ("tell me more about the first one", "full"),
+        ],
+    )
+    def test_tier_for_question(self, text, tier):
+        assert detail_tier(text) == tier
+
+    def test_tier_covers(self):
+        assert tier_covers("full", "hours")
+        assert tier_covers("hours", "address")
+        assert not tier_covers("address", "hours")
+        assert not tier_covers("links", "hours")
+
+
+class TestLazyPlaceDetails:
+    def test_nested_fields_validated_on_access(self):
+        details = PlaceDetails(**mock_place("places/1"))
+        assert details._parsed == {}
+        assert details.regularOpeningHours.periods[0].open.hour == 9
+        assert set(details._parsed) == {"regularOpeningHours"}
+
+    def test_invalid_nested_data_only_fails_when_read(self):
+        place = mock_place("places/1")
+        place["regularOpeningHours"] = {"openNow": "maybe"}
+        details = PlaceDetails(**place)
+        assert details.formattedAddress == "1 Main St"
+        with pytest.raises(Exception):
+            details.regularOpeningHours
+
+    def test_dump_matches_eager_shape(self):
+        dumped = PlaceDetails(**mock_place("places/1")).model_dump()
+        assert dumped["regularOpeningHours"]["openNow"] is True
+        assert dumped["googleMapsLinks"]["placeUri"].endswith("/placeUri")
+        assert dumped["regularSecondaryOpeningHours"] is None
+
+        address_only = PlaceDetails(
+            **{k: mock_place("places/2")[k] for k in ("name", "displayName", "formattedAddress")}
+        ).model_dump()
+        assert address_only["regularOpeningHours"] is None
+
+
+class TestRestaurantToolTiers:
+    def test_malformed_fields_are_rejected_at_fetch(self, mock_places_server, places_client, monkeypatch):
+        tool = RestaurantTool(places_client=places_client, prefetch_top_n=0)
+        tool.search_restaurants("pizza")
+        place = mock_place("places/1")
+        place["regularOpeningHours"] = {"openNow": "maybe"}
+        monkeypatch.setattr(places_client, "get_place_details", lambda place_id, mask=None: place)
+        monkeypatch.setattr(places_client, "get_place_details_many", lambda ids, **kwargs: {ids[0]: place})
+
+        assert tool.get_restaurant_details_by_index(0, tier="hours") is None
+        assert tool.get_restaurant_details_many(["places/1"], tier="full") == {}
+        # Fields outside the tier are dropped, not validated
+        address = tool.get_restaurant_details_by_index(0, tier="address")
+        assert address.model_dump()["regularOpeningHours"] is None
+
+    def test_address_then_hours_upgrades(self, mock_places_server, places_client):
+        tool = RestaurantTool(places_client=places_client, prefetch_top_n=0)
+        tool.search_restaurants("pizza")
+
+        details = tool.get_restaurant_details_by_index(1, tier="address")
+        assert details.formattedAddress == "1 Main St"
+        assert details.regularOpeningHours is None
+
+        # Address is covered by the cached entry; hours need a new fetch
+        tool.get_restaurant_details_by_index(1, tier="address")
+        assert len(mock_places_server.detail_requests) == 1
+        hours = tool.get_restaurant_details_by_index(1, tier="hours")
+        assert hours.regularOpeningHours.openNow is True
+        assert len(mock_places_server.detail_requests) == 2
+
+        # Hours details also answer a later address question
+        tool.get_restaurant_details_by_index(1, tier="address")
+        assert len(mock_places_server.detail_requests) == 2
+
+
+@pytest.mark.slow
+def test_payload_and_parse_cost_per_tier(mock_places_server):
+    rounds = 2000
+    session = requests.Session()
+    report = {}
+    for tier, mask in FIELD_MASK_TIERS.items():
+        response = session.get(
+            f"{mock_places_server.url}/places/1", headers={"X-Goog-FieldMask": mask}
+        )
+        body = response.content
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            PlaceDetails(**json.loads(body))
+        lazy_us = (time.perf_counter() - start) / rounds * 1e6
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            PlaceDetails(**json.loads(body)).model_dump()
+        eager_us = (time.perf_counter() - start) / rounds * 1e6
+
+        report[tier] = (len(body), lazy_us, eager_us)
+        print(f"{tier:8s} {len(body):5d} bytes  parse {lazy_us:6.1f} us  parse+dump {eager_us:6.1f} us")
+
+    assert report["address"][0] < report["hours"][0] < report["full"][0]
+    assert report["address"][1] < report["full"][2]
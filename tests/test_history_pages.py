@@ -0,0 +1,112 @@
+import time
+import pytest
+from agent.schemas import ConversationMessage, MessageRole
+from web.storage import build_history_index
+
+
+def fill(storage, count, session_id="s1"):
+    for i in range(count):
+        storage.save_message(
+            ConversationMessage(
+                session_id=session_id,
+                user_id="u1",
+                role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+                content=f"message {i} " + "é" * (i % 7),
+                timestamp=f"2024-01-01T00:00:{i % 60:02d}Z",
+            )
+        )
+
+
+def walk(storage, limit, session_id="s1"):
+    pages, before = [], None
+    while True:
+        page, before = storage.get_session_page("u1", session_id, limit, before)
+        pages.append([m.content for m in page])
+        if before is None:
+            return pages
+
+
+class TestHistoryPages:
+    def test_index_layout(self):
+        assert build_history_index(b"") == build_history_index(b"partial")
+        index = build_history_index(b'{"a": 1}\n{"b": 2}\n')
+        assert len(index) == 3 * 16  # Two entries and the trailer
+
+    def test_pages_walk_back_from_newest(self, gcs_storage):
+        fill(gcs_storage, 25)
+        pages = walk(gcs_storage, 10)
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert pages[0][0].startswith("message 15 ") and pages[0][-1].startswith("message 24 ")
+        everything = [m for page in reversed(pages) for m in page]
+        assert everything == [m.content for m in gcs_storage.get_session_messages("u1", "s1")]
+
+    def test_exact_multiple_and_short_sessions(self, gcs_storage):
+        fill(gcs_storage, 20)
+        assert [len(p) for p in walk(gcs_storage, 10)] == [10, 10]
+        fill(gcs_storage, 3, session_id="s2")
+        assert [len(p) for p in walk(gcs_storage, 10, session_id="s2")] == [3]
+        assert gcs_storage.get_session_page("u1", "missing", 10) == ([], None)
+
+    def test_lagging_index_still_returns_newest(self, gcs_storage):
+        fill(gcs_storage, 12)
+        bucket = gcs_storage.client.fake_bucket
+        stale = bucket.objects["sessions/u1/s1.idx"]
+        fill(gcs_storage, 3)  # Pretend these index writes were lost
+        bucket.objects["sessions/u1/s1.idx"] = stale
+        page, before = gcs_storage.get_session_page("u1", "s1", 5)
+        assert page[-1].content.startswith("message 2 ")  # The 15th message
+        assert before == 10
+        assert len(walk(gcs_storage, 5)[-1]) == 5
+
+    def test_unindexed_session_is_read_whole_then_indexed(self, gcs_storage):
+        fill(gcs_storage, 30)
+        bucket = gcs_storage.client.fake_bucket
+        del bucket.objects["sessions/u1/s1.idx"]
+        assert [len(p) for p in walk(gcs_storage, 8)] == [8, 8, 8, 6]
+        assert "sessions/u1/s1.idx" in bucket.objects
+
+    def test_corrupt_index_falls_back(self, gcs_storage):
+        fill(gcs_storage, 6)
+        bucket = gcs_storage.client.fake_bucket
+        bucket.objects["sessions/u1/s1.idx"] = (b"\x01" * 24, 1)
+        assert [len(p) for p in walk(gcs_storage, 4)] == [4, 2]
+
+    def test_delete_removes_index(self, gcs_storage):
+        fill(gcs_storage, 2)
+        assert gcs_storage.delete_session("u1", "s1")
+        assert list(gcs_storage.client.fake_bucket.objects) == ["sessions/u1/_index.json"]
+        assert gcs_storage.list_user_sessions("u1") == []
+
+
+@pytest.mark.slow
+def test_page_cost_is_independent_of_session_length(gcs_storage):
+    bucket = gcs_storage.client.fake_bucket
+    costs = {}
+    for count in (20, 5000):
+        session_id = f"s{count}"
+        # Build the file directly; saving 5,000 messages one by one is O(n^2)
+        lines = b"".join(
+            b'{"timestamp": "2024-01-01T00:00:00Z", "role": "user", "content": "message %d"}\n' % i
+            for i in range(count)
+        )
+        bucket.objects[f"sessions/u1/{session_id}.jsonl"] = (lines, 1)
+        bucket.objects[f"sessions/u1/{session_id}.idx"] = (build_history_index(lines), 1)
+
+        bucket.downloaded = 0
+        start = time.perf_counter()
+        for _ in range(200):
+            page, _ = gcs_storage.get_session_page("u1", session_id, 20)
+        page_us = (time.perf_counter() - start) / 200 * 1e6
+        page_bytes = bucket.downloaded / 200
+
+        bucket.downloaded = 0
+        gcs_storage.get_session_messages("u1", session_id)
+        costs[count] = (page_bytes, page_us, bucket.downloaded)
+        assert len(page) == 20
+
+    for count, (page_bytes, page_us, full_bytes) in costs.items():
+        print(
+            f"\n{count} messages: page {page_bytes:.0f} bytes in {page_us:.0f} us, "
+            f"full history {full_bytes} bytes"
+        )
+    assert costs[5000][0] <= costs[20][0] * 1.1
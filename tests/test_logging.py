@@ -0,0 +1,128 @@
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agent.log import (
+    configure_logging,
+    current_request_id,
+    flush_logging,
+    get_logger,
+    request_context,
+)
+from agent.tools.prefetch import DetailsPrefetcher, PrefetchStats
+from config import Config
+
+
+@pytest.fixture
+def capture():
+    stream = io.StringIO()
+    configure_logging(stream=stream, level="DEBUG", fmt="json")
+
+    def lines():
+        flush_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield lines
+    configure_logging()
+
+
+log = get_logger("tests")
+
+
+class TestStructLogger:
+    def test_fields_and_request_id(self, capture):
+        with request_context("req-1"):
+            log.info("restaurants_found", count=3, query="thai")
+        log.warning("no_request")
+
+        first, second = capture()
+        assert first["event"] == "restaurants_found"
+        assert first["level"] == "info" and first["logger"] == "jamie.tests"
+        assert first["request_id"] == "req-1"
+        assert first["count"] == 3 and first["query"] == "thai"
+        assert "request_id" not in second
+
+    def test_disabled_levels_are_not_rendered(self, capture):
+        configure_logging(stream=io.StringIO(), level="INFO")
+        calls = []
+        log.debug("context", context=lambda: calls.append(1))
+        assert calls == []
+
+    def test_fields_are_capped(self, capture, monkeypatch):
+        monkeypatch.setattr(Config, "LOG_MAX_FIELD_CHARS", 20)
+        log.info("big", place={"reviews": ["x" * 1000]}, text="y" * 30)
+        (line,) = capture()
+        assert line["place"].startswith('{"reviews": ["xxxxxx')
+        assert line["place"].endswith("more chars]") and len(line["place"]) < 60
+        assert line["text"] == "y" * 20 + "... [10 more chars]"
+
+    def test_sampling(self, capture, monkeypatch):
+        for _ in range(100):
+            log.info("never", sample=0.0)
+        monkeypatch.setattr(Config, "LOG_SAMPLE_RATES", '{"overridden": 0}')
+        log.info("overridden")
+        log.info("kept", sample=1.0)
+        assert [line["event"] for line in capture()] == ["kept"]
+
+    def test_invalid_sample_rates_are_reported(self, capture, monkeypatch, caplog):
+        monkeypatch.setattr(Config, "LOG_SAMPLE_RATES", "{not json")
+        log.info("kept")
+        assert [line["event"] for line in capture()] == ["kept"]
+        assert "Ignoring invalid LOG_SAMPLE_RATES" in caplog.text
+
+    def test_errors_include_traceback(self, capture):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.error("failed", exc_info=True)
+        (line,) = capture()
+        assert "ValueError: boom" in line["exc"]
+
+
+class TestRequestContext:
+    def test_nested_keeps_outer_id(self):
+        with request_context() as outer:
+            with request_context() as inner:
+                assert inner == outer
+            with request_context("explicit"):
+                assert current_request_id() == "explicit"
+        assert current_request_id() is None
+
+    def test_prefetch_threads_inherit_request_id(self):
+        seen = []
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            prefetcher = DetailsPrefetcher(
+                lambda place_id: seen.append(current_request_id()),
+                top_n=2,
+                executor=executor,
+                stats=PrefetchStats(),
+            )
+            with request_context("req-7"):
+                prefetcher.prefetch(["places/1", "places/2"])
+        assert seen == ["req-7", "req-7"]
+
+
+@pytest.mark.slow
+def test_info_logging_overhead():
+    # The log calls one restaurant search makes at INFO (debug calls are
+    # skipped); a real request spends >= 500 ms waiting on Gemini and Places
+    configure_logging(stream=io.StringIO(), level="INFO")
+    state = {"restaurants": [{"name": f"Place {i}", "location": "x" * 80} for i in range(5)]}
+    requests = 5000
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        with request_context():
+            log.info("intent_classified", intent="restaurant_search")
+            log.info("places_found", count=5, query_chars=40)
+            log.debug("places_query", query="thai food near me")
+            log.info("restaurants_found", count=5)
+            log.debug("generating_response", context=lambda: state)
+            log.info("response_ready", user_id="u1", response_chars=900)
+    logging_time = time.perf_counter() - start
+    configure_logging()
+
+    per_request_us = logging_time / requests * 1e6
+    print(f"INFO logging: {per_request_us:.1f} us/request ({per_request_us / 500_000:.4%} of 500 ms)")
+    assert per_request_us / 500_000 < 0.01
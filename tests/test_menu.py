@@ -0,0 +1,144 @@
+import json
+import random
+import time
+import pytest
+from agent.schemas import Meal
+from agent.tools.menu import MenuCatalog, _meal_from_record
+from agent.tools.order import OrderStore, OrderTool
+from agent.tools.restaurants import RestaurantTool
+
+MENUS = {
+    "places/0": [
+        {"name": "Pad Thai", "price": 13.5, "tags": ["vegetarian"]},
+        {"name": "Green Curry", "price": 16.0, "tags": ["vegan", "gluten free"]},
+        {"name": "Spring Rolls", "price": 7.0, "tags": ["vegan", "vegetarian"]},
+    ],
+    "places/1": [
+        {"name": "Salmon Nigiri", "price": 14.0, "tags": ["gluten-free"]},
+        {"name": "Avocado Roll", "price": 9.5, "tags": "vegetarian;vegan"},
+    ],
+    "places/9": [{"name": "Not In Results", "price": 1.0, "tags": ["vegetarian"]}],
+}
+
+
+@pytest.fixture
+def catalog():
+    return MenuCatalog(
+        _meal_from_record(meal, restaurant_id)
+        for restaurant_id, meals in MENUS.items()
+        for meal in meals
+    )
+
+
+class TestMenuCatalog:
+    def test_search_under_price_with_tag(self, catalog):
+        meals = catalog.search(["places/0", "places/1"], max_price=15, tags=["vegetarian"])
+        assert [m.name for m in meals] == ["Spring Rolls", "Avocado Roll", "Pad Thai"]
+
+    def test_tags_must_all_match_and_are_normalized(self, catalog):
+        meals = catalog.search(["places/0", "places/1"], tags=["Gluten Free"])
+        assert [m.name for m in meals] == ["Salmon Nigiri", "Green Curry"]
+        meals = catalog.search(["places/0"], tags=["vegan", "vegetarian"])
+        assert [m.name for m in meals] == ["Spring Rolls"]
+
+    def test_only_given_restaurants(self, catalog):
+        assert all(m.restaurant_id != "places/9" for m in catalog.search(["places/0", "places/1"], limit=50))
+        assert catalog.search(["places/unknown"]) == []
+
+    def test_find_meal_tolerates_case_and_typos(self, catalog):
+        assert catalog.find_meal("places/0", "pad thai").name == "Pad Thai"
+        assert catalog.find_meal("places/0", "Pad Tha").name == "Pad Thai"
+        assert catalog.find_meal("places/0", "lasagna") is None
+
+    def test_parse_filters(self, catalog):
+        assert catalog.parse_filters("thai under $15, vegetarian please") == {
+            "max_price": 15.0,
+            "tags": ["vegetarian"],
+        }
+        assert catalog.parse_filters("something gluten free") == {"tags": ["gluten-free"]}
+        assert catalog.parse_filters("thai food") == {}
+
+    @pytest.mark.parametrize("fmt", ["json", "grouped", "jsonl", "csv"])
+    def test_bulk_load_formats(self, tmp_path, fmt):
+        rows = [dict(meal, restaurant_id=rid) for rid, meals in MENUS.items() for meal in meals]
+        path = tmp_path / f"menus.{'json' if fmt == 'grouped' else fmt}"
+        if fmt == "json":
+            path.write_text(json.dumps(rows))
+        elif fmt == "grouped":
+            path.write_text(json.dumps(MENUS))
+        elif fmt == "jsonl":
+            path.write_text("\n".join(json.dumps(r) for r in rows))
+        else:
+            lines = ["restaurant_id,name,price,tags"]
+            for r in rows:
+                tags = r["tags"] if isinstance(r["tags"], str) else ";".join(r["tags"])
+                lines.append(f"{r['restaurant_id']},{r['name']},{r['price']},{tags}")
+            path.write_text("\n".join(lines))
+
+        catalog = MenuCatalog.load(str(path))
+        assert len(catalog) == 6
+        assert catalog.find_meal("places/1", "avocado roll").tags == ["vegan", "vegetarian"]
+
+
+class FakePlacesClient:
+    def search_place(self, query):
+        return [
+            {"name": f"places/{i}", "displayName": {"text": f"Place {i}"}, "formattedAddress": "x"}
+            for i in range(3)
+        ]
+
+    def get_place_details(self, place_id, field_mask=None):
+        return {}
+
+
+class TestOrderToolMenus:
+    @pytest.fixture
+    def tool(self, catalog, tmp_path):
+        restaurant_tool = RestaurantTool(places_client=FakePlacesClient(), prefetch_top_n=0)
+        restaurant_tool.search_restaurants("food")
+        return OrderTool(restaurant_tool, OrderStore(str(tmp_path / "orders.db")), catalog)
+
+    def test_menu_price_and_meal_id(self, tool):
+        order = tool.place_order("u1", "places/0", "green curry")
+        assert order.total_price == 16.0
+        assert order.meal_id == "places/0/green-curry"
+
+    def test_meal_must_be_on_menu(self, tool):
+        with pytest.raises(ValueError):
+            tool.place_order("u1", "places/0", "lasagna")
+
+    def test_restaurant_without_menu_falls_back(self, tool):
+        assert tool.place_order("u1", "places/2", "anything").total_price == 12.99
+
+    def test_find_meals_across_last_results(self, tool):
+        meals = tool.find_meals(max_price=10, tags=["vegetarian"])
+        assert [m.name for m in meals] == ["Spring Rolls", "Avocado Roll"]
+
+
+@pytest.mark.slow
+def test_menu_query_benchmark():
+    rng = random.Random(0)
+    tags = ["vegetarian", "vegan", "gluten-free", "halal", "spicy", "nut-free"]
+    meals = [
+        Meal(
+            id=f"places/{r}/{m}",
+            restaurant_id=f"places/{r}",
+            name=f"Meal {m}",
+            price=round(rng.uniform(5, 40), 2),
+            tags=sorted(rng.sample(tags, 2)),
+        )
+        for r in range(10_000)
+        for m in range(30)
+    ]
+    start = time.perf_counter()
+    catalog = MenuCatalog(meals)
+    build_s = time.perf_counter() - start
+
+    queries = 2000
+    start = time.perf_counter()
+    for i in range(queries):
+        ids = [f"places/{rng.randrange(10_000)}" for _ in range(5)]
+        catalog.search(ids, max_price=15, tags=["vegetarian"])
+    per_query_us = (time.perf_counter() - start) / queries * 1e6
+    print(f"300k meals: built in {build_s:.2f}s, {per_query_us:.1f} us per 5-restaurant query")
+    assert per_query_us < 1000
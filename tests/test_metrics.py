@@ -0,0 +1,141 @@
+import threading
+import time
+import pytest
+from agent.metrics import (
+    EXTERNAL_LATENCY,
+    HTTP_IN_FLIGHT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    REGISTRY,
+    SQLITE_LATENCY,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    summarize,
+)
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+class TestMetrics:
+    def test_counter_is_exact_across_threads(self, registry):
+        counter = Counter("hits", "Hits", ["kind"], registry=registry)
+
+        def work():
+            for _ in range(50_000):
+                counter.inc(kind="a")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert counter.value(kind="a") == 400_000
+        # Exited threads are folded in and still counted
+        assert counter.value(kind="a") == 400_000
+        assert len(counter._shards._tables) <= 1
+
+    def test_gauge_inc_and_dec_on_different_threads(self, registry):
+        gauge = Gauge("in_flight", "In flight", registry=registry)
+        gauge.inc()
+        gauge.inc()
+        worker = threading.Thread(target=gauge.dec)
+        worker.start()
+        worker.join()
+        assert gauge.value() == 1
+
+    def test_histogram_render(self, registry):
+        histogram = Histogram("latency_seconds", "Latency", ["op"], buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, op="read")
+        text = registry.render()
+        assert "# TYPE latency_seconds histogram" in text
+        assert 'latency_seconds_bucket{op="read",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{op="read",le="1.0"} 2' in text
+        assert 'latency_seconds_bucket{op="read",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{op="read"} 3' in text
+        assert 'latency_seconds_sum{op="read"} 5.55' in text
+
+    def test_timer_records_outcome(self, registry):
+        histogram = Histogram("calls_seconds", "Calls", ["service", "outcome"], registry=registry)
+        with histogram.time(service="places"):
+            pass
+        with pytest.raises(ValueError):
+            with histogram.time(service="places"):
+                raise ValueError
+        with histogram.time(service="places") as timer:
+            timer.outcome = "shed"
+        snapshot = histogram.snapshot()
+        assert {key: cell[-1] for key, cell in snapshot.items()} == {
+            ("places", "ok"): 1,
+            ("places", "error"): 1,
+            ("places", "shed"): 1,
+        }
+
+    def test_collectors_and_label_escaping(self, registry):
+        registry.register_collector(
+            "cache", lambda: [("cache_hit_ratio", "gauge", "Hit ratio", [({"cache": 'a"b'}, 0.75)])]
+        )
+        registry.register_collector("broken", lambda: 1 / 0)
+        text = registry.render()
+        assert 'cache_hit_ratio{cache="a\\"b"} 0.75' in text
+        assert "# collector failed: ZeroDivisionError" in text
+
+    def test_summarize(self, registry):
+        histogram = Histogram("turn_seconds", "Turns", ["intent"], buckets=(0.1, 1.0, 10.0), registry=registry)
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, intent="restaurant_search")
+        summary = summarize(histogram, "intent")["restaurant_search"]
+        assert summary["count"] == 4
+        assert summary["p50_s"] == 1.0 and summary["p95_s"] == 10.0
+
+    def test_default_registry_exports_process_and_app_metrics(self):
+        text = REGISTRY.render()
+        for name in (
+            "http_requests_total",
+            "http_request_duration_seconds",
+            "external_call_duration_seconds",
+            "sqlite_query_duration_seconds",
+            "process_resident_memory_bytes",
+        ):
+            assert f"# TYPE {name}" in text or f"# HELP {name}" in text
+
+
+@pytest.mark.slow
+def test_instrumentation_overhead():
+    # The metric updates one /chat restaurant search makes: HTTP counters
+    # and latency, the in-flight gauge, an agent turn, three Gemini calls,
+    # a Places search and a GCS read plus two writes
+    requests = 20_000
+    start = time.perf_counter()
+    for _ in range(requests):
+        HTTP_IN_FLIGHT.inc()
+        for _ in range(3):
+            with EXTERNAL_LATENCY.time(service="gemini", operation="generate"):
+                pass
+        with EXTERNAL_LATENCY.time(service="places", operation="search"):
+            pass
+        for operation in ("read", "save", "save"):
+            with EXTERNAL_LATENCY.time(service="gcs", operation=operation):
+                pass
+        with SQLITE_LATENCY.time(db="places_cache", operation="get"):
+            pass
+        HTTP_IN_FLIGHT.dec()
+        HTTP_REQUESTS.inc(endpoint="/chat", method="POST", status=200)
+        HTTP_LATENCY.observe(0.8, endpoint="/chat", method="POST")
+    per_request_us = (time.perf_counter() - start) / requests * 1e6
+
+    start = time.perf_counter()
+    REGISTRY.render()
+    scrape_ms = (time.perf_counter() - start) * 1000
+
+    # A /chat turn spends >= 500 ms in Gemini alone
+    print(
+        f"instrumentation: {per_request_us:.1f} us/request "
+        f"({per_request_us / 500_000:.4%} of 500 ms), scrape {scrape_ms:.2f} ms"
+    )
+    assert per_request_us / 500_000 < 0.001
@@ -0,0 +1,134 @@
+import io
+import json
+import sqlite3
+import time
+import pytest
+from pathlib import Path
+from scripts import migrate_db
+
+RECIPES_JSON = Path(__file__).parent.parent / "src" / "data" / "recipes.json"
+
+
+def make_recipe(i, title=None):
+    return {
+        "id": f"recipe_{i:07d}",
+        "title": title or f"Recipe {i}",
+        "ingredients": [{"name": f"ingredient {i % 97}", "quantity": 1, "unit": "cup"}, "salt"],
+        "instructions": ["Mix", "Cook"],
+        "prep_time": i % 30,
+        "cook_time": 20,
+        "difficulty": "easy",
+        "servings": 2,
+        "tags": ["quick"],
+    }
+
+
+def recipe_titles(db_path):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return dict(conn.execute("SELECT id, title FROM recipes"))
+    finally:
+        conn.close()
+
+
+class TestStreaming:
+    def test_json_array_across_chunks(self):
+        recipes = json.loads(RECIPES_JSON.read_text())
+        parsed = list(migrate_db._iter_json_array(io.StringIO(RECIPES_JSON.read_text()), chunk_size=7))
+        assert parsed == recipes
+
+    def test_rejects_truncated_array(self):
+        with pytest.raises(ValueError):
+            list(migrate_db._iter_json_array(io.StringIO('[{"id": 1}, {"id"'), chunk_size=4))
+
+    def test_jsonl_input(self, tmp_path):
+        source = tmp_path / "recipes.jsonl"
+        source.write_text("\n".join(json.dumps(make_recipe(i)) for i in range(10)) + "\n")
+        migrate_db.migrate_recipes(source, tmp_path / "r.db", batch_size=3, build_vectors=False)
+        assert len(recipe_titles(tmp_path / "r.db")) == 10
+
+    def test_indexes_built_after_load(self, tmp_path):
+        migrate_db.migrate_recipes(RECIPES_JSON, tmp_path / "r.db")
+        conn = sqlite3.connect(str(tmp_path / "r.db"))
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        assert set(migrate_db.INDEXES) <= names
+
+
+class TestIncremental:
+    def test_upserts_only_changes(self, tmp_path):
+        source = tmp_path / "recipes.jsonl"
+        db_path = tmp_path / "r.db"
+        source.write_text("\n".join(json.dumps(make_recipe(i)) for i in range(5)))
+        migrate_db.migrate_recipes(source, db_path, build_vectors=False)
+
+        recipes = [make_recipe(i) for i in range(1, 5)]
+        recipes[0]["title"] = "Renamed"
+        recipes.append(make_recipe(99))
+        source.write_text("\n".join(json.dumps(r) for r in recipes))
+        stats = migrate_db.migrate_recipes(source, db_path, incremental=True, build_vectors=False)
+
+        assert stats == {"inserted": 1, "updated": 1, "unchanged": 3, "deleted": 1}
+        titles = recipe_titles(db_path)
+        assert titles["recipe_0000001"] == "Renamed"
+        assert "recipe_0000000" not in titles
+        assert "recipe_0000099" in titles
+
+    def test_updates_bitsets_of_changed_recipes_only(self, tmp_path, monkeypatch):
+        source = tmp_path / "recipes.jsonl"
+        db_path = tmp_path / "r.db"
+        source.write_text("\n".join(json.dumps(make_recipe(i)) for i in range(5)))
+        migrate_db.migrate_recipes(source, db_path)
+
+        recipes = [make_recipe(i) for i in range(5)]
+        recipes[2]["ingredients"].append("saffron")
+        source.write_text("\n".join(json.dumps(r) for r in recipes))
+        relaxed = []
+        monkeypatch.setattr(migrate_db, "_relax_pragmas", lambda conn, durable: relaxed.append(durable))
+        migrate_db.migrate_recipes(source, db_path, incremental=True)
+        # The live database keeps its journal and fsyncs
+        assert relaxed == [True]
+
+        conn = sqlite3.connect(str(db_path))
+        vocab = dict(conn.execute("SELECT name, id FROM ingredient_vocab"))
+        bits = {r: int.from_bytes(b, "little") for r, b in conn.execute(
+            "SELECT recipe_id, bits FROM recipe_ingredient_bits"
+        )}
+        conn.close()
+        assert len(bits) == 5
+        assert bits["recipe_0000002"] >> vocab["saffron"] & 1
+        assert not any(b >> vocab["saffron"] & 1 for r, b in bits.items() if r != "recipe_0000002")
+
+    def test_noop_rerun(self, tmp_path):
+        db_path = tmp_path / "r.db"
+        migrate_db.migrate_recipes(RECIPES_JSON, db_path)
+        stats = migrate_db.migrate_recipes(RECIPES_JSON, db_path, incremental=True)
+        assert stats["unchanged"] == 15
+        assert stats["inserted"] == stats["updated"] == stats["deleted"] == 0
+
+    def test_failed_load_rolls_back(self, tmp_path):
+        source = tmp_path / "recipes.jsonl"
+        db_path = tmp_path / "r.db"
+        source.write_text(json.dumps(make_recipe(1)))
+        migrate_db.migrate_recipes(source, db_path, build_vectors=False)
+
+        broken = make_recipe(2)
+        del broken["title"]
+        source.write_text(json.dumps(make_recipe(1, "Changed")) + "\n" + json.dumps(broken))
+        with pytest.raises(KeyError):
+            migrate_db.migrate_recipes(source, db_path, incremental=True, build_vectors=False)
+        assert recipe_titles(db_path) == {"recipe_0000001": "Recipe 1"}
+
+
+@pytest.mark.slow
+def test_bulk_load_benchmark(tmp_path):
+    n = 200_000
+    source = tmp_path / "recipes.jsonl"
+    with open(source, "w") as f:
+        for i in range(n):
+            f.write(json.dumps(make_recipe(i)) + "\n")
+
+    start = time.perf_counter()
+    migrate_db.migrate_recipes(source, tmp_path / "r.db", build_vectors=False)
+    elapsed = time.perf_counter() - start
+    print(f"\n{n} recipes in {elapsed:.1f}s ({n / elapsed:,.0f} recipes/s)")
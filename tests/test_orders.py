@@ -0,0 +1,164 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agent.graph import JamieAgent
+from agent.schemas import ConversationMessage, MessageRole, SessionState
+from agent.tools.order import OrderStore, OrderTool
+from agent.tools.restaurants import RestaurantTool
+
+
+class FakePlacesClient:
+    def search_place(self, query):
+        return [
+            {
+                "name": f"places/{i}",
+                "displayName": {"text": name, "languageCode": "en"},
+                "formattedAddress": f"{i} Main St",
+                "priceLevel": level,
+            }
+            for i, (name, level) in enumerate(
+                [("Thai Basil", "PRICE_LEVEL_INEXPENSIVE"), ("Sakura Sushi", "PRICE_LEVEL_EXPENSIVE")]
+            )
+        ]
+
+    def get_place_details(self, place_id, field_mask=None):
+        return {}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OrderStore(str(tmp_path / "orders.db"))
+
+
+@pytest.fixture
+def order_tool(store):
+    restaurant_tool = RestaurantTool(places_client=FakePlacesClient(), prefetch_top_n=0)
+    restaurant_tool.search_restaurants("food")
+    return OrderTool(restaurant_tool, store)
+
+
+class TestOrderStore:
+    def test_create_and_lookup(self, store):
+        order, created = store.create("u1", "places/0", "pad thai", 8.99, restaurant_name="Thai Basil")
+        assert created
+        assert store.get(order.id) == order
+        assert order.user_id == "u1" and order.status == "confirmed"
+        assert store.get("missing") is None
+
+    def test_idempotency_key_replays_original(self, store):
+        first, created = store.create("u1", "places/0", "pad thai", 8.99, idempotency_key="k1")
+        again, created_again = store.create("u1", "places/0", "pad thai", 8.99, idempotency_key="k1")
+        assert created and not created_again
+        assert again.id == first.id
+        # Keys are scoped to the user
+        other, created_other = store.create("u2", "places/0", "pad thai", 8.99, idempotency_key="k1")
+        assert created_other and other.id != first.id
+
+    def test_concurrent_retries_create_one_order(self, store):
+        barrier = threading.Barrier(16)
+
+        def place(i):
+            barrier.wait()
+            return store.create("u1", "places/0", "pad thai", 8.99, idempotency_key="retry")[0].id
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            ids = set(pool.map(place, range(16)))
+        assert len(ids) == 1
+        assert len(store.list_for_user("u1")) == 1
+
+    def test_orders_survive_restart(self, tmp_path):
+        path = str(tmp_path / "orders.db")
+        order, _ = OrderStore(path).create("u1", "places/0", "pad thai", 8.99)
+        assert OrderStore(path).get(order.id) == order
+
+    def test_list_for_user_newest_first(self, store):
+        ids = [store.create("u1", "places/0", f"meal {i}", 8.99)[0].id for i in range(3)]
+        store.create("u2", "places/0", "other", 8.99)
+        assert [o.id for o in store.list_for_user("u1")] == ids[::-1]
+        assert store.update_status(ids[0], "delivered").status == "delivered"
+
+
+class TestOrderTool:
+    def test_place_order_prices_by_level(self, order_tool):
+        order = order_tool.place_order("u1", "places/1", "salmon nigiri", idempotency_key="a")
+        assert order.restaurant_name == "Sakura Sushi"
+        assert order.total_price == 24.99
+        assert order_tool.get_order_status(order.id) == order
+        assert order_tool.get_user_orders("u1") == [order]
+
+    def test_unknown_restaurant(self, order_tool):
+        with pytest.raises(ValueError):
+            order_tool.place_order("u1", "places/99", "anything")
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def generate_response(self, prompt, system_prompt=None):
+        return self.reply
+
+
+class TestPlaceOrderNode:
+    def make_agent(self, order_tool, reply):
+        agent = JamieAgent.__new__(JamieAgent)
+        agent.llm_client = FakeLLM(reply)
+        agent.restaurant_tool = order_tool.restaurant_tool
+        agent.order_tool = order_tool
+        return agent
+
+    def state(self, text, idempotency_key=None, earlier=0):
+        messages = [
+            ConversationMessage(
+                session_id="s1", user_id="u1", role=MessageRole.USER, content=content, timestamp="t"
+            )
+            for content in [text] * earlier + [text]
+        ]
+        return SessionState(
+            user_id="u1", session_id="s1", messages=messages, idempotency_key=idempotency_key
+        )
+
+    def test_node_places_order_once_per_key(self, order_tool):
+        agent = self.make_agent(order_tool, '{"restaurant_index": null, "meal": "pad thai"}')
+
+        state = agent._place_order(self.state("order the pad thai from the first one", "req-1"))
+        assert state.context["order"]["restaurant_name"] == "Thai Basil"
+        assert state.context["tools_used"] == ["OrderTool.place_order"]
+
+        # The client retried after a timeout: the first attempt's messages are
+        # in the history now, but the key is the same, so no second order
+        retried = agent._place_order(
+            self.state("order the pad thai from the first one", "req-1", earlier=2)
+        )
+        assert retried.context["order"]["id"] == state.context["order"]["id"]
+        assert len(order_tool.get_user_orders("u1")) == 1
+
+        # A new request (new key) is a new order
+        again = agent._place_order(self.state("order the pad thai from the first one", "req-2"))
+        assert again.context["order"]["id"] != state.context["order"]["id"]
+        assert len(order_tool.get_user_orders("u1")) == 2
+
+    def test_node_asks_when_meal_missing(self, order_tool):
+        agent = self.make_agent(order_tool, "not json")
+        state = agent._place_order(self.state("order from the second one"))
+        assert "order" not in state.context
+        assert "order_error" in state.context
+
+
+@pytest.mark.slow
+def test_concurrent_placement_throughput(store):
+    workers, per_worker = 8, 500
+
+    def place(worker):
+        for i in range(per_worker):
+            store.create(f"user{worker}", "places/0", "pad thai", 8.99, idempotency_key=f"{worker}-{i}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(place, range(workers)))
+    elapsed = time.perf_counter() - start
+
+    total = workers * per_worker
+    print(f"{total} orders from {workers} threads: {total / elapsed:.0f} orders/s")
+    assert len(store.list_for_user("user0", limit=per_worker + 1)) == per_worker
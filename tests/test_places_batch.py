@@ -0,0 +1,68 @@
+import time
+from agent.tools.restaurants import RestaurantTool
+
+
+class TestPlaceDetailsMany:
+    def test_fetches_concurrently_over_pooled_connections(self, mock_places_server, places_client):
+        mock_places_server.latency = 0.2
+        ids = [f"places/{i}" for i in range(6)]
+
+        start = time.perf_counter()
+        results = places_client.get_place_details_many(ids)
+        elapsed = time.perf_counter() - start
+
+        assert list(results) == ids
+        # Six 200 ms calls in parallel, not 1.2 s in series
+        assert elapsed < 0.6
+        assert mock_places_server.connections <= 6
+
+        # A second batch reuses the keep-alive connections
+        places_client.get_place_details_many([f"places/{i}" for i in range(10, 16)])
+        assert mock_places_server.connections <= 6
+
+    def test_deduplicates_ids(self, mock_places_server, places_client):
+        results = places_client.get_place_details_many(["places/1", "places/2", "places/1"])
+        assert list(results) == ["places/1", "places/2"]
+        assert sorted(mock_places_server.detail_requests) == ["places/1", "places/2"]
+
+    def test_field_mask_is_sent(self, places_client):
+        results = places_client.get_place_details_many(
+            ["places/1", "places/2"], field_mask="name,displayName"
+        )
+        assert results["places/1"] == {"name": "places/1", "displayName": {"text": "Place 1", "languageCode": "en"}}
+        # The narrow response is cached apart from full details
+        assert "formattedAddress" in places_client.get_place_details("places/1")
+
+    def test_deadline_returns_partial_results(self, mock_places_server, places_client):
+        mock_places_server.latency = 0.01
+        mock_places_server.delays = {"places/slow": 2.0}
+
+        start = time.perf_counter()
+        results = places_client.get_place_details_many(
+            ["places/1", "places/slow", "places/2"], deadline=0.3
+        )
+        assert time.perf_counter() - start < 1.0
+        assert list(results) == ["places/1", "places/2"]
+
+    def test_failed_ids_are_left_out(self, mock_places_server, places_client):
+        mock_places_server.fail = {"places/2"}
+        results = places_client.get_place_details_many(["places/1", "places/2", "places/3"])
+        assert list(results) == ["places/1", "places/3"]
+
+
+class TestRestaurantToolDetailsMany:
+    def test_compare_last_results(self, mock_places_server, places_client):
+        tool = RestaurantTool(places_client=places_client, prefetch_top_n=0)
+        tool.search_restaurants("pizza")
+        mock_places_server.latency = 0.2
+
+        start = time.perf_counter()
+        details = tool.get_restaurant_details_by_indices([0, 2, 4])
+        assert time.perf_counter() - start < 0.5
+        assert [d.name for d in details] == ["places/0", "places/2", "places/4"]
+
+        # Now served from the session cache
+        requests_before = len(mock_places_server.detail_requests)
+        again = tool.get_restaurant_details_many(["places/2", "places/0"])
+        assert list(again) == ["places/2", "places/0"]
+        assert len(mock_places_server.detail_requests) == requests_before
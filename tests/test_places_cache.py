@@ -0,0 +1,197 @@
+import threading
+import pytest
+from datetime import datetime, timezone
+from agent.cache import DiskCache, TieredCache, normalize_query, recompute_open_now
+from agent.clients import PlacesCache, PlacesClient
+from agent.log import current_request_id, request_context
+from agent.rate_limit import PREFETCH, current_priority, request_priority
+from config import Config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def places_env(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(Config, "PLACES_API_KEY", "test")
+    monkeypatch.setattr(Config, "BASE_BUCKET", "test")
+
+
+class TestTieredCache:
+    def test_fresh_hit_and_expiry(self):
+        clock = FakeClock()
+        cache = TieredCache("t", ttl=10, clock=clock)
+        calls = []
+        fetch = lambda: calls.append(1) or {"v": len(calls)}
+        assert cache.get_or_fetch("k", fetch) == {"v": 1}
+        clock.now += 5
+        assert cache.get_or_fetch("k", fetch) == {"v": 1}
+        clock.now += 10
+        assert cache.get_or_fetch("k", fetch) == {"v": 2}
+        assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+    def test_stale_while_revalidate(self):
+        clock = FakeClock()
+        cache = TieredCache("t", ttl=10, stale_ttl=60, clock=clock)
+        cache.set("k", {"v": "old"})
+        clock.now += 30
+
+        release = threading.Event()
+        refreshed = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            refreshed.set()
+            return {"v": "new"}
+
+        assert cache.get_or_fetch("k", slow_fetch) == {"v": "old"}
+        assert cache.get_or_fetch("k", slow_fetch) == {"v": "old"}
+        assert cache.stats["refreshes"] == 1
+        release.set()
+        refreshed.wait(5)
+        for _ in range(100):
+            if not cache._refreshing:
+                break
+            threading.Event().wait(0.01)
+        assert cache.get_or_fetch("k", slow_fetch) == {"v": "new"}
+
+    def test_refresh_keeps_the_callers_context(self):
+        clock = FakeClock()
+        cache = TieredCache("t", ttl=10, stale_ttl=60, clock=clock)
+        cache.set("k", {"v": "old"})
+        clock.now += 30
+        seen = []
+        done = threading.Event()
+
+        def fetch():
+            seen.append((current_request_id(), current_priority()))
+            done.set()
+            return {"v": "new"}
+
+        with request_context("req-1"), request_priority(PREFETCH):
+            assert cache.get_or_fetch("k", fetch) == {"v": "old"}
+        assert done.wait(5)
+        assert seen == [("req-1", PREFETCH)]
+
+    def test_stats_are_exact_under_concurrency(self):
+        cache = TieredCache("t", ttl=10)
+        cache.set("k", {"v": 1})
+
+        def read():
+            for _ in range(2000):
+                cache.get_or_fetch("k", lambda: {"v": 2})
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cache.stats["hits"] == 16000
+
+    def test_empty_results_not_cached(self):
+        cache = TieredCache("t", ttl=10)
+        calls = []
+        cache.get_or_fetch("k", lambda: calls.append(1) or {})
+        cache.get_or_fetch("k", lambda: calls.append(1) or {})
+        assert len(calls) == 2
+
+    def test_disk_tier_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        first = TieredCache("t", ttl=60, disk=DiskCache(path))
+        first.get_or_fetch("k", lambda: ["a"])
+        second = TieredCache("t", ttl=60, disk=DiskCache(path))
+        assert second.get_or_fetch("k", lambda: ["b"]) == ["a"]
+        assert second.stats["disk_hits"] == 1
+
+    def test_expired_disk_entries_are_purged(self, tmp_path):
+        clock = FakeClock()
+        disk = DiskCache(str(tmp_path / "cache.db"))
+        cache = TieredCache("t", ttl=10, stale_ttl=20, disk=disk, clock=clock, purge_interval=100)
+        other = TieredCache("other", ttl=10, disk=disk, clock=clock)
+        cache.set("old", ["a"])
+        other.set("kept", ["b"])
+        clock.now += 31
+        cache.set("fresh", ["c"])  # Within the interval of the purge at the first write
+        assert disk.get("t", "old") is not None
+        clock.now += 100
+        cache.set("newer", ["d"])
+        assert cache.stats["purged"] == 2
+        assert disk.get("t", "old") is None and disk.get("t", "fresh") is None
+        assert disk.get("t", "newer") is not None
+        # Other namespaces are purged by their own cache
+        assert disk.get("other", "kept") is not None
+
+    def test_lru_bound(self):
+        cache = TieredCache("t", ttl=60, max_entries=2)
+        for key in "abc":
+            cache.set(key, [key])
+        assert list(cache._memory) == ["b", "c"]
+
+
+def test_normalize_query():
+    assert normalize_query("Pizza  near Downtown!") == normalize_query("pizza near downtown")
+    assert normalize_query("$$ sushi") == "$$ sushi"
+
+
+class TestOpenNow:
+    DETAILS = {
+        "utcOffsetMinutes": -240,
+        "regularOpeningHours": {
+            "openNow": True,
+            "periods": [
+                # Monday 11:00-22:00 and Friday 18:00 to Saturday 02:00
+                {"open": {"day": 1, "hour": 11, "minute": 0}, "close": {"day": 1, "hour": 22, "minute": 0}},
+                {"open": {"day": 5, "hour": 18, "minute": 0}, "close": {"day": 6, "hour": 2, "minute": 0}},
+            ],
+        },
+    }
+
+    def at(self, *args):
+        # Times are given in UTC; the place is UTC-4
+        return recompute_open_now(self.DETAILS, datetime(*args, tzinfo=timezone.utc))
+
+    def test_open_and_closed(self):
+        # 2026-10-19 is a Monday
+        assert self.at(2026, 10, 19, 16, 0)["regularOpeningHours"]["openNow"] is True
+        assert self.at(2026, 10, 20, 3, 0)["regularOpeningHours"]["openNow"] is False
+
+    def test_overnight_period(self):
+        # Saturday 01:30 local
+        assert self.at(2026, 10, 24, 5, 30)["regularOpeningHours"]["openNow"] is True
+
+    def test_does_not_mutate_cached_value(self):
+        self.at(2026, 10, 20, 3, 0)
+        assert self.DETAILS["regularOpeningHours"]["openNow"] is True
+
+    def test_without_offset_is_unchanged(self):
+        details = {"regularOpeningHours": {"openNow": True, "periods": []}}
+        assert recompute_open_now(details) is details
+
+
+class TestPlacesClientCache:
+    def test_search_and_details_cached(self, places_env, monkeypatch):
+        client = PlacesClient(cache=PlacesCache())
+        calls = {"search": 0, "details": 0}
+
+        def fake_search(query):
+            calls["search"] += 1
+            return [{"name": "places/1"}]
+
+        def fake_details(place_id):
+            calls["details"] += 1
+            return {"name": place_id}
+
+        monkeypatch.setattr(client, "_search_place", fake_search)
+        monkeypatch.setattr(client, "_get_place_details", fake_details)
+
+        client.search_place("Pizza near downtown")
+        client.search_place("pizza near  downtown.")
+        client.get_place_details("places/1")
+        client.get_place_details("places/1")
+        assert calls == {"search": 1, "details": 1}
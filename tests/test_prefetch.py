@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agent.tools.prefetch import DetailsPrefetcher, PrefetchStats
+from agent.tools.restaurants import RestaurantTool
+
+
+def place(i):
+    return {
+        "name": f"places/{i}",
+        "displayName": {"text": f"Place {i}", "languageCode": "en"},
+        "formattedAddress": f"{i} Main St",
+    }
+
+
+class FakePlacesClient:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.detail_calls = []
+        self._lock = threading.Lock()
+
+    def search_place(self, query):
+        return [place(i) for i in range(6)]
+
+    def get_place_details(self, place_id):
+        with self._lock:
+            self.detail_calls.append(place_id)
+        time.sleep(self.latency)
+        return place(int(place_id.split("/")[1]))
+
+
+def make_tool(top_n=3, latency=0.05):
+    client = FakePlacesClient(latency)
+    tool = RestaurantTool(places_client=client, prefetch_top_n=top_n)
+    tool.prefetcher.executor = ThreadPoolExecutor(max_workers=3)
+    tool.prefetcher.stats = PrefetchStats()
+    return tool, client
+
+
+class TestDetailsPrefetch:
+    def test_disabled_by_default(self):
+        tool = RestaurantTool(places_client=FakePlacesClient(), prefetch_top_n=0)
+        assert tool.prefetcher is None
+
+    def test_follow_up_is_warm(self):
+        tool, client = make_tool(latency=0.2)
+        tool.search_restaurants("thai")
+        time.sleep(0.3)
+
+        start = time.perf_counter()
+        details = tool.get_restaurant_details_by_index(1)
+        assert time.perf_counter() - start < 0.1
+        assert details.displayName.text == "Place 1"
+        assert sorted(client.detail_calls) == ["places/0", "places/1", "places/2"]
+        assert tool.prefetcher.stats.snapshot()["hits"] == 1
+
+    def test_session_cache_serves_repeats(self):
+        tool, client = make_tool(top_n=1)
+        tool.search_restaurants("thai")
+        tool.get_restaurant_details("places/0")
+        tool.get_restaurant_details("places/0")
+        assert client.detail_calls == ["places/0"]
+
+    def test_miss_and_wasted_counters(self):
+        tool, _ = make_tool(top_n=2)
+        tool.search_restaurants("thai")
+        tool.get_restaurant_details("places/4")
+        tool.search_restaurants("sushi")
+        stats = tool.prefetcher.stats.snapshot()
+        assert stats["misses"] == 1
+        assert stats["wasted"] == 2
+        assert stats["issued"] == 4
+
+    def test_failed_prefetch_falls_back(self):
+        stats = PrefetchStats()
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def broken(place_id):
+            raise RuntimeError("boom")
+
+        prefetcher = DetailsPrefetcher(broken, 1, executor=executor, stats=stats)
+        tool = RestaurantTool(places_client=FakePlacesClient(0), prefetch_top_n=1)
+        tool.prefetcher = prefetcher
+        tool.search_restaurants("thai")
+        assert tool.get_restaurant_details("places/0").name == "places/0"
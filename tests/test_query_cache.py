@@ -0,0 +1,149 @@
+import json
+import time
+import pytest
+from pathlib import Path
+from agent.tools.query_cache import (
+    PLAN_CACHE,
+    RESULT_CACHE,
+    QueryPlanCache,
+    ResultCache,
+    SearchCriteria,
+)
+from agent.tools.recipes import RecipeTool
+from scripts import migrate_db
+
+RECIPES_JSON = Path(__file__).parent.parent / "src" / "data" / "recipes.json"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "test_recipes.db"
+    migrate_db.migrate_recipes(RECIPES_JSON, path)
+    RESULT_CACHE.clear()
+    return path
+
+
+class TestSearchCriteria:
+    def test_canonical_key(self):
+        a = SearchCriteria(ingredients=["Garlic", "chicken", "garlic "], tags=["Quick"])
+        b = SearchCriteria(ingredients=[{"name": "chicken"}, "garlic"], tags=["quick"])
+        assert a.key == b.key
+        assert a.ingredients == ("chicken", "garlic")
+
+    def test_shape_ignores_values(self):
+        a = SearchCriteria(ingredients=["chicken"], difficulty="easy")
+        b = SearchCriteria(ingredients=["beef"], difficulty="hard")
+        assert a.shape == b.shape
+        assert a.shape != SearchCriteria(ingredients=["beef", "rice"]).shape
+
+    def test_params_match_placeholders(self):
+        criteria = SearchCriteria(
+            recipe_title="Soup",
+            ingredients=["onion", "beef"],
+            excluded_ingredients=["nuts"],
+            max_total_time=60,
+            difficulty="easy",
+        )
+        sql = QueryPlanCache().get(criteria.shape)
+        assert sql.count("?") == len(criteria.params())
+        assert criteria.params() == ("soup", "beef", "onion", "nuts", 60, "easy")
+
+
+class TestResultCache:
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("a", ["1"])
+        cache.put("b", ["2"])
+        cache.get("a")
+        cache.put("c", ["3"])
+        assert cache.get("b") is None
+        assert cache.get("a") == ["1"]
+        assert cache.hits == 2 and cache.misses == 1
+
+    def test_repeated_search_hits_cache(self, db_path):
+        first = RecipeTool(str(db_path)).search_recipes(ingredients=["garlic", "chicken"])
+        second = RecipeTool(str(db_path)).search_recipes(ingredients=["Chicken", "garlic"])
+        assert [r.id for r in first] == [r.id for r in second]
+        assert RESULT_CACHE.hits == 1
+
+    def test_candidates_are_read_without_full_rows(self, db_path, monkeypatch):
+        tool = RecipeTool(str(db_path))
+        queries = []
+        query = tool.store.query
+        monkeypatch.setattr(
+            tool.store, "query", lambda sql, params=(): queries.append((sql, params)) or query(sql, params)
+        )
+        results = tool.search_recipes(limit=3)  # No filters: every row is a candidate
+        assert len(results) == 3
+        candidates, winners = [sql for sql, _ in queries if "FROM recipes" in sql]
+        assert candidates.startswith("SELECT id, title, ingredients_text")
+        assert winners.startswith("SELECT *") and winners.count("?") == 3
+
+    def test_migration_invalidates(self, db_path, tmp_path):
+        tool = RecipeTool(str(db_path))
+        before = tool.search_recipes(recipe_title="carbonara")
+        assert before[0].title == "Classic Spaghetti Carbonara"
+
+        recipes = json.loads(RECIPES_JSON.read_text())
+        recipes[0]["title"] = "Weeknight Carbonara"
+        source = tmp_path / "recipes.json"
+        source.write_text(json.dumps(recipes))
+        migrate_db.migrate_recipes(source, db_path, incremental=True)
+
+        after = tool.search_recipes(recipe_title="carbonara")
+        assert after[0].title == "Weeknight Carbonara"
+        assert RESULT_CACHE.hits == 0
+
+    def test_tools_share_connection_and_indexes(self, db_path, tmp_path):
+        first, second = RecipeTool(str(db_path)), RecipeTool(str(db_path))
+        assert first.store is second.store
+        index = first._get_pantry_index()
+        assert second._get_pantry_index() is index
+        connection = first.store._conn
+
+        # A migration bumps db_version and the indexes are rebuilt once for everyone
+        recipes = json.loads(RECIPES_JSON.read_text())
+        recipes[0]["ingredients"].append("saffron")
+        source = tmp_path / "recipes.json"
+        source.write_text(json.dumps(recipes))
+        migrate_db.migrate_recipes(source, db_path, incremental=True)
+        rebuilt = second._get_pantry_index()
+        assert rebuilt is not index and first._get_pantry_index() is rebuilt
+        assert first.store._conn is connection
+
+
+@pytest.mark.slow
+def test_hot_criteria_benchmark(tmp_path):
+    source = tmp_path / "recipes.jsonl"
+    with open(source, "w") as f:
+        for i in range(20_000):
+            f.write(json.dumps({
+                "id": f"r{i:06d}",
+                "title": f"Recipe {i}",
+                "ingredients": [f"ingredient {i % 50}", f"ingredient {i % 7}", "salt"],
+                "instructions": ["Cook"],
+                "prep_time": i % 40,
+                "cook_time": 15,
+                "difficulty": ["easy", "medium", "hard"][i % 3],
+                "servings": 2 + i % 4,
+                "tags": [f"tag{i % 11}"],
+            }) + "\n")
+    db_path = tmp_path / "bench.db"
+    migrate_db.migrate_recipes(source, db_path, build_vectors=False)
+    tool = RecipeTool(str(db_path))
+    hot = dict(ingredients=["ingredient 3", "ingredient 5"], max_total_time=45, tags=["tag2"])
+
+    RESULT_CACHE.clear()
+    start = time.perf_counter()
+    for _ in range(50):
+        RESULT_CACHE.clear()
+        tool.search_recipes(**hot)
+    cold = (time.perf_counter() - start) / 50
+
+    start = time.perf_counter()
+    for _ in range(50):
+        tool.search_recipes(**hot)
+    warm = (time.perf_counter() - start) / 50
+
+    print(f"\ncold {cold * 1000:.2f} ms/search, cached {warm * 1000:.2f} ms/search ({cold / warm:.0f}x)")
+    assert warm * 5 < cold
@@ -0,0 +1,166 @@
+import pytest
+from pathlib import Path
+from agent.tools import ranking
+from agent.tools.ranking import CursorStore, RecipeScorer, RankedResults, top_k
+from agent.tools.recipes import RecipeTool
+
+
+def make_row(id, title, ingredients, tags="", prep=10, cook=10):
+    return {
+        "id": id,
+        "title": title,
+        "ingredients_text": ",".join(ingredients),
+        "tags": tags,
+        "prep_time": prep,
+        "cook_time": cook,
+    }
+
+
+ROWS = [
+    make_row("r1", "Chicken Curry", ["chicken", "curry paste", "rice"], "indian,spicy", 15, 30),
+    make_row("r2", "Garlic Chicken Pasta", ["chicken", "garlic", "pasta"], "italian", 10, 15),
+    make_row("r3", "Tomato Soup", ["tomato", "garlic", "onion"], "vegetarian,soup", 10, 25),
+    make_row("r4", "Lemon Chicken", ["chicken", "lemon", "garlic"], "quick", 5, 20),
+]
+
+
+class TestRecipeScorer:
+    def test_ingredient_overlap(self):
+        scorer = RecipeScorer(ingredients=["chicken", "garlic"])
+        assert scorer.ingredient_score(ROWS[1]) == 1.0
+        assert scorer.ingredient_score(ROWS[0]) == 0.5
+        assert scorer.ingredient_score(ROWS[2]) == 0.5
+
+    def test_title_match(self):
+        scorer = RecipeScorer(recipe_title="pasta chicken")
+        assert scorer.title_score(ROWS[1]) == pytest.approx(0.8)
+        assert RecipeScorer(recipe_title="tomato soup").title_score(ROWS[2]) == 1.0
+        assert scorer.title_score(ROWS[2]) == 0.0
+
+    def test_time_fit(self):
+        scorer = RecipeScorer(max_total_time=40)
+        assert scorer.time_score(ROWS[0]) == 0.0
+        assert scorer.time_score(ROWS[3]) > scorer.time_score(ROWS[2])
+
+    def test_scores_are_deterministic(self):
+        scorer = RecipeScorer(ingredients=["chicken", "garlic"], tags=["quick"])
+        first = [r["id"] for r, _ in top_k(ROWS, scorer, 4)]
+        second = [r["id"] for r, _ in top_k(list(reversed(ROWS)), scorer, 4)]
+        assert first == second == ["r4", "r2", "r1", "r3"]
+
+    def test_ties_break_on_id(self):
+        scorer = RecipeScorer()
+        assert [r["id"] for r, _ in top_k(ROWS, scorer, 2)] == ["r1", "r2"]
+
+    def test_ranked_results_pages_match_top_k(self):
+        scorer = RecipeScorer(ingredients=["garlic"], max_total_time=60)
+        ranked = RankedResults(ROWS, scorer)
+        paged = ranked.page(0, 3) + ranked.page(3, 3)
+        assert len(ranked) == 4
+        assert [i for i, _ in paged] == [r["id"] for r, _ in top_k(ROWS, scorer, 4)]
+        assert ranked.page(0, 3) == paged[:3]
+
+
+class TestCursorStore:
+    def test_pages_are_repeatable(self):
+        store = CursorStore()
+        cursor = store.put(RankedResults(ROWS, RecipeScorer()), 1)
+        page, next_cursor = store.read(cursor, 2)
+        assert [i for i, _ in page] == ["r2", "r3"]
+        assert store.read(cursor, 2) == (page, next_cursor)
+        assert store.read(next_cursor, 2)[1] is None
+        assert store.read("unknown:0", 2) is None and store.read(cursor + "x", 2) is None
+
+    def test_bounded_by_pairs_and_purged_by_ttl(self, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr(ranking.time, "monotonic", lambda: now[0])
+        store = CursorStore(max_pairs=8, ttl_seconds=10)
+        first = store.put(RankedResults(ROWS, RecipeScorer()), 0)
+        second = store.put(RankedResults(ROWS, RecipeScorer()), 0)
+        store.read(first, 1)  # Recently used, so second is evicted first
+        third = store.put(RankedResults(ROWS, RecipeScorer()), 0)
+        assert store.read(second, 1) is None
+        assert store.read(first, 1) is not None and store.read(third, 1) is not None
+
+        now[0] = 11
+        store.put(RankedResults(ROWS[:1], RecipeScorer()), 0)
+        assert store.read(first, 1) is None and store.read(third, 1) is None
+        assert store._pairs == 1
+
+
+class TestRankRecipes:
+    @pytest.fixture
+    def recipe_tool(self, tmp_path):
+        from scripts import migrate_db
+
+        db_path = tmp_path / "test_recipes.db"
+        migrate_db.migrate_recipes(
+            Path(__file__).parent.parent / "src" / "data" / "recipes.json", db_path
+        )
+        return RecipeTool(str(db_path))
+
+    def test_best_match_first(self, recipe_tool):
+        results = recipe_tool.search_recipes(recipe_title="carbonara")
+        assert "carbonara" in results[0].title.lower()
+
+        page = recipe_tool.rank_recipes(ingredients=["chicken", "garlic"], page_size=3)
+        assert page.scores == sorted(page.scores, reverse=True)
+
+    def test_cursor_pagination(self, recipe_tool):
+        everything = recipe_tool.rank_recipes(tags=["italian", "quick"], page_size=100)
+        first = recipe_tool.rank_recipes(tags=["italian", "quick"], page_size=2)
+        assert first.next_cursor is not None
+
+        seen = list(first.recipes)
+        cursor = first.next_cursor
+        while cursor:
+            page = recipe_tool.rank_recipes(cursor=cursor, page_size=2)
+            seen.extend(page.recipes)
+            cursor = page.next_cursor
+
+        assert [r.id for r in seen] == [r.id for r in everything.recipes]
+
+    def test_cursor_can_be_retried(self, recipe_tool):
+        first = recipe_tool.rank_recipes(page_size=1)
+        second = recipe_tool.rank_recipes(cursor=first.next_cursor)
+        # Another session (another tool) retrying the same "more" gets the same page
+        retried = RecipeTool(recipe_tool.db_path).rank_recipes(cursor=first.next_cursor)
+        assert retried == second
+        with pytest.raises(ValueError):
+            recipe_tool.rank_recipes(cursor="expired:1")
+
+
+class TestPantryMatch:
+    @pytest.fixture
+    def recipe_tool(self, tmp_path):
+        from scripts import migrate_db
+
+        db_path = tmp_path / "test_recipes.db"
+        migrate_db.migrate_recipes(
+            Path(__file__).parent.parent / "src" / "data" / "recipes.json", db_path
+        )
+        return RecipeTool(str(db_path))
+
+    def test_full_pantry_covers_recipe(self, recipe_tool):
+        carbonara = recipe_tool.get_recipe_by_id("recipe_001")
+        pantry = [ing.name for ing in carbonara.ingredients]
+        matches = recipe_tool.match_pantry(pantry, limit=3)
+        assert matches[0].recipe.id == "recipe_001"
+        assert matches[0].coverage == 1.0
+        assert matches[0].missing_ingredients == []
+
+    def test_partial_pantry_lists_missing(self, recipe_tool):
+        matches = recipe_tool.match_pantry(["Spaghetti", "egg", "garlic"], limit=15)
+        carbonara = next(m for m in matches if m.recipe.id == "recipe_001")
+        assert carbonara.coverage == pytest.approx(3 / 6)
+        assert "pancetta" in carbonara.missing_ingredients
+        assert "garlic" not in carbonara.missing_ingredients
+        coverages = [m.coverage for m in matches]
+        assert coverages == sorted(coverages, reverse=True)
+
+    def test_unknown_pantry(self, recipe_tool):
+        assert recipe_tool.match_pantry(["unobtainium"]) == []
+
+    def test_min_coverage(self, recipe_tool):
+        matches = recipe_tool.match_pantry(["garlic"], limit=15, min_coverage=0.5)
+        assert all(m.coverage >= 0.5 for m in matches)
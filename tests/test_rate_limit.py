@@ -0,0 +1,191 @@
+import multiprocessing
+import threading
+import time
+import pytest
+from agent.rate_limit import (
+    INTERACTIVE,
+    PREFETCH,
+    MemoryBucketStore,
+    PriorityRateLimiter,
+    RateLimitExceeded,
+    SqliteBucketStore,
+    TokenBucket,
+    current_priority,
+    limits_for_key,
+    request_priority,
+)
+from config import Config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket("k", rate=2, burst=3, clock=clock)
+        assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+        assert bucket.try_acquire() == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket.try_acquire() == 0
+        # Refill never exceeds the burst
+        clock.now += 100
+        assert [bucket.try_acquire() for _ in range(4)][-1] > 0
+
+    def test_penalize_blocks_for_retry_after(self):
+        clock = FakeClock()
+        bucket = TokenBucket("k", rate=10, burst=10, clock=clock)
+        bucket.penalize(2)
+        assert bucket.try_acquire() == pytest.approx(2.1)
+        clock.now += 2.1
+        assert bucket.try_acquire() == 0
+
+    def test_sqlite_store_shares_state(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "quota.db")
+        a = TokenBucket("k", rate=1, burst=2, store=SqliteBucketStore(path), clock=clock)
+        b = TokenBucket("k", rate=1, burst=2, store=SqliteBucketStore(path), clock=clock)
+        assert a.try_acquire() == 0
+        assert b.try_acquire() == 0
+        assert a.try_acquire() > 0
+
+
+class TestPriorityRateLimiter:
+    def test_interactive_served_before_queued_prefetches(self):
+        limiter = PriorityRateLimiter(TokenBucket("k", rate=20, burst=1))
+        limiter.acquire(INTERACTIVE)  # Empty the bucket
+        order = []
+        lock = threading.Lock()
+
+        def worker(priority, label):
+            limiter.acquire(priority, timeout=5)
+            with lock:
+                order.append(label)
+
+        threads = [threading.Thread(target=worker, args=(PREFETCH, f"p{i}")) for i in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.01)
+        interactive = threading.Thread(target=worker, args=(INTERACTIVE, "i"))
+        interactive.start()
+        for t in threads + [interactive]:
+            t.join()
+
+        # At most one prefetch was already at the head of the queue
+        assert order.index("i") <= 1
+
+    def test_sheds_after_deadline(self):
+        limiter = PriorityRateLimiter(TokenBucket("k", rate=1, burst=1))
+        limiter.acquire(INTERACTIVE)
+        start = time.monotonic()
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire(PREFETCH, timeout=0.1)
+        assert time.monotonic() - start < 0.5
+
+        snapshot = limiter.snapshot()
+        assert snapshot["prefetch"]["shed"] == 1
+        assert snapshot["interactive"]["acquired"] == 1
+        assert snapshot["queue_depth"] == 0
+
+    def test_slow_store_does_not_block_the_queue_lock(self):
+        class SlowStore:
+            def __init__(self):
+                self.inner = MemoryBucketStore()
+
+            def update(self, key, fn):
+                time.sleep(0.3)  # e.g. a BEGIN IMMEDIATE waiting on another process
+                return self.inner.update(key, fn)
+
+        limiter = PriorityRateLimiter(TokenBucket("k", rate=10, burst=10, store=SlowStore()))
+        thread = threading.Thread(target=limiter.acquire, args=(INTERACTIVE,))
+        thread.start()
+        time.sleep(0.05)
+        start = time.monotonic()
+        assert limiter.snapshot()["queue_depth"] == 1
+        assert time.monotonic() - start < 0.1
+        thread.join()
+        assert limiter.snapshot()["interactive"]["acquired"] == 1
+
+    def test_priority_from_context(self):
+        assert current_priority() == INTERACTIVE
+        with request_priority(PREFETCH):
+            assert current_priority() == PREFETCH
+        assert current_priority() == INTERACTIVE
+
+    def test_per_key_limits(self, monkeypatch):
+        monkeypatch.setattr(Config, "PLACES_RATE_LIMITS", '{"key-a": {"rate": 3, "burst": 6}}')
+        assert limits_for_key("key-a") == (3.0, 6.0)
+        assert limits_for_key("key-b") == (Config.PLACES_RATE, Config.PLACES_BURST)
+
+
+class TestPlacesClientLimiting:
+    def test_429_backs_off_the_bucket(self, mock_places_server, places_client):
+        mock_places_server.throttled = {"places/1"}
+        assert places_client.get_place_details("places/1") == {}
+        # Retry-After: 1 drained the shared bucket
+        assert places_client.limiter.bucket.try_acquire() > 0.5
+
+    def test_interactive_caller_does_not_join_a_shed_prefetch(self, places_client, monkeypatch):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fetch(place_id, field_mask=None):
+            calls.append(current_priority())
+            if current_priority() == PREFETCH:
+                started.set()
+                release.wait(5)
+                return {}  # Shed waiting for quota
+            return {"name": place_id}
+
+        monkeypatch.setattr(places_client, "_get_place_details", fetch)
+
+        def prefetch():
+            with request_priority(PREFETCH):
+                places_client.get_place_details("places/1")
+
+        thread = threading.Thread(target=prefetch)
+        thread.start()
+        started.wait(5)
+        try:
+            assert places_client.get_place_details("places/1") == {"name": "places/1"}
+        finally:
+            release.set()
+            thread.join()
+        assert calls == [PREFETCH, INTERACTIVE]
+
+    def test_shed_search_returns_empty_list(self, places_client):
+        places_client.limiter = PriorityRateLimiter(TokenBucket("k", rate=0.1, burst=0))
+        with request_priority(PREFETCH):
+            assert places_client._search_place("tacos") == []
+        assert places_client.limiter.snapshot()["prefetch"]["shed"] == 1
+
+
+def _drain(path, n, results):
+    limiter = PriorityRateLimiter(TokenBucket("shared", rate=50, burst=5, store=SqliteBucketStore(path)))
+    for _ in range(n):
+        limiter.acquire(INTERACTIVE, timeout=10)
+    results.put(time.time())
+
+
+@pytest.mark.slow
+def test_bucket_shared_across_processes(tmp_path):
+    path = str(tmp_path / "quota.db")
+    SqliteBucketStore(path)
+    results = multiprocessing.Queue()
+    start = time.time()
+    workers = [multiprocessing.Process(target=_drain, args=(path, 25, results)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    finished = max(results.get() for _ in workers)
+
+    # 50 requests at 50/s with a burst of 5 need at least 0.9s in total
+    elapsed = finished - start
+    print(f"2 processes x 25 requests at 50/s: {elapsed:.2f}s")
+    assert elapsed >= 0.85
@@ -0,0 +1,92 @@
+import pytest
+from agent.tools.resolver import RestaurantResolver, token_set_scores
+
+NAMES = [
+    "Pizza Palace",
+    "Thai Basil Kitchen",
+    "Sakura Sushi Bar",
+    "Joe's Burger Joint",
+    "La Taqueria",
+]
+DESCRIPTIONS = [
+    "Italian pizzeria with wood-fired pies",
+    "Authentic Thai curries and noodles",
+    "Japanese sushi and sashimi",
+    "Classic American burgers and fries",
+    "Mexican tacos and burritos",
+]
+
+# (utterance, last discussed index, expected index or None when ambiguous)
+CASES = [
+    ("what are the hours for the second one?", None, 1),
+    ("tell me more about the first one", None, 0),
+    ("how about the 3rd", None, 2),
+    ("is the fourth one open now?", None, 3),
+    ("what about option 5", None, 4),
+    ("details on number two please", None, 1),
+    ("what's the address of #3", None, 2),
+    ("hours for no. 2", None, 1),
+    ("is no 4 open?", None, 3),
+    ("tell me about the last one", None, 4),
+    ("what time does Pizza Palace close?", None, 0),
+    ("tell me about pizza palace", None, 0),
+    ("is sakura sushi bar any good", None, 2),
+    ("hours for Joe's Burger Joint", None, 3),
+    ("what about the taqueria", None, 4),
+    ("more info on thai basil", None, 1),
+    ("tell me about sakura", None, 2),
+    ("is the burger place open late", None, 3),
+    ("what are the hours at piza palace", None, 0),
+    ("does Thia Basil Kitchen deliver", None, 1),
+    ("that Thai place, where is it?", None, 1),
+    ("what about the mexican spot", None, 4),
+    ("the japanese one", None, 2),
+    ("what are its hours?", 2, 2),
+    ("where is that place?", 4, 4),
+    ("is it open now?", 0, 0),
+    ("what are its hours?", None, None),
+    ("tell me more", None, None),
+    ("the kitchen or the bar?", None, None),
+    ("what about the sixth one", None, None),
+    ("no one there is open?", None, None),
+]
+
+
+class TestRestaurantResolver:
+    @pytest.mark.parametrize("text,last_index,expected", CASES)
+    def test_cases(self, text, last_index, expected):
+        resolution = RestaurantResolver().resolve(text, NAMES, DESCRIPTIONS, last_index)
+        if expected is None:
+            assert not resolution.resolved, resolution
+        else:
+            assert resolution.resolved and resolution.index == expected, resolution
+
+    def test_accuracy(self):
+        resolver = RestaurantResolver()
+        correct = sum(
+            (r.index if r.resolved else None) == expected
+            for r, expected in (
+                (resolver.resolve(text, NAMES, DESCRIPTIONS, last), expected)
+                for text, last, expected in CASES
+            )
+        )
+        assert correct / len(CASES) >= 0.95
+
+    def test_longest_exact_mention_wins(self):
+        names = ["Thai Basil", "Thai Basil Express"]
+        assert RestaurantResolver().resolve("is Thai Basil Express open", names).index == 1
+
+    def test_single_result(self):
+        assert RestaurantResolver().resolve("what are the hours", ["Pizza Palace"]).index == 0
+
+    def test_match_name(self):
+        resolver = RestaurantResolver()
+        assert resolver.match_name("Sakura Sushi", NAMES) == 2
+        assert resolver.match_name("Pizza Palace Downtown", NAMES) == 0
+        assert resolver.match_name("Olive Garden", NAMES) is None
+
+
+def test_token_set_scores():
+    scores = token_set_scores("the kitchen", ["Thai Kitchen", "Soul Kitchen", "Sakura"])
+    assert scores == [0.5, 0.5, 0.0]
+    assert token_set_scores("sakura", ["Sakura Sushi Bar", ""]) == [1.0, 0.0]
@@ -0,0 +1,149 @@
+import random
+import sqlite3
+import time
+import pytest
+from pathlib import Path
+from agent.tools.semantic import HashingEmbedder, VectorIndex, build_vector_index, remove_stale_vector_files
+from agent.tools.recipes import RecipeTool
+
+WORDS = (
+    "chicken beef pork tofu salmon shrimp rice pasta noodle potato tomato onion "
+    "garlic ginger basil lemon lime chili curry soup stew salad taco pizza bread "
+    "cheese egg spinach mushroom pepper corn bean lentil coconut yogurt honey "
+    "italian mexican thai indian french greek quick healthy vegetarian spicy"
+).split()
+
+
+def synthetic_db(path, n, seed=3):
+    """A recipes table with n random recipes, indexed like migrate_db does"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE recipes (id TEXT PRIMARY KEY, title TEXT, ingredients_text TEXT, tags TEXT, difficulty TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO recipes VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                f"r{i:06d}",
+                " ".join(rng.sample(WORDS, 3)),
+                ",".join(rng.sample(WORDS, 6)),
+                ",".join(rng.sample(WORDS, 2)),
+                rng.choice(["easy", "medium", "hard"]),
+            )
+            for i in range(n)
+        ),
+    )
+    build_vector_index(conn, str(path))
+    conn.commit()
+    index = VectorIndex.load(conn, str(path))
+    conn.close()
+    return index
+
+
+def recall_at_k(index, queries, k, nprobe):
+    hits = total = 0
+    for q in queries:
+        truth = {r for r, _ in index.exact_search(q, k)}
+        found = {r for r, _ in index.search(q, k, nprobe=nprobe)}
+        hits += len(truth & found)
+        total += len(truth)
+    return hits / total
+
+
+class TestHashingEmbedder:
+    def test_deterministic_unit_vectors(self):
+        embedder = HashingEmbedder()
+        v = embedder.embed("Classic French Onion Soup")
+        assert v == embedder.embed("classic french onion soups")
+        assert sum(w * w for w in v.values()) == pytest.approx(1.0)
+        assert embedder.embed("") == {}
+
+    def test_concept_expansion(self):
+        embedder = HashingEmbedder()
+        cozy = embedder.embed("cozy winter dinner")
+        soup = embedder.embed("onion soup comfort food")
+        salad = embedder.embed("fresh greek salad")
+        dot = lambda a, b: sum(w * b.get(d, 0.0) for d, w in a.items())
+        assert dot(cozy, soup) > dot(cozy, salad)
+
+
+class TestSemanticSearch:
+    @pytest.fixture
+    def recipe_tool(self, tmp_path):
+        from scripts import migrate_db
+
+        db_path = tmp_path / "test_recipes.db"
+        migrate_db.migrate_recipes(
+            Path(__file__).parent.parent / "src" / "data" / "recipes.json", db_path, build_vectors=True
+        )
+        return RecipeTool(str(db_path))
+
+    def test_semantic_queries(self, recipe_tool):
+        assert recipe_tool.semantic_search("cozy winter soup")[0].id == "recipe_003"
+        summer = [r.title for r in recipe_tool.semantic_search("light summer dinner", 3)]
+        assert "Fresh Summer Gazpacho" in summer
+
+    def test_hybrid_respects_sql_filters(self, recipe_tool):
+        results = recipe_tool.semantic_search("cozy winter soup", difficulty="easy")
+        assert results
+        assert all(r.difficulty == "easy" for r in results)
+        assert recipe_tool.semantic_search("soup", tags=["no-such-tag"]) == []
+
+    def test_rebuild_leaves_mapped_index_intact(self, recipe_tool):
+        from scripts import migrate_db
+
+        before = [r.id for r in recipe_tool.semantic_search("cozy winter soup")]
+        mapped = recipe_tool._get_vector_index()
+        db_path = Path(recipe_tool.db_path)
+        source = Path(__file__).parent.parent / "src" / "data" / "recipes.json"
+        migrate_db.migrate_recipes(source, db_path, incremental=True, build_vectors=True)
+        # Nothing changed, so nothing was rebuilt
+        assert len(list(db_path.parent.glob("*.vectors.*"))) == 1
+
+        # A failed rebuild leaves the database and its matrix as they were
+        conn = sqlite3.connect(str(db_path), isolation_level=None)
+        conn.execute("BEGIN")
+        build_vector_index(conn, str(db_path))
+        conn.execute("ROLLBACK")
+        assert len(remove_stale_vector_files(conn, str(db_path))) == 1
+
+        # A committed rebuild replaces the matrix without touching the mapped one
+        conn.execute("BEGIN")
+        conn.execute("UPDATE recipes SET title = 'Hearty Winter Soup' WHERE id = 'recipe_001'")
+        build_vector_index(conn, str(db_path))
+        conn.execute("COMMIT")
+        assert len(remove_stale_vector_files(conn, str(db_path))) == 1
+        rebuilt = VectorIndex.load(conn, str(db_path))
+        conn.close()
+        assert [recipe_id for recipe_id, _ in mapped.search("cozy winter soup")] == before
+        assert rebuilt.search("hearty winter soup")[0][0] == "recipe_001"
+        rebuilt.close()
+
+
+class TestVectorIndex:
+    def test_recall_at_10(self, tmp_path):
+        index = synthetic_db(tmp_path / "synthetic.db", 3000)
+        queries = [" ".join(random.Random(i).sample(WORDS, 3)) for i in range(40)]
+        assert recall_at_k(index, queries, 10, nprobe=16) >= 0.8
+        index.close()
+
+    @pytest.mark.slow
+    def test_latency_benchmark(self, tmp_path):
+        index = synthetic_db(tmp_path / "synthetic.db", 10000)
+        queries = [" ".join(random.Random(i).sample(WORDS, 3)) for i in range(30)]
+
+        start = time.perf_counter()
+        for q in queries:
+            index.exact_search(q, 10)
+        exact = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        for q in queries:
+            index.search(q, 10, nprobe=16)
+        ann = (time.perf_counter() - start) / len(queries)
+
+        recall = recall_at_k(index, queries, 10, nprobe=16)
+        print(f"\nexact {exact * 1000:.1f} ms/query, ivf {ann * 1000:.1f} ms/query, recall@10 {recall:.2f}")
+        assert ann < exact
+        index.close()
@@ -0,0 +1,156 @@
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agent.schemas import MessageRole
+from web.sessions import KeyedLock, SessionManager
+
+
+class RacyStorage:
+    """In-memory stand-in with the same read-modify-write append as GCS"""
+
+    def __init__(self):
+        self.files = {}
+
+    def save_message(self, message, update_indexes=True, earlier=()):
+        key = (message.user_id, message.session_id)
+        existing = list(self.files.get(key, []))
+        time.sleep(0.002)  # Widen the race window
+        self.files[key] = existing + [message]
+        return True
+
+    def index_messages(self, messages):
+        pass
+
+    def get_session_messages(self, user_id, session_id):
+        return list(self.files.get((user_id, session_id), []))
+
+    def delete_session(self, user_id, session_id):
+        return self.files.pop((user_id, session_id), None) is not None
+
+    def delete_all_user_sessions(self, user_id, progress=None):
+        keys = [key for key in self.files if key[0] == user_id]
+        for key in keys:
+            del self.files[key]
+        return len(keys)
+
+
+class EchoAgent:
+    calls = 0
+
+    def __init__(self, latency=0.005):
+        self.latency = latency
+
+    def process_message(self, user_id, message, session_id, history, idempotency_key=None):
+        EchoAgent.calls += 1
+        EchoAgent.last_key = idempotency_key
+        time.sleep(self.latency)
+        return f"echo {message} after {len(history)}"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    EchoAgent.calls = 0
+    return SessionManager(storage=RacyStorage(), agent_factory=EchoAgent, logs_dir=str(tmp_path))
+
+
+def send_concurrently(manager, messages, session_id="s1", idempotency_key=None):
+    barrier = threading.Barrier(len(messages))
+
+    def send(message):
+        barrier.wait()
+        return manager.process_message("u1", message, session_id, idempotency_key)[0]
+
+    with ThreadPoolExecutor(max_workers=len(messages)) as pool:
+        return list(pool.map(send, messages))
+
+
+class TestSessionSerialization:
+    def test_no_history_lost_under_concurrency(self, manager):
+        messages = [f"message {i}" for i in range(16)]
+        responses = send_concurrently(manager, messages)
+
+        history = manager.get_session_history("u1", "s1")
+        assert len(history) == 32
+        # Strict user/assistant alternation, each response right after its message
+        for user, assistant in zip(history[::2], history[1::2]):
+            assert user.role == MessageRole.USER and assistant.role == MessageRole.ASSISTANT
+            assert assistant.content.startswith(f"echo {user.content} after")
+        # Every turn saw every earlier turn
+        assert sorted(int(r.rsplit(" ", 1)[1]) for r in responses) == list(range(0, 32, 2))
+        assert manager.get_session_count() == 1
+
+    def test_without_the_session_lock_messages_are_lost(self, manager):
+        # Control for the test above: the race is real
+        manager.session_locks.hold = lambda key: contextlib.nullcontext()
+        send_concurrently(manager, [f"message {i}" for i in range(16)])
+        assert len(manager.get_session_history("u1", "s1")) < 32
+
+    def test_sessions_run_in_parallel(self, tmp_path):
+        manager = SessionManager(
+            storage=RacyStorage(), agent_factory=lambda: EchoAgent(latency=0.2), logs_dir=str(tmp_path)
+        )
+        barrier = threading.Barrier(8)
+
+        def send(i):
+            barrier.wait()
+            return manager.process_message("u1", "hi", f"s{i}")
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(send, range(8)))
+        assert time.monotonic() - start < 0.8
+        assert manager.get_session_count() == 8
+
+    def test_retry_in_flight_is_coalesced(self, manager):
+        responses = send_concurrently(manager, ["same question"] * 4, idempotency_key="req-1")
+        assert len(set(responses)) == 1
+        assert EchoAgent.calls == 1
+        assert len(manager.get_session_history("u1", "s1")) == 2
+
+    def test_identical_messages_without_a_key_are_separate_turns(self, manager):
+        responses = send_concurrently(manager, ["yes"] * 3)
+        assert EchoAgent.calls == 3
+        assert sorted(responses) == ["echo yes after 0", "echo yes after 2", "echo yes after 4"]
+        assert len(manager.get_session_history("u1", "s1")) == 6
+
+    def test_idempotency_key_reaches_the_agent(self, manager):
+        manager.process_message("u1", "order the pad thai", "s1", idempotency_key="req-1")
+        assert EchoAgent.last_key == "req-1"
+
+    def test_clear_waits_for_in_flight_message(self, manager):
+        manager.process_message("u1", "first", "s1")
+        worker = threading.Thread(target=manager.process_message, args=("u1", "second", "s1"))
+        worker.start()
+        time.sleep(0.001)
+        manager.clear_session("u1", "s1")
+        worker.join()
+        # The clear ran before or after the second turn, never in the middle of it
+        assert len(manager.get_session_history("u1", "s1")) in (0, 2)
+        assert manager.session_locks.active() == 0
+
+    def test_clear_all_waits_for_in_flight_messages(self, manager):
+        manager.process_message("u1", "first", "s1")
+        manager.process_message("u1", "first", "s2")
+        workers = [
+            threading.Thread(target=manager.process_message, args=("u1", "second", session_id))
+            for session_id in ("s1", "s2")
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(0.001)
+        manager.clear_all_user_sessions("u1")
+        for worker in workers:
+            worker.join()
+        for session_id in ("s1", "s2"):
+            assert len(manager.get_session_history("u1", session_id)) in (0, 2)
+        assert manager.session_locks.active() == 0
+
+
+class TestKeyedLock:
+    def test_locks_are_dropped_when_idle(self):
+        locks = KeyedLock()
+        with locks.hold("a"), locks.hold("b"):
+            assert locks.active() == 2
+        assert locks.active() == 0
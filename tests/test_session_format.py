@@ -0,0 +1,152 @@
+import json
+import time
+import pytest
+from agent.schemas import ConversationMessage, MessageRole
+from config import Config
+from web.session_format import BlockWriter, build_history_index, is_compact, iter_blocks, parse_messages
+
+
+def conversation(count):
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            content = f"Find me a cheap {['thai', 'ramen', 'pizza'][i % 3]} place near Mission St #{i}"
+        else:
+            content = (
+                f"Here are some options:\n\n1. **Place {i}** - 123 Main St - $$\n"
+                f"2. **Place {i + 1}** - 456 Oak Ave - $\n\n"
+                "[Debug Info]\nTools used in this interaction:\n- restaurant_search\n- places_details"
+            )
+        messages.append(
+            {
+                "timestamp": f"2024-03-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{i * 7919 % 1000000:06d}Z",
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": content,
+            }
+        )
+    return messages
+
+
+def jsonl(messages):
+    return b"".join(json.dumps(m).encode() + b"\n" for m in messages)
+
+
+class TestSessionFormat:
+    def test_round_trip_is_exact(self):
+        messages = conversation(70) + [
+            {"timestamp": "2024-03-01T13:00:00Z", "role": "user", "content": "whole second"},
+            {"timestamp": "2024-03-01T13:00:00+00:00", "role": "assistant", "content": "offset"},
+            {"timestamp": "not a time", "role": "user", "content": "üñíçødé 🍜"},
+            {"timestamp": "2024-03-01T12:59:00Z", "role": "assistant", "content": "clock went back"},
+        ]
+        content = BlockWriter(block_messages=32).blocks(messages)
+        assert is_compact(content)
+        assert [count for _, _, count in iter_blocks(content)] == [32, 32, 10]
+        assert parse_messages(content) == messages
+
+    def test_append_only_rewrites_the_last_block(self):
+        writer = BlockWriter(block_messages=4)
+        content = b""
+        for message in conversation(10):
+            previous = content
+            content = writer.append(content, message)
+            blocks = list(iter_blocks(previous))
+            if blocks:
+                # Everything before the last block is untouched
+                assert content.startswith(previous[: blocks[-1][0]])
+        assert [count for _, _, count in iter_blocks(content)] == [4, 4, 2]
+        assert parse_messages(content) == conversation(10)
+
+    def test_legacy_file_is_converted_on_append(self):
+        legacy = jsonl(conversation(5))
+        assert parse_messages(legacy) == conversation(5)
+        content = BlockWriter().append(legacy, conversation(6)[-1])
+        assert is_compact(content) and parse_messages(content) == conversation(6)
+
+    def test_codecs(self):
+        for codec in ("none", "gzip"):
+            content = BlockWriter(codec=codec).blocks(conversation(10))
+            assert parse_messages(content) == conversation(10)
+
+    def test_zstd_codec(self):
+        pytest.importorskip("zstandard")
+        content = BlockWriter(codec="zstd").blocks(conversation(10))
+        assert parse_messages(content) == conversation(10)
+
+    def test_msgpack_encoding(self):
+        pytest.importorskip("msgpack")
+        content = BlockWriter(encoding="msgpack").blocks(conversation(10))
+        assert parse_messages(content) == conversation(10)
+
+
+def save_all(storage, messages, session_id="s1"):
+    for m in messages:
+        storage.save_message(
+            ConversationMessage(
+                session_id=session_id,
+                user_id="u1",
+                role=MessageRole(m["role"]),
+                content=m["content"],
+                timestamp=m["timestamp"],
+            )
+        )
+
+
+class TestStorageFormats:
+    def test_legacy_session_migrates_on_next_write(self, gcs_storage):
+        bucket = gcs_storage.client.fake_bucket
+        bucket.objects["sessions/u1/s1.jsonl"] = (jsonl(conversation(40)), 1)
+        # Readable as is, pages included
+        assert len(gcs_storage.get_session_messages("u1", "s1")) == 40
+        page, before = gcs_storage.get_session_page("u1", "s1", 10)
+        assert before == 30
+
+        save_all(gcs_storage, conversation(41)[-1:])
+        assert is_compact(bucket.objects["sessions/u1/s1.jsonl"][0])
+        history = gcs_storage.get_session_messages("u1", "s1")
+        assert [m.content for m in history] == [m["content"] for m in conversation(41)]
+        assert [m.timestamp for m in history] == [m["timestamp"] for m in conversation(41)]
+        page, before = gcs_storage.get_session_page("u1", "s1", 10, before=35)
+        assert [m.content for m in page] == [m["content"] for m in conversation(35)[25:]]
+
+    def test_jsonl_format_still_writes_json_lines(self, gcs_storage, monkeypatch):
+        monkeypatch.setattr(Config, "SESSION_FORMAT", "jsonl")
+        save_all(gcs_storage, conversation(12))
+        content = gcs_storage.client.fake_bucket.objects["sessions/u1/s1.jsonl"][0]
+        assert content == jsonl(conversation(12))
+        page, before = gcs_storage.get_session_page("u1", "s1", 5, before=7)
+        assert [m.content for m in page] == [m["content"] for m in conversation(7)[2:]]
+        assert before == 2
+
+    def test_page_inside_a_block(self, gcs_storage, monkeypatch):
+        monkeypatch.setattr(Config, "SESSION_BLOCK_MESSAGES", 8)
+        save_all(gcs_storage, conversation(30))
+        expected = [m["content"] for m in conversation(30)]
+        for before in (30, 23, 9, 3):
+            page, _ = gcs_storage.get_session_page("u1", "s1", 5, before=before)
+            assert [m.content for m in page] == expected[max(0, before - 5) : before]
+
+
+@pytest.mark.slow
+def test_size_and_parse_time():
+    messages = conversation(2000)
+    formats = {"jsonl": jsonl(messages)}
+    formats["compact/gzip"] = BlockWriter(codec="gzip").blocks(messages)
+    try:
+        formats["compact/zstd"] = BlockWriter(codec="zstd").blocks(messages)
+    except ImportError:
+        pass
+
+    baseline = len(formats["jsonl"])
+    for name, content in formats.items():
+        start = time.perf_counter()
+        for _ in range(5):
+            parsed = parse_messages(content)
+        parse_ms = (time.perf_counter() - start) / 5 * 1000
+        index = build_history_index(content)
+        print(
+            f"\n{name:13} {len(content):>8} bytes ({len(content) / baseline:.0%}), "
+            f"parse {parse_ms:.1f} ms, index {len(index)} bytes"
+        )
+        assert parsed == messages
+    assert len(formats["compact/gzip"]) < baseline / 3
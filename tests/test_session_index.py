@@ -0,0 +1,112 @@
+import json
+from agent.schemas import ConversationMessage, MessageRole
+from web.session_index import SessionIndex
+from web.sessions import SessionManager
+
+
+def save(storage, session_id, content, timestamp, role=MessageRole.USER, user_id="u1"):
+    storage.save_message(
+        ConversationMessage(
+            session_id=session_id, user_id=user_id, role=role, content=content, timestamp=timestamp
+        )
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubAgent:
+    def process_message(self, user_id, message, session_id, history, idempotency_key=None):
+        if message == "fail":
+            raise RuntimeError("model unavailable")
+        return f"reply {len(history)}"
+
+
+class TestSessionIndex:
+    def test_listing_comes_from_the_index(self, gcs_storage):
+        save(gcs_storage, "old", "Where can I get ramen near Mission St?", "2024-01-01T10:00:00Z")
+        save(gcs_storage, "old", "Here are three places...", "2024-01-01T10:00:05Z", MessageRole.ASSISTANT)
+        save(gcs_storage, "new", "Dinner recipe with chickpeas", "2024-01-02T09:00:00Z")
+        save(gcs_storage, "old", "Book the first one", "2024-01-03T08:00:00Z")
+
+        bucket = gcs_storage.client.fake_bucket
+        bucket.listings = bucket.downloaded = 0
+        summaries = gcs_storage.list_session_summaries("u1")
+        # Warm cache: no listing and nothing downloaded
+        assert (bucket.listings, bucket.downloaded) == (0, 0)
+        assert [s.session_id for s in summaries] == ["old", "new"]
+        assert summaries[0].title == "Where can I get ramen near Mission St?"
+        assert summaries[0].message_count == 3
+        assert summaries[0].created_at == "2024-01-01T10:00:00Z"
+        assert summaries[0].last_activity == "2024-01-03T08:00:00Z"
+        by_created = gcs_storage.list_session_summaries("u1", sort="created_at")
+        assert [s.session_id for s in by_created] == ["new", "old"]
+
+    def test_sessions_from_before_the_index_are_scanned_once(self, gcs_storage):
+        bucket = gcs_storage.client.fake_bucket
+        lines = [
+            {"timestamp": "2024-01-01T00:00:00Z", "role": "user", "content": "x" * 100},
+            {"timestamp": "2024-01-01T00:00:09Z", "role": "assistant", "content": "ok"},
+        ]
+        bucket.objects["sessions/u1/legacy.jsonl"] = (
+            b"".join(json.dumps(line).encode() + b"\n" for line in lines),
+            1,
+        )
+        summary = gcs_storage.list_session_summaries("u1")[0]
+        assert summary.title == "x" * SessionIndex.TITLE_CHARS and summary.message_count == 2
+        assert "sessions/u1/_index.json" in bucket.objects
+
+        # Another worker reads the stored index rather than scanning again
+        bucket.listings = 0
+        other = SessionIndex(gcs_storage.client, "test", gcs_storage._scan_user_sessions)
+        assert [s["session_id"] for s in other.list("u1")] == ["legacy"]
+        assert bucket.listings == 0
+
+    def test_concurrent_workers_dont_lose_updates(self, gcs_storage):
+        clock = FakeClock()
+        worker_a = SessionIndex(gcs_storage.client, "test", lambda u: {}, ttl=30, clock=clock)
+        worker_b = SessionIndex(gcs_storage.client, "test", lambda u: {}, ttl=30, clock=clock)
+        worker_a.record_message("u1", "a", "user", "from a", "2024-01-01T00:00:00Z", count=1)
+        worker_b.record_message("u1", "b", "user", "from b", "2024-01-01T00:00:01Z", count=1)
+        # A's cached generation is stale, so its next write conflicts, re-reads and retries
+        worker_a.record_message("u1", "a", "assistant", "reply", "2024-01-01T00:00:02Z", count=2)
+        assert worker_a.stats["conflicts"] == 1
+        assert {s["session_id"] for s in worker_a.list("u1")} == {"a", "b"}
+
+        # B's cached copy misses A's reply until the TTL passes
+        assert [s["message_count"] for s in worker_b.list("u1")] == [1, 1]
+        clock.now += 31
+        assert [s["message_count"] for s in worker_b.list("u1")] == [2, 1]
+
+    def test_deletes_update_the_index(self, gcs_storage):
+        save(gcs_storage, "s1", "hello", "2024-01-01T00:00:00Z")
+        save(gcs_storage, "s2", "hi", "2024-01-01T00:00:01Z")
+        gcs_storage.delete_session("u1", "s1")
+        assert gcs_storage.list_user_sessions("u1") == ["s2"]
+        gcs_storage.delete_all_user_sessions("u1")
+        assert gcs_storage.list_user_sessions("u1") == []
+        assert gcs_storage.client.fake_bucket.objects == {}
+
+    def test_indexes_are_updated_once_per_turn(self, gcs_storage, tmp_path):
+        manager = SessionManager(storage=gcs_storage, agent_factory=StubAgent, logs_dir=str(tmp_path))
+        manager.process_message("u1", "Where can I get ramen?", "s1")
+        bucket = gcs_storage.client.fake_bucket
+        bucket.requests = 0
+        manager.process_message("u1", "Book the first one", "s1")
+        # History read, two appends (read and write each), then one history
+        # index write and one session index write for the turn, not one per message
+        assert bucket.requests == 7
+        (summary,) = gcs_storage.list_session_summaries("u1")
+        assert summary.title == "Where can I get ramen?" and summary.message_count == 4
+        assert len(gcs_storage.get_session_page("u1", "s1", 10)[0]) == 4
+
+    def test_failed_turn_still_indexes_the_user_message(self, gcs_storage, tmp_path):
+        manager = SessionManager(storage=gcs_storage, agent_factory=StubAgent, logs_dir=str(tmp_path))
+        manager.process_message("u1", "fail", "s1")
+        (summary,) = gcs_storage.list_session_summaries("u1")
+        assert summary.title == "fail" and summary.message_count == 1
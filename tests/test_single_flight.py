@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agent.cache import SingleFlight, TieredCache
+
+
+def run_concurrently(n, fn):
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(worker, range(n)))
+
+
+class TestSingleFlight:
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        results = run_concurrently(10, lambda i: flight.do("k", slow))
+        assert len(calls) == 1
+        assert [value for value, _ in results] == ["value"] * 10
+        assert sum(shared for _, shared in results) == 9
+        assert flight.stats == {"leaders": 1, "coalesced": 9}
+        assert flight.in_flight() == 0
+
+    def test_exception_is_shared_and_not_sticky(self):
+        flight = SingleFlight()
+
+        def boom():
+            time.sleep(0.05)
+            raise RuntimeError("upstream down")
+
+        def call(i):
+            try:
+                flight.do("k", boom)
+            except RuntimeError as e:
+                return str(e)
+
+        assert run_concurrently(5, call) == ["upstream down"] * 5
+        assert flight.do("k", lambda: "recovered") == ("recovered", False)
+
+    def test_asyncio_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def main():
+            return await asyncio.gather(*(flight.do_async("k", fetch) for _ in range(20)))
+
+        results = asyncio.run(main())
+        assert len(calls) == 1
+        assert [value for value, _ in results] == [42] * 20
+
+    def test_asyncio_caller_joins_thread_leader(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.1)
+            return "from thread"
+
+        leader = threading.Thread(target=flight.do, args=("k", slow))
+        leader.start()
+        started.wait()
+
+        async def unused():
+            raise AssertionError("should have joined the thread's call")
+
+        assert asyncio.run(flight.do_async("k", unused)) == ("from thread", True)
+        leader.join()
+
+
+class TestTieredCacheCoalescing:
+    def test_concurrent_misses_fetch_once(self):
+        cache = TieredCache("t", ttl=60)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return ["result"]
+
+        results = run_concurrently(8, lambda i: cache.get_or_fetch("k", fetch))
+        assert results == [["result"]] * 8
+        assert len(calls) == 1
+        assert cache.stats["misses"] == 1 and cache.stats["coalesced"] == 7
+
+
+class TestPlacesClientCoalescing:
+    def test_identical_searches_share_one_upstream_call(self, mock_places_server, places_client):
+        mock_places_server.latency = 0.2
+        results = run_concurrently(20, lambda i: places_client.search_place("Trending  TACOS"))
+
+        assert all(len(r) == 5 for r in results)
+        assert len(mock_places_server.search_requests) == 1
+        assert places_client.cache.stats()["search"]["coalesced"] == 19
+
+    def test_details_coalesce_per_field_mask(self, mock_places_server, places_client):
+        mock_places_server.latency = 0.2
+
+        def call(i):
+            mask = "name,displayName,formattedAddress" if i % 2 else None
+            return places_client.get_place_details("places/7", mask)
+
+        run_concurrently(10, call)
+        assert len(mock_places_server.detail_requests) == 2
+
+    def test_async_callers(self, mock_places_server, places_client):
+        mock_places_server.latency = 0.2
+
+        async def main():
+            return await asyncio.gather(
+                *(places_client.search_place_async("ramen") for _ in range(10))
+            )
+
+        assert all(len(r) == 5 for r in asyncio.run(main()))
+        assert len(mock_places_server.search_requests) == 1
+
+
+@pytest.mark.slow
+def test_coalescing_load(mock_places_server, places_client):
+    """200 sessions searching 5 trending queries at once"""
+    mock_places_server.latency = 0.3
+    queries = [f"trending query {i % 5}" for i in range(200)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=200) as pool:
+        results = list(pool.map(places_client.search_place, queries))
+    elapsed = time.perf_counter() - start
+
+    stats = places_client.cache.stats()["search"]
+    print(
+        f"200 searches: {len(mock_places_server.search_requests)} upstream calls, "
+        f"{stats['coalesced']} coalesced, {stats['hits']} cache hits, {elapsed:.2f}s"
+    )
+    assert all(len(r) == 5 for r in results)
+    assert len(mock_places_server.search_requests) == 5
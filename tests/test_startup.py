@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from web.startup import Warmup
+
+SRC = Path(__file__).parent.parent / "src"
+
+# Loaded by the first agent turn or storage call, never by importing the app
+DEFERRED_MODULES = ["google.generativeai", "langgraph", "google.cloud.storage", "agent.graph"]
+
+
+def run_python(*args):
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_APPLICATION_CREDENTIALS"}
+    env["PYTHONPATH"] = str(SRC)
+    return subprocess.run(
+        [sys.executable, *args], cwd=SRC, env=env, capture_output=True, text=True, timeout=120
+    )
+
+
+def import_times(module):
+    """Cumulative import time in microseconds of each top-level import, from -X importtime"""
+    result = run_python("-X", "importtime", "-c", f"import {module}")
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup:
+    def test_app_imports_without_sdks_or_credentials(self):
+        result = run_python(
+            "-c",
+            "import json, sys, web.api; "
+            f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))",
+        )
+        assert result.returncode == 0, result.stderr[-2000:]
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+    def test_import_time_budget(self):
+        times = import_times("web.api")
+        # FastAPI's own import is most of the total and out of our hands
+        ours_ms = (times["web.api"] - times.get("fastapi", 0)) / 1000
+        slowest = sorted(
+            ((t, name) for name, t in times.items() if not name.startswith("fastapi")), reverse=True
+        )[1:6]
+        print(f"\nweb.api import: {ours_ms:.0f} ms excluding fastapi; slowest: {slowest}")
+        assert ours_ms < 1000
+
+    def test_warmup_reports_each_step(self):
+        warmup = Warmup({"fast": lambda: None, "broken": lambda: 1 / 0})
+        assert not warmup.ready and warmup.status()["steps"]["fast"]["state"] == "pending"
+        warmup.start()
+        assert warmup.wait(5)
+        steps = warmup.status()["steps"]
+        assert steps["fast"]["state"] == "done"
+        assert steps["broken"]["state"] == "failed" and "division" in steps["broken"]["error"]
+        assert not warmup.ready
+
+
+class TestReadiness:
+    @pytest.fixture
+    def api(self):
+        from web import api
+
+        return api
+
+    def test_ready_after_warmup(self, api, monkeypatch):
+        monkeypatch.setattr(api, "warmup", Warmup({"agent": lambda: None}))
+        with TestClient(api.app) as client:
+            assert client.get("/health").status_code == 200
+            assert api.warmup.wait(5)
+            response = client.get("/ready")
+            assert response.status_code == 200 and response.json()["ready"]
+
+    def test_not_ready_while_a_step_fails(self, api, monkeypatch):
+        def no_credentials():
+            raise RuntimeError("no credentials")
+
+        monkeypatch.setattr(api, "warmup", Warmup({"storage": no_credentials}))
+        with TestClient(api.app) as client:
+            assert api.warmup.wait(5)
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["steps"]["storage"]["error"] == "no credentials"
+            # Liveness is unaffected
+            assert client.get("/health").status_code == 200